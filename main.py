@@ -1,3 +1,4 @@
+import asyncio
 import os
 
 from astrbot.api import logger
@@ -10,12 +11,23 @@ from astrbot.core.star.context import Context
 
 from .src.analysis.calculator import LoveCalculator
 from .src.analysis.classifier import ArchetypeClassifier
+from .src.analysis.commentary_cache import CommentaryCache
+from .src.analysis.context_compactor import ContextCompactor
 from .src.analysis.llm_analyzer import LLMAnalyzer
+from .src.analysis.settlement import DailySettlement
+from .src.handlers.chat_state import ChatState
+from .src.handlers.dedup import IdempotencyGuard
 from .src.handlers.history_fetcher import OneBotAdapter
+from .src.handlers.ingest import IngestPipeline
+from .src.handlers.live_buffer import LiveMessageBuffer
 from .src.handlers.message_handler import MessageHandler
 from .src.handlers.notice_handler import NoticeHandler
+from .src.models.settings import Settings, SettingsProvider
 from .src.persistence.database import DBManager
+from .src.persistence.maintenance import MessageIndexRetention
 from .src.persistence.repo import LoveRepo
+from .src.utils.singleflight import SingleFlight
+from .src.utils.timing import StageTimer
 from .src.visual.renderer import LoveRenderer
 from .src.visual.theme_manager import ThemeManager
 
@@ -34,6 +46,7 @@ class LoveFormulaPlugin(Star):
     def __init__(self, context: Context, config: dict):
         super().__init__(context)
         self.config = config
+        self.settings = SettingsProvider(config)
 
         # 1. 确定持久化存储路径
         from astrbot.core.utils.astrbot_path import get_astrbot_plugin_data_path
@@ -65,35 +78,122 @@ class LoveFormulaPlugin(Star):
         if not os.path.exists(data_dir):
             os.makedirs(data_dir, exist_ok=True)
 
-        self.db_mgr = DBManager(db_path)
-        self.repo = LoveRepo(self.db_mgr)
+        self.db_mgr = DBManager(db_path, tuning=self.config.get("sqlite_tuning"))
+        self.repo = LoveRepo(
+            self.db_mgr,
+            flush_interval=self.config.get("counter_flush_interval", 2.0),
+            flush_threshold=self.config.get("counter_flush_threshold", 200),
+            owner_cache_size=self.config.get("owner_cache_size", 10000),
+            owner_cache_ttl=self.config.get("owner_cache_ttl", 3600),
+            writer_queue_size=self.config.get("db_writer_queue_size", 5000),
+        )
+        retention_cfg = self.config.get("message_index_retention", {}) or {}
+        self.retention = (
+            MessageIndexRetention.from_config(self.repo, retention_cfg)
+            if retention_cfg.get("enabled", True)
+            else None
+        )
 
         # 2. 初始化处理器和逻辑
 
-        self.msg_handler = MessageHandler(self.repo)
-        self.notice_handler = NoticeHandler(self.repo)
-        self.history_fetcher = OneBotAdapter(context, config)
+        self.guard = IdempotencyGuard.from_config(
+            self.repo, self.config.get("idempotency", {}) or {}
+        )
+        self.live_buffer = LiveMessageBuffer.from_config(
+            self.config.get("live_buffer", {}) or {}
+        )
+        self.msg_handler = MessageHandler(
+            self.repo,
+            ChatState.from_config(self.config.get("chat_state", {}) or {}),
+            self.guard,
+            self.live_buffer,
+        )
+        self.notice_handler = NoticeHandler(self.repo, self.guard)
+        self.ingest = IngestPipeline.from_config(self.config.get("ingest", {}) or {})
+        self.history_fetcher = OneBotAdapter(
+            context, config, self.settings, self.live_buffer
+        )
         self.theme_mgr = ThemeManager(os.path.dirname(os.path.abspath(__file__)))
         self.renderer = LoveRenderer(context, self.theme_mgr)
-        self.llm = LLMAnalyzer(context, self.config)
+        commentary_cache_cfg = self.config.get("commentary_cache", {}) or {}
+        compaction_cfg = self.config.get("context_compaction", {}) or {}
+        self.llm = LLMAnalyzer(
+            context,
+            self.config,
+            CommentaryCache.from_config(commentary_cache_cfg, self.repo)
+            if commentary_cache_cfg.get("enabled", True)
+            else None,
+            ContextCompactor.from_config(compaction_cfg)
+            if compaction_cfg.get("enabled", True)
+            else None,
+        )
         self.calculator = LoveCalculator()
         self.classifier = ArchetypeClassifier()
+        self.settlement = DailySettlement(self.repo, self.calculator)
+        self._cold_start_flight = SingleFlight()
 
     async def init(self):
         """AstrBot 调用的异步初始化方法"""
         await self.db_mgr.init_db()
+        self.repo.start()
+        try:
+            warmed = await self.guard.warm_up()
+            logger.debug(f"LoveFormula 已预热 {warmed} 条消息 ID 用于去重。")
+        except Exception as e:
+            logger.warning(f"LoveFormula 去重预热失败: {e}")
+        self.ingest.start()
+        if self.retention:
+            self.retention.start()
+        self.settlement.start()
+        if self.llm.commentary_cache:
+            try:
+                await self.llm.commentary_cache.prune()
+            except Exception as e:
+                logger.warning(f"LoveFormula 清理判词缓存失败: {e}")
         logger.info("LoveFormula DB initialized.")
 
+    async def terminate(self):
+        """插件卸载时调用，停止后台任务并确保缓冲区中的计数器全部落盘"""
+        if self.retention:
+            await self.retention.stop()
+        await self.ingest.stop()
+        await self.history_fetcher.members.stop()
+        if self.llm.commentary_cache:
+            await self.llm.commentary_cache.stop()
+        await self.settlement.stop()
+        await self.repo.stop()
+        logger.info(f"LoveFormula 消息归属缓存统计: {self.repo.owner_cache.stats()}")
+        logger.info(f"LoveFormula 采集管线统计: {self.ingest.metrics()}")
+        logger.info(f"LoveFormula 写入队列统计: {self.repo.writer.metrics()}")
+        logger.info(f"LoveFormula 会话状态统计: {self.msg_handler.state.stats()}")
+        logger.info(f"LoveFormula 去重统计: {self.guard.stats()}")
+        logger.info(
+            f"LoveFormula 实时消息缓冲统计: {self.live_buffer.stats()}, "
+            f"缓冲命中 {self.history_fetcher.live_hits} 次, "
+            f"接口补齐 {self.history_fetcher.api_fallbacks} 次"
+        )
+        logger.info(
+            f"LoveFormula 深度历史翻页统计: {self.history_fetcher.pager.stats()}"
+        )
+        if self.llm.commentary_cache:
+            logger.info(
+                f"LoveFormula 判词缓存统计: {self.llm.commentary_cache.stats()}"
+            )
+
     @filter.event_message_type(EventMessageType.GROUP_MESSAGE)
     async def on_group_message(self, event: AstrMessageEvent):
         """处理群消息监听"""
-        if not self._is_group_allowed(event.message_obj.group_id):
+        if not self.settings.current.is_group_allowed(event.message_obj.group_id):
             return
 
         logger.debug(
             f"[LoveFormula] on_group_message 触发: {event.message_obj.message_id}"
         )
-        await self.msg_handler.handle_message(event)
+        await self.ingest.submit(
+            str(event.message_obj.group_id), self.msg_handler.handle_message, event
+        )
+        # 成员表缺失或过期时后台预加载，指令触发时即可直接使用
+        self.history_fetcher.members.refresh(event)
 
     @filter.custom_filter(NoticeFilter)
     async def on_notice(self, event: AstrMessageEvent):
@@ -103,7 +203,166 @@ class LoveFormulaPlugin(Star):
         假设 event.raw_data 包含 OneBot 负载。
         """
         if hasattr(event, "message_obj") and event.message_obj.raw_message:
-            await self.notice_handler.handle_notice(event.message_obj.raw_message)
+            raw = event.message_obj.raw_message
+            # 与同群消息共用分片，保证贴贴/撤回在其目标消息之后处理
+            await self.ingest.submit(
+                str(raw.get("group_id", "")), self.notice_handler.handle_notice, raw
+            )
+
+    async def _cold_start_sync(
+        self, event: AstrMessageEvent, group_id: str, history_count: int
+    ):
+        """同步群荣誉并回填历史消息，返回 (发放的荣誉数, 回填统计)"""
+        # 1. 同步群荣誉 (龙王、快乐源泉等)，每个群每天只发放一次
+        honor_data = None
+        if not await self.repo.is_honor_applied(group_id):
+            honor_data = await self.history_fetcher.fetch_group_honor(event)
+        honor_count = 0
+        if honor_data:
+            honor_count = await self.repo.apply_honor_bonus(group_id, honor_data)
+            logger.info(f"已同步群 {group_id} 的 {honor_count} 条荣誉数据。")
+
+        # 2. 回填历史消息 (只处理上次回填水位之后的消息)
+        stats = {}
+        raw_history = await self.history_fetcher.fetch_raw_group_history(
+            event, count=history_count
+        )
+        if raw_history:
+            stats = await self.msg_handler.backfill_from_history(group_id, raw_history)
+            logger.info(
+                f"[LoveFormula] 成功为群 {group_id} 执行了增强型历史回填: {stats}, 同步荣誉: {honor_count}"
+            )
+        return honor_count, stats
+
+    async def _run_report_stages(
+        self,
+        event: AstrMessageEvent,
+        settings: Settings,
+        user_id: str,
+        scores: dict,
+        archetype_name: str,
+        raw_data_dict: dict,
+        timer: StageTimer,
+    ) -> tuple[dict, dict | None, str]:
+        """
+        并发执行报告的各个阶段，返回 (判词结果, 深度侧写结果, 头像)：
+        - 判词 (generate_commentary)
+        - 上下文获取 -> 深度侧写 -> 证据头像预取
+        - 目标头像预取
+        开启合并模式时，判词与深度侧写在获取上下文后由一次 LLM 调用生成。
+        """
+        group_id = str(event.message_obj.group_id)
+
+        async def commentary():
+            if not settings.enable_llm_commentary:
+                return {"comment": "LLM点评已关闭。", "diagnostics": []}
+            # 获取对应的 Provider ID (已在配置快照中回落到全局默认值)
+            with timer.stage("commentary"):
+                return await self.llm.generate_commentary(
+                    scores,
+                    archetype_name,
+                    raw_data_dict,
+                    provider_id=settings.commentary_provider_id,
+                )
+
+        async def fetch_context() -> list:
+            if not settings.enable_llm_commentary:
+                return []
+            if not settings.enable_history_analysis:
+                logger.debug("History analysis disabled by config.")
+                return []
+            try:
+                with timer.stage("fetch_context"):
+                    return await self.history_fetcher.fetch_context(event, user_id)
+            except Exception as e:
+                logger.warning(f"Failed to fetch chat history: {e}")
+                return []
+
+        async def deep_dive(chat_context: list):
+            try:
+                with timer.stage("deep_dive"):
+                    return await self.llm.generate_deep_dive(
+                        scores,
+                        archetype_name,
+                        raw_data_dict,
+                        chat_context,
+                        provider_id=settings.deep_dive_provider_id,
+                        members=self.history_fetcher.members.get(group_id),
+                        max_evidence=settings.max_evidence_scenes,
+                    )
+            except Exception as e:
+                logger.warning(f"Failed to analyze chat history: {e}")
+                return None
+
+        async def prefetch_evidence_avatars(result):
+            if result and result.get("evidence"):
+                # 证据中的头像在等待判词的同时下载
+                dialogs = [
+                    dialog
+                    for scene in result["evidence"]
+                    for dialog in scene.get("dialogue", [])
+                    if dialog.get("user_id")
+                ]
+                with timer.stage("evidence_avatars"):
+                    avatars = await self.renderer.prefetch_avatars(
+                        (d["user_id"] for d in dialogs), size=100
+                    )
+                for dialog in dialogs:
+                    dialog["avatar_url"] = avatars.get(str(dialog["user_id"]))
+            return result
+
+        async def separate_calls():
+            async def context_and_deep_dive():
+                chat_context = await fetch_context()
+                if not chat_context:
+                    return None
+                return await prefetch_evidence_avatars(await deep_dive(chat_context))
+
+            return await asyncio.gather(commentary(), context_and_deep_dive())
+
+        async def combined_call():
+            # 合并模式：判词依赖上下文，一次调用生成两部分，解析失败的部分单独重试
+            chat_context = await fetch_context()
+            if not chat_context:
+                return await commentary(), None
+            with timer.stage("combined"):
+                llm_result, deep_result = await self.llm.generate_combined(
+                    scores,
+                    archetype_name,
+                    raw_data_dict,
+                    chat_context,
+                    provider_id=settings.deep_dive_provider_id,
+                    members=self.history_fetcher.members.get(group_id),
+                    max_evidence=settings.max_evidence_scenes,
+                )
+            if llm_result is None or deep_result is None:
+                logger.info("合并调用解析失败，退回到分别调用。")
+
+                async def keep(value):
+                    return value
+
+                llm_result, deep_result = await asyncio.gather(
+                    commentary() if llm_result is None else keep(llm_result),
+                    deep_dive(chat_context)
+                    if deep_result is None
+                    else keep(deep_result),
+                )
+            return llm_result, await prefetch_evidence_avatars(deep_result)
+
+        async def avatar():
+            with timer.stage("avatar"):
+                avatars = await self.renderer.prefetch_avatars([user_id])
+            return avatars.get(str(user_id)) or LoveRenderer.avatar_url(user_id)
+
+        use_combined = (
+            settings.enable_combined_llm
+            and settings.enable_llm_commentary
+            and settings.enable_history_analysis
+        )
+        (llm_result, deep_dive_result), avatar_url = await asyncio.gather(
+            combined_call() if use_combined else separate_calls(), avatar()
+        )
+        return llm_result, deep_dive_result, avatar_url
 
     @filter.command("今日人设")
     async def cmd_love_profile(self, event: AstrMessageEvent):
@@ -111,6 +370,7 @@ class LoveFormulaPlugin(Star):
         group_id = event.message_obj.group_id
         user_id = event.message_obj.sender.user_id
         nickname = event.message_obj.sender.nickname
+        settings = self.settings.current
         # Disable default LLM reply for this command.
         event.should_call_llm(True)
 
@@ -118,54 +378,47 @@ class LoveFormulaPlugin(Star):
         targeted_user_id = None
         targeted_nickname = None
 
+        # 昵称统一从群成员表解析 (缓存，不在此处调用接口)
+        members = self.history_fetcher.members
+        members.refresh(event)
+
         for component in event.message_obj.message:
             if isinstance(component, At):
                 targeted_user_id = str(component.qq)
                 # 尝试获取 被 at 人的昵称，如果获取不到则使用默认
                 targeted_nickname = (
-                    getattr(component, "display", None) or f"用户{targeted_user_id}"
+                    getattr(component, "display", None)
+                    or members.display_name(group_id, targeted_user_id)
+                    or f"用户{targeted_user_id}"
                 )
                 break
 
         if targeted_user_id:
             user_id = targeted_user_id
             nickname = targeted_nickname
+        elif group_id:
+            nickname = members.display_name(group_id, user_id) or nickname
 
         if not group_id:
             yield event.plain_result("请在群聊中使用此指令。")
             return
 
         # 1. 获取数据回溯
-        if not self._is_group_allowed(group_id):
+        if not settings.is_group_allowed(group_id):
             yield event.plain_result("此群未启用恋爱分析功能。")
             return
 
         # --- 深度冷启动回填与荣誉同步 ---
         today_data = await self.repo.get_today_data(group_id, user_id)
         if not today_data or today_data.msg_sent < 3:
-            # 数据显著不足，启动深度同步
+            # 数据显著不足，启动深度同步；同群的并发请求共享同一次同步
             try:
-                # 1. 同步群荣誉 (龙王、快乐源泉等)
-                honor_data = await self.history_fetcher.fetch_group_honor(event)
-                honor_count = 0
-                if honor_data:
-                    honor_count = await self.repo.apply_honor_bonus(
-                        str(group_id), honor_data
-                    )
-                    logger.info(f"已同步群 {group_id} 的 {honor_count} 条荣誉数据。")
-
-                # 2. 回填历史消息
-                raw_history = await self.history_fetcher.fetch_raw_group_history(
-                    event, count=self.config.get("analyze_history_count", 100)
+                await self._cold_start_flight.do(
+                    str(group_id),
+                    lambda: self._cold_start_sync(
+                        event, str(group_id), settings.analyze_history_count
+                    ),
                 )
-                if raw_history:
-                    stats = await self.msg_handler.backfill_from_history(
-                        str(group_id), raw_history
-                    )
-                    logger.info(
-                        f"[LoveFormula] 成功为群 {group_id} 执行了增强型历史回填: {stats}, 同步荣誉: {honor_count}"
-                    )
-
             except Exception as e:
                 logger.warning(f"深度冷启动同步失败: {e}")
         # ---------------------
@@ -174,17 +427,23 @@ class LoveFormulaPlugin(Star):
         from datetime import date, timedelta
 
         yesterday = date.today() - timedelta(days=1)
-        yesterday_data = await self.repo.get_data_by_date(group_id, user_id, yesterday)
-        yesterday_score = 0
-        if yesterday_data:
-            y_scores = self.calculator.calculate_scores(yesterday_data)
-            yesterday_score = y_scores.get("score", 0)
-            logger.debug(f"Yesterday score for {user_id}: {yesterday_score}")
+        yesterday_score = await self.repo.get_daily_score(group_id, user_id, yesterday)
+        if yesterday_score is None:
+            yesterday_score = 0
+            # 零点后结算任务尚未完成时，退回到按昨日原始数据即时计算
+            if not self.settlement.is_settled(yesterday):
+                yesterday_data = await self.repo.get_data_by_date(
+                    group_id, user_id, yesterday
+                )
+                if yesterday_data:
+                    y_scores = self.calculator.calculate_scores(yesterday_data)
+                    yesterday_score = y_scores.get("score", 0)
+        logger.debug(f"Yesterday score for {user_id}: {yesterday_score}")
 
         daily_data = await self.repo.get_today_data(group_id, user_id)
 
         # 检查配置中的阈值
-        min_msg = self.config.get("min_msg_threshold", 3)
+        min_msg = settings.min_msg_threshold
         if not daily_data or daily_data.msg_sent < min_msg:
             prefix = (
                 "你" if user_id == event.message_obj.sender.user_id else f"{nickname}"
@@ -204,46 +463,12 @@ class LoveFormulaPlugin(Star):
         archetype_key, archetype_name = ArchetypeClassifier.classify(scores)
 
         # 4. LLM 分析 (获取判词和诊断) - Data Driven
-        llm_result = {"comment": "获取失败", "diagnostics": []}
-        deep_dive_result = None
-
+        # 判词、上下文获取 + 深度侧写、头像下载互不依赖，并发执行
         raw_data_dict = daily_data.model_dump()
-
-        if self.config.get("enable_llm_commentary", True):
-            # 获取对应的 Provider ID
-            global_provider = self.config.get("llm_provider_id", "")
-            commentary_provider = (
-                self.config.get("commentary_provider_id", "") or global_provider
-            )
-            deep_dive_provider = (
-                self.config.get("deep_dive_provider_id", "") or global_provider
-            )
-
-            # 4.1 Basic Commentary (No Context)
-            llm_result = await self.llm.generate_commentary(
-                scores, archetype_name, raw_data_dict, provider_id=commentary_provider
-            )
-
-            # 4.2 Deep Dive (Context Driven)
-            if self.config.get("enable_history_analysis", True):
-                try:
-                    chat_context = await self.history_fetcher.fetch_context(
-                        event, user_id
-                    )
-                    if chat_context:
-                        deep_dive_result = await self.llm.generate_deep_dive(
-                            scores,
-                            archetype_name,
-                            raw_data_dict,
-                            chat_context,
-                            provider_id=deep_dive_provider,
-                        )
-                except Exception as e:
-                    logger.warning(f"Failed to fetch/analyze chat history: {e}")
-            else:
-                logger.debug("History analysis disabled by config.")
-        else:
-            llm_result["comment"] = "LLM点评已关闭。"
+        timer = StageTimer()
+        llm_result, deep_dive_result, avatar_url = await self._run_report_stages(
+            event, settings, user_id, scores, archetype_name, raw_data_dict, timer
+        )
 
         # 5. 组装诊断叙事 (如果 LLM 没给，就用内置逻辑 fallback)
         if not llm_result.get("diagnostics"):
@@ -256,7 +481,6 @@ class LoveFormulaPlugin(Star):
         # 6. 构造渲染数据
         # Template expects: avatar_url, user_name, title, score, metrics, logic_insights, comment, generated_time
         user_name = nickname if nickname else f"用户{user_id}"
-        avatar_url = f"https://q1.qlogo.cn/g?b=qq&nk={user_id}&s=640"
         from datetime import datetime
 
         render_data = {
@@ -283,10 +507,13 @@ class LoveFormulaPlugin(Star):
         logger.debug(f"Render Data: {render_data}")
 
         # 7. 渲染图片
-        theme = self.config.get("theme", "galgame")
+        theme = settings.theme
         try:
-            image_path = await self.renderer.render(render_data, theme_name=theme)
+            with timer.stage("render"):
+                image_path = await self.renderer.render(render_data, theme_name=theme)
+            timer.finish()
             logger.info(f"图片渲染成功: {image_path}")
+            logger.info(f"[LoveFormula] 今日人设各阶段耗时: {timer.summary()}")
 
             try:
                 # 1. 优先尝试本地路径直接发送 (性能更好，减少内存占用)
@@ -380,22 +607,3 @@ class LoveFormulaPlugin(Star):
             "NORMAL": "各项指标分布极其平庸，没有能够引起本庭注意的闪光点或污点，老老实实做个普通路人吧。",
         }
         return reasons.get(key, "数据分布符合该人设的特征判定区间。")
-
-    def _is_group_allowed(self, group_id: int | str | None) -> bool:
-        """检查群组是否在黑白名单允许范围内"""
-        if not group_id:
-            return True  # 私聊通常不限制，或者由其他逻辑处理
-
-        mode = self.config.get("group_list_mode", "none")
-        if mode == "none":
-            return True
-
-        group_list = self.config.get("group_list", [])
-        group_id_str = str(group_id)
-
-        if mode == "whitelist":
-            return group_id_str in group_list
-        if mode == "blacklist":
-            return group_id_str not in group_list
-
-        return True
@@ -1,5 +1,6 @@
 from astrbot.api.event import AstrMessageEvent
 
+from ..parser import ParsedMessage
 from .base import BaseCollector
 
 
@@ -9,10 +10,21 @@ class IckCollector(BaseCollector):
     专门负责追踪：复读刷屏、撤回行为等负面指标。
     """
 
-    def collect_from_message(self, event: AstrMessageEvent, last_text: str) -> dict:
-        """从消息流中采集"""
-        text = event.message_str
-        is_repeat = text and text == last_text
+    def collect_from_message(
+        self,
+        parsed: ParsedMessage,
+        last_digest: bytes | None,
+        chain_repeat: bool = False,
+    ) -> dict:
+        """
+        从消息流中采集。
+        :param last_digest: 该用户上一条消息的内容摘要，与 ParsedMessage.content_hash 比较
+        :param chain_repeat: 是否作为跟随者加入了群复读链 (见 RepeatChainDetector)
+        """
+        text = parsed.text
+        is_repeat = bool(text) and parsed.content_hash == last_digest
+        # 自己刷屏与跟随群复读在同一条消息上只计一次
+        is_repeat = is_repeat or chain_repeat
         return {
             "is_repeat": is_repeat,
             "repeat_inc": 1 if is_repeat else 0,
@@ -1,5 +1,6 @@
 from astrbot.api.event import AstrMessageEvent
 
+from ..parser import ParsedMessage
 from .base import BaseCollector
 
 
@@ -11,21 +12,24 @@ class NostalgiaCollector(BaseCollector):
 
     TOPIC_THRESHOLD = 900  # 15 分钟沉默视为新话题 (破冰)
 
-    def collect(self, event: AstrMessageEvent, last_group_time: float) -> dict:
+    def collect(
+        self,
+        event: AstrMessageEvent,
+        parsed: ParsedMessage,
+        last_group_time: float,
+        current_time: float | None = None,
+    ) -> dict:
         """
         采集旧情指标。
         :param last_group_time: 本群最后一条消息的时间戳 (用于判定话题开启)
+        :param current_time: 消息到达时间，异步处理时由采集管线传入，缺省为当前时间
         """
         # 1. 采集图片发送
-        image_count = 0
-        for component in event.message_obj.message:
-            if isinstance(component, dict) and component.get("type") == "image":
-                image_count += 1
-            elif hasattr(component, "type") and component.type == "image":
-                image_count += 1
+        image_count = parsed.image_count
 
         # 2. 判定话题破冰 (Topic Initiation)
-        current_time = __import__("time").time()
+        if current_time is None:
+            current_time = __import__("time").time()
         is_topic = False
         if (
             last_group_time > 0
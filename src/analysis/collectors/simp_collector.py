@@ -1,5 +1,6 @@
 from astrbot.api.event import AstrMessageEvent
 
+from ..parser import ParsedMessage
 from .base import BaseCollector
 
 
@@ -9,11 +10,10 @@ class SimpCollector(BaseCollector):
     专门负责追踪：主动发言频率、戳一戳、小作文长度等指标。
     """
 
-    def collect(self, event: AstrMessageEvent) -> dict:
-        text = event.message_str
+    def collect(self, event: AstrMessageEvent, parsed: ParsedMessage) -> dict:
         return {
             "msg_sent": 1,
-            "text_len": len(text),
+            "text_len": parsed.text_len,
             "message_id": str(event.message_obj.message_id),
         }
 
@@ -1,6 +1,6 @@
 from astrbot.api.event import AstrMessageEvent
-from astrbot.core.message.components import Reply
 
+from ..parser import ParsedMessage
 from .base import BaseCollector
 
 
@@ -10,10 +10,9 @@ class VibeCollector(BaseCollector):
     专门负责追踪：被回复、被贴贴、被戳一戳等受众反馈指标。
     """
 
-    def collect(self, event: AstrMessageEvent) -> dict:
+    def collect(self, event: AstrMessageEvent, parsed: ParsedMessage) -> dict:
         """采集收到的互动"""
-        reply_target_id = self._find_reply_target(event)
-        return {"reply_target_id": reply_target_id}
+        return {"reply_target_id": parsed.reply_target}
 
     def collect_notice(self, event_data: dict) -> dict:
         """采集收到的通知互动 (贴贴, 戳戳)"""
@@ -24,30 +23,3 @@ class VibeCollector(BaseCollector):
             "reaction_received": 1 if is_reaction else 0,
             "message_id": event_data.get("message_id"),
         }
-
-    def _find_reply_target(self, event: AstrMessageEvent) -> str | None:
-        """解析引用回复目标的逻辑"""
-        for component in event.message_obj.message:
-            if isinstance(component, Reply):
-                if (
-                    hasattr(component, "sender_id")
-                    and component.sender_id
-                    and str(component.sender_id) != "0"
-                ):
-                    return str(component.sender_id)
-                elif hasattr(component, "id") and component.id:
-                    return f"MSG_REF:{component.id}"
-
-            # 兼容 dict
-            if (
-                isinstance(component, dict)
-                and "reply" in str(component.get("type", "")).lower()
-            ):
-                data = component.get("data", {})
-                sender_id = data.get("sender_id") or component.get("sender_id")
-                msg_id = data.get("id") or component.get("id")
-                if sender_id and str(sender_id) != "0":
-                    return str(sender_id)
-                elif msg_id:
-                    return f"MSG_REF:{msg_id}"
-        return None
@@ -0,0 +1,198 @@
+import asyncio
+import copy
+import hashlib
+import time
+from collections.abc import Awaitable, Callable
+
+from astrbot.api import logger
+
+from ..persistence.repo import LoveRepo
+from ..utils.cache import LRUCache
+
+# 参与缓存键的原始计数器 (即判词模板中使用的字段)
+COUNTER_KEYS = (
+    "msg_sent",
+    "reply_received",
+    "reaction_received",
+    "recall_count",
+    "repeat_count",
+    "topic_count",
+)
+
+
+class _Variants:
+    """同一个键下已生成的判词变体"""
+
+    __slots__ = ("variants", "created_at", "cursor")
+
+    def __init__(self, variants: list[dict], created_at: float):
+        self.variants = variants
+        self.created_at = created_at
+        self.cursor = 0
+
+
+class CommentaryCache:
+    """
+    判词结果缓存。
+    判词只取决于四维评分、人设与少量计数器，因此以 (provider, 模板摘要, 人设,
+    量化后的评分, 量化后的计数器) 为键缓存 LLM 结果：评分按 score_bucket 分桶，
+    计数器按 2 的幂分桶，数值小幅变化时仍命中同一个键。
+    只要已有一个变体即视为命中，按轮询顺序返回已有的变体；
+    每个键最多收集 variants 个变体，未收集满时由 fill 在后台补充生成 (同一个键同时只有一个)，
+    不阻塞当前请求，使重复调用的回复逐渐有变化。
+    可选以 SQLite (love_commentary_cache) 作为二级存储，重启后继续复用。
+    """
+
+    def __init__(
+        self,
+        repo: LoveRepo | None = None,
+        max_size: int = 1000,
+        ttl: float = 86400,
+        variants: int = 3,
+        score_bucket: int = 5,
+    ):
+        """
+        :param repo: 数据仓库，传入时启用持久化
+        :param max_size: 内存中最多缓存的键数
+        :param ttl: 条目自首个变体生成起的存活秒数
+        :param variants: 每个键收集的变体数
+        :param score_bucket: 评分分桶宽度
+        """
+        self.repo = repo
+        self.ttl = max(1.0, ttl)
+        self.variants = max(1, variants)
+        self.score_bucket = max(1, score_bucket)
+        self._entries = LRUCache(max_size)
+        # key -> 进行中的后台补充任务
+        self._filling: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.store_hits = 0
+        self.fills = 0
+
+    @classmethod
+    def from_config(
+        cls, config: dict, repo: LoveRepo | None = None
+    ) -> "CommentaryCache":
+        return cls(
+            repo if config.get("persist", False) else None,
+            max_size=config.get("max_size", 1000),
+            ttl=config.get("ttl_hours", 24) * 3600,
+            variants=config.get("variants", 3),
+            score_bucket=config.get("score_bucket", 5),
+        )
+
+    def make_key(
+        self,
+        provider_id: str | None,
+        template: str,
+        archetype: str,
+        scores: dict,
+        raw_data: dict,
+    ) -> str:
+        buckets = [
+            int(scores[name]) // self.score_bucket
+            for name in ("simp", "vibe", "ick", "nostalgia")
+        ]
+        # 0, 1, 2-3, 4-7, 8-15 ...
+        counters = [
+            int(raw_data.get(name, 0) or 0).bit_length() for name in COUNTER_KEYS
+        ]
+        template_hash = hashlib.sha1(template.encode("utf-8")).hexdigest()[:16]
+        raw = f"{provider_id or ''}|{template_hash}|{archetype}|{buckets}|{counters}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> dict | None:
+        """已有变体时按轮询返回其中一个 (副本)，否则返回 None"""
+        entry = await self._load(key)
+        if entry is None or not entry.variants:
+            self.misses += 1
+            return None
+        self.hits += 1
+        result = entry.variants[entry.cursor % len(entry.variants)]
+        entry.cursor += 1
+        return copy.deepcopy(result)
+
+    def fill(self, key: str, generate: Callable[[], Awaitable[dict]]):
+        """变体未收集满时在后台调用 generate 补充一个，不阻塞调用方"""
+        if key in self._filling:
+            return
+        entry = self._entries.get(key, count=False)
+        if entry is not None and len(entry.variants) >= self.variants:
+            return
+        task = asyncio.create_task(self._fill(key, generate))
+        self._filling[key] = task
+        task.add_done_callback(lambda _: self._filling.pop(key, None))
+
+    async def _fill(self, key: str, generate: Callable[[], Awaitable[dict]]):
+        try:
+            result = await generate()
+        except Exception as e:
+            logger.warning(f"CommentaryCache: 后台补充判词失败: {e}")
+            return
+        if result and result.get("comment"):
+            await self.add(key, result)
+            self.fills += 1
+
+    async def add(self, key: str, result: dict):
+        """记录一次新生成的判词"""
+        entry = await self._load(key)
+        if entry is None:
+            entry = _Variants([], time.time())
+            self._entries.set(key, entry)
+        if len(entry.variants) >= self.variants:
+            return
+        entry.variants.append(copy.deepcopy(result))
+        if self.repo is not None:
+            try:
+                await self.repo.save_commentary_variants(
+                    key, entry.variants, entry.created_at
+                )
+            except Exception as e:
+                logger.warning(f"CommentaryCache: 保存判词缓存失败: {e}")
+
+    async def _load(self, key: str) -> _Variants | None:
+        entry = self._entries.get(key, count=False)
+        if entry is not None and time.time() - entry.created_at < self.ttl:
+            return entry
+        if entry is not None:
+            self._entries.pop(key)
+        if self.repo is None:
+            return None
+        try:
+            stored = await self.repo.get_commentary_variants(
+                key, time.time() - self.ttl
+            )
+        except Exception as e:
+            logger.warning(f"CommentaryCache: 读取判词缓存失败: {e}")
+            return None
+        if stored is None:
+            return None
+        self.store_hits += 1
+        entry = _Variants(*stored)
+        self._entries.set(key, entry)
+        return entry
+
+    async def prune(self) -> int:
+        """删除持久化存储中已过期的条目"""
+        if self.repo is None:
+            return 0
+        return await self.repo.prune_commentary_cache(time.time() - self.ttl)
+
+    async def stop(self):
+        tasks = list(self._filling.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._filling.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "keys": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "store_hits": self.store_hits,
+            "fills": self.fills,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,202 @@
+import bisect
+import re
+
+GAP_ROLE = "[System]"
+GAP_LINE = "[...] [System] System: ... (此处省略部分对话) ..."
+
+# 连续出现的同一种占位符，如 "[表情][表情][表情]"
+_PLACEHOLDER_RUN = re.compile(r"(\[图片\]|\[表情\])(?:\s*\1)+")
+_MEDIA_TOKEN = re.compile(r"\[图片\]|\[表情\]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算 token 数：CJK 等非 ASCII 字符按 1 token/字，ASCII 按 4 字符/token。
+    只依赖 len 与 encode，两者都在 C 中完成，不需要分词器。
+    """
+    chars = len(text)
+    # UTF-8 下 CJK 字符占 3 字节，ASCII 占 1 字节
+    wide = (len(text.encode("utf-8")) - chars) // 2
+    return wide + (chars - wide + 3) // 4
+
+
+_GAP_TOKENS = estimate_tokens(GAP_LINE) + 1
+
+
+def _collapse_placeholders(text: str) -> str:
+    return _PLACEHOLDER_RUN.sub(
+        lambda m: f"{m.group(1)}×{len(_MEDIA_TOKEN.findall(m.group(0)))}", text
+    )
+
+
+def _is_media_only(text: str) -> bool:
+    return not _MEDIA_TOKEN.sub("", text).strip()
+
+
+def _sender(msg: dict) -> tuple:
+    return msg.get("user_id"), msg["nickname"]
+
+
+class _Line:
+    """压缩过程中的一行上下文"""
+
+    __slots__ = ("msg", "content", "count", "media", "gap_before", "tokens")
+
+    def __init__(self, msg: dict, content: str, gap_before: bool):
+        self.msg = msg
+        self.content = content
+        self.count = 1
+        self.media: list[str] | None = None
+        self.gap_before = gap_before
+        self.tokens = 0
+
+    def render(self) -> str:
+        content = self.content
+        if self.media is not None:
+            content = " ".join(
+                f"{token}×{self.media.count(token)}"
+                if self.media.count(token) > 1
+                else token
+                for token in dict.fromkeys(self.media)
+            )
+        elif self.count > 1:
+            content = f"{content} (×{self.count})"
+        msg = self.msg
+        return f"[{msg['time']}] {msg['role']} {msg['nickname']}: {content}"
+
+
+class ContextCompactor:
+    """
+    深度侧写上下文压缩。
+    在拼接 context_text 之前按 token 预算裁剪聊天记录：截断过长的消息，
+    合并同一人连续重复的发言与连续的纯 [图片]/[表情] 消息，
+    超出预算时按与 [Target] 发言的距离由近到远 (距离相同时优先较新的消息) 选取，
+    被跳过的位置以省略标记连接。只影响发给 LLM 的文本，chat_context 本身不变。
+    """
+
+    def __init__(self, token_budget: int = 3000, max_message_chars: int = 200):
+        """
+        :param token_budget: 上下文文本的 token 预算 (估算值)
+        :param max_message_chars: 单条消息保留的最大字符数
+        """
+        self.token_budget = max(100, token_budget)
+        self.max_message_chars = max(10, max_message_chars)
+
+    @classmethod
+    def from_config(cls, config: dict) -> "ContextCompactor":
+        return cls(
+            token_budget=config.get("token_budget", 3000),
+            max_message_chars=config.get("max_message_chars", 200),
+        )
+
+    def compact(self, chat_context: list[dict]) -> tuple[str, dict]:
+        """返回 (压缩后的上下文文本, 统计信息)"""
+        tokens_in = sum(
+            estimate_tokens(
+                f"[{msg['time']}] {msg['role']} {msg['nickname']}: {msg['content']}"
+            )
+            + 1
+            for msg in chat_context
+        )
+        lines, truncated = self._collapse(chat_context)
+        for line in lines:
+            line.tokens = estimate_tokens(line.render()) + 1  # 换行符
+        total = sum(
+            line.tokens + (_GAP_TOKENS if line.gap_before else 0) for line in lines
+        )
+
+        if total <= self.token_budget:
+            kept = list(enumerate(lines))
+        else:
+            kept = self._select(lines)
+
+        out = []
+        previous = -1
+        for index, line in kept:
+            if out and (line.gap_before or index != previous + 1):
+                out.append(GAP_LINE)
+            out.append(line.render())
+            previous = index
+        text = "\n".join(out)
+
+        stats = {
+            "messages": sum(1 for msg in chat_context if msg["role"] != GAP_ROLE),
+            "lines": len(lines),
+            "kept": len(kept),
+            "truncated": truncated,
+            "tokens_in": tokens_in,
+            "tokens_out": estimate_tokens(text),
+            "budget": self.token_budget,
+        }
+        return text, stats
+
+    def _collapse(self, chat_context: list[dict]) -> tuple[list[_Line], int]:
+        """截断过长消息，合并连续重复的发言与连续的纯图片/表情消息"""
+        lines: list[_Line] = []
+        truncated = 0
+        gap = False
+        for msg in chat_context:
+            if msg["role"] == GAP_ROLE:
+                gap = True
+                continue
+            raw = str(msg["content"])
+            media = _MEDIA_TOKEN.findall(raw) if _is_media_only(raw) else None
+            content = _collapse_placeholders(raw)
+            if len(content) > self.max_message_chars:
+                content = content[: self.max_message_chars] + "…(截断)"
+                truncated += 1
+            last = lines[-1] if lines and not gap else None
+            if last is not None and _sender(last.msg) == _sender(msg):
+                if media is not None and last.media is not None:
+                    last.media.extend(media)
+                    continue
+                if media is None and last.media is None and last.content == content:
+                    last.count += 1
+                    continue
+            line = _Line(msg, content, gap)
+            line.media = media
+            lines.append(line)
+            gap = False
+        return lines, truncated
+
+    def _select(self, lines: list[_Line]) -> list[tuple[int, _Line]]:
+        """按与 [Target] 发言的距离选取，直到填满预算"""
+        size = len(lines)
+        far = size + 1
+        distance = [far] * size
+        last_target = None
+        for i, line in enumerate(lines):
+            if line.msg["role"] == "[Target]":
+                last_target = i
+            if last_target is not None:
+                distance[i] = i - last_target
+        last_target = None
+        for i in range(size - 1, -1, -1):
+            if lines[i].msg["role"] == "[Target]":
+                last_target = i
+            if last_target is not None:
+                distance[i] = min(distance[i], last_target - i)
+
+        # 省略标记同样占用预算：新增一行时按其前后最近的已选行计算标记数的变化
+        def gap(a: int, b: int) -> int:
+            return int(b != a + 1 or lines[b].gap_before)
+
+        chosen: list[int] = []
+        used = 0
+        for i in sorted(range(size), key=lambda i: (distance[i], -i)):
+            pos = bisect.bisect(chosen, i)
+            prev = chosen[pos - 1] if pos else None
+            nxt = chosen[pos] if pos < len(chosen) else None
+            markers = 0
+            if prev is not None:
+                markers += gap(prev, i)
+            if nxt is not None:
+                markers += gap(i, nxt)
+            if prev is not None and nxt is not None:
+                markers -= 1
+            cost = lines[i].tokens + markers * _GAP_TOKENS
+            if used + cost > self.token_budget:
+                continue
+            chosen.insert(pos, i)
+            used += cost
+        return [(i, lines[i]) for i in chosen]
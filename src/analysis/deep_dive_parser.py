@@ -0,0 +1,138 @@
+import re
+
+# 输入长度上限 (字符)，超出部分直接丢弃，保证解析耗时有界
+MAX_PARSE_CHARS = 32768
+# 输出规模上限，避免异常输出生成过大的证据列表
+MAX_SCENES = 10
+MAX_DIALOGUE = 30
+# 超过该长度的响应交给工作线程解析，不阻塞事件循环
+THREAD_THRESHOLD = 8192
+
+# repair_json 的词法单元：字符串体、话题标签、多余的逗号、其余普通字符
+_STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+_HASHTAG = re.compile(r'(#+)\s*"?(\w*)')
+_TRAILING_COMMA = re.compile(r",\s*(?=[\]\}])")
+_PLAIN = re.compile(r'[^"#,]+')
+
+# 字段锚点：可选引号 + 字段名 + 可选引号 + 冒号 (半角/全角)。
+# 只在锚点处匹配，字段值即相邻两个锚点之间的文本，整个响应只扫描一遍
+_ANCHOR = re.compile(
+    r"""(?<![A-Za-z_])["']?(keywords|analysis|evidence|title|reason|dialogue|role|content)["']?\s*[:：]""",
+    re.IGNORECASE,
+)
+_TAG = re.compile(r"""#\s*["']?([^"',，\s\]\}#]+)""")
+_TITLE = re.compile(r"""[^"',]+""")
+_REASON = re.compile(r"""[^"',\}]+""")
+_QUOTED_VALUE = re.compile(r"""[^"']+""")
+_VALUE_EDGES = "\"'\n\r\t ,，{}[]"
+
+
+def _head(value: str, pattern: re.Pattern) -> str:
+    """去掉前导空白与引号后，取第一个不含分隔符的片段"""
+    match = pattern.match(value.lstrip(" \t\r\n\"'"))
+    return match.group(0).strip() if match else ""
+
+
+def repair_json(text: str) -> str:
+    """
+    单遍修复 LLM 输出中常见的 JSON 语法错误 (只处理字符串以外的部分)：
+    - 未加引号的话题标签 #tag、#"tag"、##tag -> "#tag"，孤立的 # -> "#"
+    - 数组/对象末尾多余的逗号
+    每个位置只被一个预编译表达式匹配一次，耗时与输入长度成正比。
+    """
+    text = text[:MAX_PARSE_CHARS]
+    out = []
+    i = 0
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if ch == '"':
+            # 原样复制字符串 (含转义)，未闭合时复制到末尾
+            end = _STRING_BODY.match(text, i + 1).end()
+            end = min(end + 1, n)
+            out.append(text[i:end])
+            i = end
+        elif ch == "#":
+            match = _HASHTAG.match(text, i)
+            word = match.group(2)
+            if word:
+                out.append(f'"#{word}"')
+                i = match.end()
+                if i < n and text[i] == '"':
+                    i += 1
+            else:
+                out.append('"#"')
+                i = match.end(1)
+        elif ch == ",":
+            match = _TRAILING_COMMA.match(text, i)
+            if match:
+                i = match.end()
+            else:
+                out.append(ch)
+                i += 1
+        else:
+            end = _PLAIN.match(text, i).end()
+            out.append(text[i:end])
+            i = end
+    return "".join(out)
+
+
+def reconstruct_fields(text: str) -> dict | None:
+    """
+    JSON 解析失败时的兜底提取。
+    用一个预编译的锚点表达式一次扫描出所有字段，按出现顺序组装：
+    title 开始一个新的证据场景，role/content 成对追加到当前场景的对话中。
+    """
+    text = text[:MAX_PARSE_CHARS]
+    anchors = list(_ANCHOR.finditer(text))
+    keywords: list[str] = []
+    analysis = ""
+    evidence: list[dict] = []
+    scene = None
+    role = None
+
+    for index, match in enumerate(anchors):
+        key = match.group(1).lower()
+        end = anchors[index + 1].start() if index + 1 < len(anchors) else len(text)
+        value = text[match.end() : end]
+
+        if key == "keywords" and not keywords:
+            keywords = [f"#{tag}" for tag in _TAG.findall(value)]
+        elif key == "analysis" and not analysis:
+            analysis = value.strip(_VALUE_EDGES)
+        elif key == "title":
+            if len(evidence) >= MAX_SCENES:
+                break
+            scene = {
+                "title": _head(value, _TITLE),
+                "reason": "由正则表达式兜底提取 (Reason Extraction Failed)",
+                "dialogue": [],
+            }
+            evidence.append(scene)
+            role = None
+        elif key == "reason" and scene is not None:
+            reason = _head(value, _REASON)
+            if reason:
+                scene["reason"] = reason
+        elif key == "role":
+            role = _head(value, _QUOTED_VALUE)
+        elif key == "content" and scene is not None and role:
+            content = _head(value, _QUOTED_VALUE)
+            if content and len(scene["dialogue"]) < MAX_DIALOGUE:
+                scene["dialogue"].append({"role": role, "content": content})
+            role = None
+
+    evidence = [item for item in evidence if item["title"] and item["dialogue"]]
+    if keywords or analysis or evidence:
+        return {"keywords": keywords, "content": analysis, "evidence": evidence}
+    return None
+
+
+def extract_json_object(text: str) -> str:
+    """截取最外层的 {...} (兼容 Markdown 代码块与前后的说明文字)"""
+    text = text.strip()
+    start = text.find("{")
+    end = text.rfind("}")
+    if start != -1 and end != -1:
+        return text[start : end + 1]
+    return text
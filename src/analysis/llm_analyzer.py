@@ -1,14 +1,31 @@
+import asyncio
 import json
-import re
 
 from astrbot.api import logger
 from astrbot.core.star.context import Context
 
+from .commentary_cache import CommentaryCache
+from .context_compactor import ContextCompactor, estimate_tokens
+from .deep_dive_parser import (
+    THREAD_THRESHOLD,
+    extract_json_object,
+    reconstruct_fields,
+    repair_json,
+)
+
 
 class LLMAnalyzer:
-    def __init__(self, context: Context, config: dict = None):
+    def __init__(
+        self,
+        context: Context,
+        config: dict = None,
+        commentary_cache: CommentaryCache | None = None,
+        context_compactor: ContextCompactor | None = None,
+    ):
         self.context = context
         self.config = config or {}
+        self.commentary_cache = commentary_cache
+        self.context_compactor = context_compactor
 
     async def generate_commentary(
         self, scores: dict, archetype: str, raw_data: dict, provider_id: str = None
@@ -72,148 +89,324 @@ class LLMAnalyzer:
             logger.error(f"Failed to format judgment prompt: {e}")
             prompt = prompt_template  # Use raw template if format fails (might produce weird output but better than crash)
 
-        # 调用 AstrBot LLM API
-        try:
-            response = await self.context.llm_generate(
-                prompt=prompt, chat_provider_id=provider_id
+        cache_key = None
+        if self.commentary_cache is not None:
+            cache_key = self.commentary_cache.make_key(
+                provider_id, prompt_template, archetype, scores, raw_data
             )
-            text = response.completion_text
-
-            # 解析结果
-            parts_judgement = text.split("[JUDGMENT]")
-            remaining = parts_judgement[1] if len(parts_judgement) > 1 else text
-
-            parts_diag = remaining.split("[DIAGNOSTICS]")
-            judgment = parts_diag[0].strip()
-            diagnostics_raw = parts_diag[1].strip() if len(parts_diag) > 1 else ""
-
-            diagnostics = [d.strip() for d in diagnostics_raw.split("\n") if d.strip()]
-            diagnostics = [
-                d[2:].strip() if d.startswith(("1.", "2.", "3.", "4.")) else d
-                for d in diagnostics
-            ]
+            cached = await self.commentary_cache.get(cache_key)
+            if cached is not None:
+                logger.debug(f"LLM Commentary cache hit: {cached['comment']}")
+                # 变体未收集满时在后台补充，本次直接返回已有的变体
+                self.commentary_cache.fill(
+                    cache_key, lambda: self._request_commentary(prompt, provider_id)
+                )
+                return cached
 
-            logger.info(f"LLM Commentary Generated: {judgment}")
-            return {"comment": judgment, "diagnostics": diagnostics}
+        try:
+            result = await self._request_commentary(prompt, provider_id)
+            if cache_key is not None and result["comment"]:
+                await self.commentary_cache.add(cache_key, result)
+            return result
         except Exception as e:
             logger.error(f"LLM Commentary failed: {e}")
             return {"comment": "LLM 暂时无法处理，请稍后再试。", "diagnostics": []}
 
-    def _repair_json(self, text: str) -> str:
-        """Attempts to repair common LLM JSON syntax errors."""
+    async def _request_commentary(self, prompt: str, provider_id: str = None) -> dict:
+        """调用 AstrBot LLM API 生成判词"""
+        response = await self.context.llm_generate(
+            prompt=prompt, chat_provider_id=provider_id
+        )
+        result = self._parse_commentary(response.completion_text)
+        logger.info(f"LLM Commentary Generated: {result['comment']}")
+        return result
 
-        # 1. Fix unquoted hashtags and hallucinations like #"Tag" or ##Tag
-        # Match strings or hashtags (possibly with leading/trailing quotes/junk)
-        # Using a "match and skip" strategy for strings to avoid false positives.
-        pattern = r'("(?:\\.|[^"\\])*")|(#\s*"?[\w\u4e00-\u9fa5]+"?)|(#+)'
+    async def generate_combined(
+        self,
+        scores: dict,
+        archetype: str,
+        raw_data: dict,
+        chat_context: list,
+        provider_id: str = None,
+        members: dict | None = None,
+        max_evidence: int = 3,
+    ) -> tuple[dict | None, dict | None]:
+        """
+        合并模式：一次调用同时生成判词与深度侧写，共用同一份评分数据。
+        返回 (判词结果, 深度侧写结果)，解析失败的部分为 None，由调用方退回到单独调用。
+        """
+        context_text, context_stats = self._context_text(chat_context)
+        s, v, i, n = scores["simp"], scores["vibe"], scores["ick"], scores["nostalgia"]
+        format_data = {
+            "archetype": archetype,
+            "s": s,
+            "v": v,
+            "i": i,
+            "n": n,
+            "msg_sent": raw_data.get("msg_sent", 0),
+            "reply_received": raw_data.get("reply_received", 0),
+            "reaction_received": raw_data.get("reaction_received", 0),
+            "recall_count": raw_data.get("recall_count", 0),
+            "repeat_count": raw_data.get("repeat_count", 0),
+            "topic_count": raw_data.get("topic_count", 0),
+            "context_text": context_text,
+            "max_evidence": max_evidence,
+        }
 
-        def replace_tag(match):
-            if match.group(1):  # It's a string, return as is
-                return match.group(1)
+        template_obj = self.config.get("llm_combined_template", {})
+        if isinstance(template_obj, str):
+            prompt_template = template_obj
+        else:
+            prompt_template = template_obj.get("template", "")
 
-            tag_content = match.group(2)
-            if tag_content:
-                # Normalize: remove stray quotes and # prefix, ensure single #
-                word = tag_content.lstrip("#").strip().strip('"')
-                if word:
-                    return f'"#{word}"'
+        # Fallback default
+        if not prompt_template:
+            prompt_template = """
+你同时担任 Galgame 《恋爱法庭》的首席裁判官与心理侧写师，需要对“被告”（标记为 [Target] 的群成员）一次性完成宣判与深度侧写。
 
-            # Stray # or ##, just quote it to avoid syntax error
-            return '"#"'
+【案件卷宗：被告数据】
+- 最终判定人设: {archetype}
+- 纯爱值 (Simp): {s}/100（关联：主动投入、自我感动）
+- 存在感 (Vibe): {v}/100（关联：被动反馈、社交引力）
+- 败犬值 (Ick): {i}/100（关联：社交尴尬、边缘化行为）
+- 旧情指数 (Nostalgia): {n}/100（关联：破冰能力、历史底蕴）
+- 营业频率: {msg_sent} 条发言；被回复 {reply_received} 次，被贴贴/表态 {reaction_received} 次
+- 败犬行为: 撤回 {recall_count} 条消息，复读 {repeat_count} 次；开启新话题 {topic_count} 次
 
-        text = re.sub(pattern, replace_tag, text)
+【群聊片段】
+{context_text}
 
-        # 2. Fix trailing commas
-        text = re.sub(r",\s*([\]\}])", r"\1", text)
+【输出要求】
+请严格按以下三段格式输出，禁止任何多余解释：
+[JUDGMENT]
+一段极度毒舌且充满魅力的宣判。必须包含特定的 ACG 角色属性。
+[DIAGNOSTICS]
+1. 针对纯爱值与存在感的扎心点评。
+2. 针对败犬值（撤回、刷屏）的人格羞辱式解构。
+3. 针对旧情指数/破冰能力的分析。
+[DEEP_DIVE]
+一个 JSON 对象。ANALYSIS 需冷静透彻，并摘录 1-2 句 [Target] 的原话作为佐证；EVIDENCE 筛选 {max_evidence} 个最有代表性的对话片段：
+{{
+    "DEEP_PSYCHE": {{
+        "KEYWORDS": ["#关键词1", "#关键词2", "#关键词3"],
+        "ANALYSIS": "一段深度心理侧写。"
+    }},
+    "EVIDENCE": [
+        {{
+            "title": "证言一：(例如：强行解释)",
+            "reason": "简短说明为何选此段作为证据",
+            "dialogue": [
+                {{"role": "对话者的真实昵称", "content": "对话内容..."}},
+                {{"role": "[Target]", "content": "目标用户的回应..."}}
+            ]
+        }}
+    ]
+}}
+**role 必须使用上述聊天记录中出现的真实昵称或 '[Target]'，内容必须摘录自原始记录。**
+"""
 
-        return text
+        try:
+            prompt = prompt_template.format(**format_data)
+        except Exception as e:
+            logger.error(f"Failed to format combined prompt: {e}")
+            return None, None
+        self._log_prompt_size("combined", prompt, context_stats)
 
-    def _reconstruct_from_regex(self, text: str) -> dict | None:
-        """Heuristic extraction of deep dive data using regex fallback."""
-        # 1. Keywords: Matches Keywords: ["#a", "#b"] or Keywords: #a #b
-        kw_match = re.search(
-            r'(?i)(?:KEYWORDS|keywords)["\']?\s*[:：]\s*[\[\(]?([^\]\)]+)[\]\)]?', text
-        )
-        keywords = []
-        if kw_match:
-            # More permissive: extract anything starting with # and capture the word
-            raw_kws = re.findall(
-                r'#\s*["\']?([^"\',，\s\]\}]+)["\']?', kw_match.group(1)
+        try:
+            response = await self.context.llm_generate(
+                prompt=prompt, chat_provider_id=provider_id
             )
-            keywords = [f"#{k.strip()}" for k in raw_kws if k.strip()]
+            text = response.completion_text
+        except Exception as e:
+            logger.error(f"LLM Combined call failed: {e}")
+            return None, None
+
+        judgment_text, marker, deep_text = text.partition("[DEEP_DIVE]")
+        commentary = None
+        if "[JUDGMENT]" in judgment_text:
+            commentary = self._parse_commentary(judgment_text)
+            if not commentary["comment"]:
+                commentary = None
+
+        deep_dive = None
+        if marker:
+            try:
+                deep_dive = await self._parse_deep_dive_async(
+                    deep_text, chat_context, members
+                )
+            except Exception as e:
+                logger.warning(f"Combined deep dive parsing failed: {e}")
+            if deep_dive and not (
+                deep_dive.get("content") or deep_dive.get("evidence")
+            ):
+                deep_dive = None
+
+        logger.info(
+            f"LLM Combined Generated: judgment={'ok' if commentary else 'failed'}, "
+            f"deep_dive={'ok' if deep_dive else 'failed'}"
+        )
+        return commentary, deep_dive
+
+    def _context_text(self, chat_context: list) -> tuple[str, dict]:
+        """拼接发给 LLM 的聊天记录，配置了压缩器时按 token 预算压缩"""
+        if self.context_compactor is not None:
+            return self.context_compactor.compact(chat_context)
+        text = "\n".join(
+            f"[{msg['time']}] {msg['role']} {msg['nickname']}: {msg['content']}"
+            for msg in chat_context
+        )
+        return text, {"lines": len(chat_context), "tokens_out": estimate_tokens(text)}
 
-        # 2. Analysis: Extracts content after ANALYSIS:
-        ana_match = re.search(
-            r'(?i)(?:ANALYSIS|analysis)["\']?\s*[:：]\s*["\']?(.*?)(?:["\']?\s*[,，]?\s*(?:"|EVIDENCE|evidence)|$)',
-            text,
-            re.DOTALL,
+    @staticmethod
+    def _log_prompt_size(kind: str, prompt: str, context_stats: dict):
+        logger.info(
+            f"LLM {kind} prompt: {len(prompt)} chars, "
+            f"~{estimate_tokens(prompt)} tokens, context {context_stats}"
         )
-        analysis = ""
-        if ana_match:
-            analysis = ana_match.group(1).strip().strip('",')
-
-        # 3. Evidence: Extracts scenes and their dialogues
-        evidence = []
-        # Find scenes using title/TITLE as anchors
-        scene_blocks = re.split(r'(?i)title["\']?\s*[:：]', text)[1:]
-        for block in scene_blocks:
-            # Extract title (up to the next key or newline/comma)
-            title_match = re.match(r'\s*["\']?([^"\',]+)["\']?', block)
-            if not title_match:
-                continue
-            title = title_match.group(1).strip()
-
-            # NEW: Extract the actual reason from the block
-            reason = "由正则表达式兜底提取 (Reason Extraction Failed)"
-            reason_match = re.search(
-                r'(?i)reason["\']?\s*[:：]\s*["\']?([^"\',\}]+)["\']?', block
-            )
-            if reason_match:
-                reason = reason_match.group(1).strip()
 
-            # Find the dialogue portion in this block
-            diag_match = re.search(
-                r'(?i)dialogue["\']?\s*[:：]\s*\[(.*)', block, re.DOTALL
+    def _parse_commentary(self, text: str) -> dict:
+        """解析 [JUDGMENT] / [DIAGNOSTICS] 格式的判词"""
+        parts_judgement = text.split("[JUDGMENT]")
+        remaining = parts_judgement[1] if len(parts_judgement) > 1 else text
+
+        parts_diag = remaining.split("[DIAGNOSTICS]")
+        judgment = parts_diag[0].strip()
+        diagnostics_raw = parts_diag[1].strip() if len(parts_diag) > 1 else ""
+
+        diagnostics = [d.strip() for d in diagnostics_raw.split("\n") if d.strip()]
+        diagnostics = [
+            d[2:].strip() if d.startswith(("1.", "2.", "3.", "4.")) else d
+            for d in diagnostics
+        ]
+        return {"comment": judgment, "diagnostics": diagnostics}
+
+    async def _parse_deep_dive_async(
+        self, text: str, chat_context: list, members: dict | None = None
+    ) -> dict | None:
+        """较长的响应在工作线程中解析，避免阻塞事件循环"""
+        if len(text) > THREAD_THRESHOLD:
+            return await asyncio.to_thread(
+                self._parse_deep_dive, text, chat_context, members
             )
-            if not diag_match or not diag_match.group(1):
-                continue
-
-            diag_blob = diag_match.group(1)
-            # Find the closing bracket for this dialogue array
-            last_bracket = diag_blob.rfind("]")
-            if last_bracket != -1:
-                diag_blob = diag_blob[:last_bracket]
-
-            dialogue = []
-            # Extract entries like {"role": "...", "content": "..."}
-            entries = re.findall(r"\{([^{}]+)\}", diag_blob)
-            for entry in entries:
-                role_m = re.search(
-                    r'["\']?role["\']?\s*[:：]\s*["\']?([^"\']+)["\']?',
-                    entry,
-                    re.IGNORECASE,
-                )
-                content_m = re.search(
-                    r'["\']?content["\']?\s*[:：]\s*["\']?([^"\']+)["\']?',
-                    entry,
-                    re.IGNORECASE,
-                )
-                if role_m and content_m:
-                    dialogue.append(
-                        {
-                            "role": role_m.group(1).strip(),
-                            "content": content_m.group(1).strip(),
-                        }
-                    )
-
-            if dialogue:
-                evidence.append(
-                    {"title": title, "reason": reason, "dialogue": dialogue}
-                )
+        return self._parse_deep_dive(text, chat_context, members)
+
+    def _parse_deep_dive(
+        self, text: str, chat_context: list, members: dict | None = None
+    ) -> dict | None:
+        """解析深度侧写结果：优先按 JSON 解析，失败时退回正则提取"""
+        # Try parsing as JSON first (robust handling)
+        try:
+            logger.debug(f"Raw LLM Deep Dive Response: {text}")
+
+            # 1. Remove Markdown Code Blocks / surrounding text
+            clean_text = extract_json_object(text)
+
+            # 2. Repair common JSON errors
+            clean_text = repair_json(clean_text)
+
+            logger.debug(f"Repaired JSON Text: {clean_text}")
+            data_json = json.loads(clean_text)
+
+            # Handle structure: {"DEEP_PSYCHE": {"KEYWORDS": ..., "ANALYSIS": ...}, "EVIDENCE": ...}
+            result = {}
+            if "DEEP_PSYCHE" in data_json:
+                root = data_json["DEEP_PSYCHE"]
+                keywords_str = root.get("KEYWORDS", "")
+                analysis_str = root.get("ANALYSIS", "")
+
+                # Parse keywords string "#tag1 #tag2" -> ["#tag1", "#tag2"]
+                if isinstance(keywords_str, str):
+                    keywords = [
+                        k.strip()
+                        for k in keywords_str.split()
+                        if k.strip().startswith("#")
+                    ]
+                elif isinstance(keywords_str, list):
+                    keywords = keywords_str
+                else:
+                    keywords = []
+
+                result = {"keywords": keywords, "content": analysis_str}
+                logger.info(f"LLM Deep Dive Generated (JSON): {analysis_str[:50]}...")
+
+            if "EVIDENCE" in data_json:
+                evidence_list = data_json["EVIDENCE"]
+
+                self._map_evidence_uids(evidence_list, chat_context, members)
+                result["evidence"] = evidence_list
+                logger.info(f"LLM Evidence Generated: {len(result['evidence'])} scenes")
+
+            return result
+
+        except json.JSONDecodeError:
+            pass  # Fallback to text parsing
+        except Exception as e:
+            logger.warning(f"JSON parsing failed, trying text parse: {e}")
 
-        if keywords or analysis or evidence:
-            return {"keywords": keywords, "content": analysis, "evidence": evidence}
-        return None
+        # Fallback: Text Parsing (Lexical/Regex extraction)
+        logger.info("Falling back to Lexical/Regex extraction for deep dive.")
+        result = reconstruct_fields(text)
+        if not result:
+            return None
+
+        # Apply mapping to evidence if found in regex fallback
+        if result.get("evidence"):
+            self._map_evidence_uids(result["evidence"], chat_context, members)
+        return result
+
+    def _map_evidence_uids(
+        self, evidence: list, chat_context: list, members: dict | None = None
+    ):
+        """
+        为证据对话中的每个 role 注入 user_id。
+        members 为群成员表 (user_id -> GroupMember)，补充上下文中没有出现的昵称/群名片。
+        """
+        # Create nickname -> user_id map from chat_context
+        # We also try to identify the Target user id
+        user_map = {}
+        target_uid = None
+        for msg in chat_context:
+            uid = msg.get("user_id")
+            nick = msg.get("nickname")
+            role_tag = msg.get("role", "")
+            if uid:
+                if nick:
+                    user_map[nick.lower()] = uid
+                # Also map role indicators
+                user_map[str(uid)] = uid
+            if role_tag == "[Target]" and uid:
+                target_uid = uid
+
+        # 群成员表中的群名片/昵称只做精确匹配，避免短昵称误命中
+        member_map = {}
+        for uid, member in (members or {}).items():
+            for name in (member.nickname, member.card):
+                if name:
+                    member_map.setdefault(name.lower(), uid)
+
+        for scene in evidence:
+            for dialog in scene.get("dialogue", []):
+                role_name = str(dialog.get("role", "")).lower()
+                # Priority 1: Target alias
+                if (
+                    "target" in role_name or "被告" in role_name or "我" == role_name
+                ) and target_uid:
+                    dialog["user_id"] = target_uid
+                    continue
+
+                # Priority 2: Exact match in map
+                uid = user_map.get(role_name) or member_map.get(role_name)
+                if uid:
+                    dialog["user_id"] = uid
+                    continue
+
+                # Priority 3: Loose match (contains nick or uid)
+                for nick_lower, uid in user_map.items():
+                    if nick_lower in role_name or role_name in nick_lower:
+                        dialog["user_id"] = uid
+                        break
+                else:
+                    logger.debug(f"Could not map role '{role_name}' to any UID")
 
     async def generate_deep_dive(
         self,
@@ -222,18 +415,15 @@ class LLMAnalyzer:
         raw_data: dict,
         chat_context: list,
         provider_id: str = None,
+        members: dict | None = None,
+        max_evidence: int = 3,
     ) -> dict:
         """New method for deep contextual analysis"""
         if not chat_context:
             return None
 
         # Format chat context
-        lines = []
-        for msg in chat_context:
-            lines.append(
-                f"[{msg['time']}] {msg['role']} {msg['nickname']}: {msg['content']}"
-            )
-        context_text = "\n".join(lines)
+        context_text, context_stats = self._context_text(chat_context)
 
         s, v, i, n = scores["simp"], scores["vibe"], scores["ick"], scores["nostalgia"]
 
@@ -248,7 +438,7 @@ class LLMAnalyzer:
             "reply_received": raw_data.get("reply_received", 0),
             "recall_count": raw_data.get("recall_count", 0),
             "context_text": context_text,
-            "max_evidence": self.config.get("max_evidence_scenes", 3),
+            "max_evidence": max_evidence,
         }
 
         # Get prompt template from config
@@ -312,165 +502,15 @@ class LLMAnalyzer:
         except Exception as e:
             logger.error(f"Failed to format deep dive prompt: {e}")
             return None
+        self._log_prompt_size("deep dive", prompt, context_stats)
 
         try:
             response = await self.context.llm_generate(
                 prompt=prompt, chat_provider_id=provider_id
             )
-            text = response.completion_text
-
-            # Try parsing as JSON first (robust handling)
-            try:
-                logger.debug(f"Raw LLM Deep Dive Response: {text}")
-
-                # Robust JSON Cleaner
-                clean_text = text.strip()
-
-                # 1. Remove Markdown Code Blocks
-                if "```" in clean_text:
-                    # Find the first opening brace after the first backtick block start
-                    start_idx = clean_text.find("{")
-                    end_idx = clean_text.rfind("}")
-                    if start_idx != -1 and end_idx != -1:
-                        clean_text = clean_text[start_idx : end_idx + 1]
-                else:
-                    # If no code blocks, look for the outer braces
-                    start_idx = clean_text.find("{")
-                    end_idx = clean_text.rfind("}")
-                    if start_idx != -1 and end_idx != -1:
-                        clean_text = clean_text[start_idx : end_idx + 1]
-
-                # 2. Repair common JSON errors
-                clean_text = self._repair_json(clean_text)
-
-                logger.debug(f"Repaired JSON Text: {clean_text}")
-                data_json = json.loads(clean_text)
-
-                # Handle structure: {"DEEP_PSYCHE": {"KEYWORDS": ..., "ANALYSIS": ...}, "EVIDENCE": ...}
-                result = {}
-                if "DEEP_PSYCHE" in data_json:
-                    root = data_json["DEEP_PSYCHE"]
-                    keywords_str = root.get("KEYWORDS", "")
-                    analysis_str = root.get("ANALYSIS", "")
-
-                    # Parse keywords string "#tag1 #tag2" -> ["#tag1", "#tag2"]
-                    if isinstance(keywords_str, str):
-                        keywords = [
-                            k.strip()
-                            for k in keywords_str.split()
-                            if k.strip().startswith("#")
-                        ]
-                    elif isinstance(keywords_str, list):
-                        keywords = keywords_str
-                    else:
-                        keywords = []
-
-                    result = {"keywords": keywords, "content": analysis_str}
-                    logger.info(
-                        f"LLM Deep Dive Generated (JSON): {analysis_str[:50]}..."
-                    )
-
-                if "EVIDENCE" in data_json:
-                    evidence_list = data_json["EVIDENCE"]
-
-                    # Create nickname -> user_id map from chat_context
-                    # We also try to identify the Target user id
-                    user_map = {}
-                    target_uid = None
-                    for msg in chat_context:
-                        uid = msg.get("user_id")
-                        nick = msg.get("nickname")
-                        role_tag = msg.get("role", "")
-                        if uid:
-                            if nick:
-                                user_map[nick.lower()] = uid
-                            # Also map role indicators
-                            user_map[str(uid)] = uid
-                        if role_tag == "[Target]" and uid:
-                            target_uid = uid
-
-                    # Inject user_id into evidence dialogue
-                    for scene in evidence_list:
-                        for dialog in scene.get("dialogue", []):
-                            role_name = str(dialog.get("role", "")).lower()
-                            # Priority 1: Target alias
-                            if (
-                                "target" in role_name
-                                or "被告" in role_name
-                                or "我" == role_name
-                            ) and target_uid:
-                                dialog["user_id"] = target_uid
-                                continue
-
-                            # Priority 2: Exact match in map
-                            if role_name in user_map:
-                                dialog["user_id"] = user_map[role_name]
-                                continue
-
-                            # Priority 3: Loose match (contains nick or uid)
-                            found_loose = False
-                            for nick_lower, uid in user_map.items():
-                                if nick_lower in role_name or role_name in nick_lower:
-                                    dialog["user_id"] = uid
-                                    found_loose = True
-                                    break
-
-                            if not found_loose:
-                                logger.debug(
-                                    f"Could not map role '{role_name}' to any UID"
-                                )
-
-                    result["evidence"] = evidence_list
-                    logger.info(
-                        f"LLM Evidence Generated: {len(result['evidence'])} scenes"
-                    )
-
-                return result
-
-            except json.JSONDecodeError:
-                pass  # Fallback to text parsing
-            except Exception as e:
-                logger.warning(f"JSON parsing failed, trying text parse: {e}")
-
-            # Fallback: Text Parsing (Lexical/Regex extraction)
-            logger.info("Falling back to Lexical/Regex extraction for deep dive.")
-            result = self._reconstruct_from_regex(text)
-            if not result:
-                return None
-
-            # Apply mapping to evidence if found in regex fallback
-            if result.get("evidence"):
-                user_map = {}
-                target_uid = None
-                for msg in chat_context:
-                    uid = msg.get("user_id")
-                    nick = msg.get("nickname")
-                    role_tag = msg.get("role", "")
-                    if uid:
-                        if nick:
-                            user_map[nick.lower()] = uid
-                        user_map[str(uid)] = uid
-                    if role_tag == "[Target]" and uid:
-                        target_uid = uid
-
-                for scene in result["evidence"]:
-                    for dialog in scene.get("dialogue", []):
-                        role_name = str(dialog.get("role", "")).lower()
-                        if (
-                            "target" in role_name
-                            or "被告" in role_name
-                            or "我" == role_name
-                        ) and target_uid:
-                            dialog["user_id"] = target_uid
-                            continue
-                        if role_name in user_map:
-                            dialog["user_id"] = user_map[role_name]
-                            continue
-                        for nick_lower, uid in user_map.items():
-                            if nick_lower in role_name or role_name in nick_lower:
-                                dialog["user_id"] = uid
-                                break
-            return result
+            return await self._parse_deep_dive_async(
+                response.completion_text, chat_context, members
+            )
         except Exception as e:
             logger.error(f"LLM Deep Dive failed: {e}")
             return None
@@ -0,0 +1,123 @@
+import hashlib
+
+
+class ParsedMessage:
+    """
+    单条消息链的解析结果。
+    各采集器、数据提供者与历史记录抓取器共用，避免对同一条消息链重复遍历。
+    """
+
+    __slots__ = (
+        "text",
+        "text_len",
+        "display",
+        "image_count",
+        "reply_id",
+        "reply_sender_id",
+        "at_list",
+        "content_hash",
+    )
+
+    def __init__(
+        self,
+        text: str,
+        display: str,
+        image_count: int,
+        reply_id: str | None,
+        reply_sender_id: str | None,
+        at_list: list[str],
+    ):
+        self.text = text  # 纯文本内容
+        self.text_len = len(text)
+        self.display = display  # 带 [图片]/[表情]/@ 等占位符的展示文本
+        self.image_count = image_count
+        self.reply_id = reply_id  # 被回复消息的 message_id
+        self.reply_sender_id = reply_sender_id  # 被回复消息的发送者 (若平台提供)
+        self.at_list = at_list
+        self.content_hash = hashlib.blake2b(
+            text.encode("utf-8"), digest_size=8
+        ).digest()
+
+    @property
+    def reply_target(self) -> str | None:
+        """
+        回复归因目标：已知发送者时直接返回其 ID，
+        否则返回 MSG_REF:<message_id>，由调用方通过消息归属索引查找作者。
+        """
+        if self.reply_sender_id:
+            return self.reply_sender_id
+        if self.reply_id:
+            return f"MSG_REF:{self.reply_id}"
+        return None
+
+
+def _segment_type(component) -> str:
+    """统一组件类型名：兼容 OneBot 字典段与 AstrBot 组件 (ComponentType 枚举)"""
+    comp_type = getattr(component, "type", "")
+    comp_type = getattr(comp_type, "value", comp_type)
+    return str(comp_type).lower()
+
+
+def parse_chain(chain, text: str | None = None) -> ParsedMessage:
+    """
+    单次遍历解析消息链。
+    :param chain: AstrBot 组件列表、OneBot 字典段列表或纯字符串
+    :param text: 已知的纯文本 (如 event.message_str)，提供时不再从文本段拼接
+    """
+    if isinstance(chain, str):
+        plain = chain if text is None else text
+        return ParsedMessage(plain, chain, 0, None, None, [])
+
+    text_parts = []
+    display_parts = []
+    image_count = 0
+    reply_id = None
+    reply_sender_id = None
+    at_list = []
+
+    for component in chain if isinstance(chain, list) else ():
+        if isinstance(component, dict):
+            seg_type = str(component.get("type", "")).lower()
+            data = component.get("data") or {}
+        else:
+            # AstrBot 组件 (pydantic 模型) 的字段均保存在实例 __dict__ 中
+            seg_type = _segment_type(component)
+            data = getattr(component, "__dict__", None) or {}
+
+        if seg_type in ("text", "plain"):
+            seg_text = data.get("text") or ""
+            text_parts.append(seg_text)
+            display_parts.append(seg_text)
+        elif seg_type == "image":
+            image_count += 1
+            display_parts.append("[图片]")
+        elif seg_type == "face":
+            display_parts.append("[表情]")
+        elif seg_type == "at":
+            qq = data.get("qq")
+            if qq:
+                at_list.append(str(qq))
+            display_parts.append(f"@{qq or 'User'}")
+        elif "reply" in seg_type:
+            display_parts.append("[回复]")
+            if reply_id is None and reply_sender_id is None:
+                msg_id = data.get("id")
+                sender_id = data.get("sender_id")
+                if isinstance(component, dict):
+                    # 部分实现把字段放在段顶层而非 data 中
+                    msg_id = msg_id or component.get("id")
+                    sender_id = sender_id or component.get("sender_id")
+                if msg_id:
+                    reply_id = str(msg_id)
+                if sender_id and str(sender_id) != "0":
+                    reply_sender_id = str(sender_id)
+
+    plain = "".join(text_parts) if text is None else text
+    return ParsedMessage(
+        plain,
+        "".join(display_parts).strip(),
+        image_count,
+        reply_id,
+        reply_sender_id,
+        at_list,
+    )
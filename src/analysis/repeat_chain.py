@@ -0,0 +1,106 @@
+import hashlib
+import re
+
+from ..utils.cache import LRUCache
+
+# 空白、CQ 码、[doge] 这类短表情码以及 Unicode emoji 不参与复读判定
+_NOISE_PATTERN = re.compile(
+    r"\s+"
+    r"|\[CQ:[^\]]*\]"
+    r"|\[[^\[\]\s]{1,8}\]"
+    r"|[\U0001F000-\U0001FAFF\u2600-\u27BF\uFE0F\u200D]"
+)
+
+
+def normalize_text(text: str) -> str:
+    """归一化复读文本：去除空白与表情码，英文统一小写"""
+    return _NOISE_PATTERN.sub("", text).lower()
+
+
+def fingerprint(text: str) -> bytes | None:
+    """归一化后文本的 8 字节指纹，归一化后为空 (纯表情/纯图片) 时返回 None"""
+    normalized = normalize_text(text)
+    if not normalized:
+        return None
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest()
+
+
+class _GroupRing:
+    """单个群的最近消息指纹环形缓冲区"""
+
+    __slots__ = ("ring", "pos", "chains")
+
+    def __init__(self, size: int):
+        self.ring: list[bytes | None] = [None] * size
+        self.pos = 0
+        # 指纹 -> [在环中出现的次数, 已参与的用户集合 (首个为发起者)]
+        self.chains: dict[bytes, list] = {}
+
+
+class RepeatChainDetector:
+    """
+    群复读链检测。
+    每个群维护最近 window 条消息的指纹环，相同指纹在窗口内再次出现即视为复读链的延续；
+    发起者之后每位首次加入的用户计一次复读。每条消息 O(1)，
+    单群内存上限约为 window 个指纹加 window × max_participants 个用户 ID。
+    """
+
+    def __init__(
+        self, window: int = 16, max_participants: int = 50, max_groups: int = 5000
+    ):
+        """
+        :param window: 环形缓冲区长度，复读需在该条数内出现
+        :param max_participants: 单条复读链最多记录的参与者数
+        :param max_groups: 最多跟踪的群数，超出时淘汰最久不活跃的群
+        """
+        self.window = max(2, window)
+        self.max_participants = max(2, max_participants)
+        self._groups = LRUCache(max_groups)
+        self.credited = 0
+
+    def observe(self, group_id: str, user_id: str, text: str) -> bool:
+        """记录一条消息，返回该用户是否应计一次复读"""
+        ring = self._groups.get(group_id, count=False)
+        if ring is None:
+            ring = _GroupRing(self.window)
+            self._groups.set(group_id, ring)
+
+        # 覆盖最旧的槽位，同步维护链的出现次数
+        old = ring.ring[ring.pos]
+        if old is not None:
+            entry = ring.chains[old]
+            entry[0] -= 1
+            if entry[0] == 0:
+                del ring.chains[old]
+
+        fp = fingerprint(text)
+        ring.ring[ring.pos] = fp
+        ring.pos = (ring.pos + 1) % self.window
+        if fp is None:
+            return False
+
+        entry = ring.chains.get(fp)
+        if entry is None:
+            ring.chains[fp] = [1, {user_id}]
+            return False
+
+        entry[0] += 1
+        participants = entry[1]
+        if user_id in participants or len(participants) >= self.max_participants:
+            return False
+        participants.add(user_id)
+        self.credited += 1
+        return True
+
+    def stats(self) -> dict:
+        chains = 0
+        participants = 0
+        for _, ring in self._groups.items():
+            chains += len(ring.chains)
+            participants += sum(len(entry[1]) for entry in ring.chains.values())
+        return {
+            "groups": len(self._groups),
+            "active_chains": chains,
+            "participants": participants,
+            "credited": self.credited,
+        }
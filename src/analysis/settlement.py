@@ -0,0 +1,99 @@
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+
+from astrbot.api import logger
+
+from ..models.tables import LoveDailyScore
+from ..persistence.repo import LoveRepo
+from .calculator import LoveCalculator
+
+
+class DailySettlement:
+    """
+    日终结算任务。
+    每天零点过后为前一天有活跃记录的 (group, user) 计算最终得分并写入 love_daily_score，
+    之后读取昨日得分只需一次索引查询，无需重新计算。插件启动时会补结算一次昨日数据。
+    """
+
+    def __init__(
+        self,
+        repo: LoveRepo,
+        calculator: LoveCalculator,
+        delay_seconds: float = 60,
+        batch_size: int = 1000,
+    ):
+        """
+        :param delay_seconds: 零点后延迟多少秒开始结算
+        :param batch_size: 每批读取与写入的记录数
+        """
+        self.repo = repo
+        self.calculator = calculator
+        self.delay = max(0.0, delay_seconds)
+        self.batch_size = max(1, batch_size)
+        self._settled: set[date] = set()
+        self._task: asyncio.Task | None = None
+
+    def is_settled(self, target_date: date) -> bool:
+        """本次运行期间该日期是否已完成结算"""
+        return target_date in self._settled
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            yesterday = date.today() - timedelta(days=1)
+            if yesterday not in self._settled:
+                try:
+                    await self.settle(yesterday)
+                except Exception as e:
+                    logger.warning(f"DailySettlement: 结算 {yesterday} 失败: {e}")
+            await asyncio.sleep(self._seconds_until_next_run())
+
+    def _seconds_until_next_run(self) -> float:
+        now = datetime.now()
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        return (midnight - now).total_seconds() + self.delay
+
+    async def settle(self, target_date: date) -> int:
+        """结算指定日期，返回写入的得分条数。重复结算会覆盖旧结果"""
+        # 确保当日尚在队列中的计数器已全部落盘
+        await self.repo.flush()
+
+        settled = 0
+        async for refs in self.repo.iter_daily_refs(target_date, self.batch_size):
+            now = time.time()
+            rows = []
+            for ref in refs:
+                # 与实时查询保持一致：结算分不叠加前一日得分
+                scores = self.calculator.calculate_scores(ref)
+                rows.append(
+                    LoveDailyScore(
+                        date=ref.date,
+                        group_id=ref.group_id,
+                        user_id=ref.user_id,
+                        score=scores["score"],
+                        simp=scores["simp"],
+                        vibe=scores["vibe"],
+                        ick=scores["ick"],
+                        nostalgia=scores["nostalgia"],
+                        settled_at=now,
+                    )
+                )
+            await self.repo.save_daily_scores(rows)
+            settled += len(rows)
+
+        self._settled.add(target_date)
+        logger.info(f"DailySettlement: 已结算 {target_date} 的 {settled} 条得分。")
+        return settled
@@ -0,0 +1,84 @@
+import sys
+
+from ..analysis.repeat_chain import RepeatChainDetector
+from ..utils.cache import LRUCache
+
+
+class ChatState:
+    """
+    消息处理器的会话状态 (话题与复读判定)。
+    - 群最后发言时间：按 LRU 淘汰最久不活跃的群
+    - 用户上一条消息：只保存定长摘要 (ParsedMessage.content_hash)，按 LRU + TTL 淘汰
+    - 群复读链：每群一个定长指纹环 (RepeatChainDetector)
+    - 群回填水位：上一次历史回填处理到的消息时间，重复回填只处理更新的消息
+    """
+
+    def __init__(
+        self,
+        max_groups: int = 5000,
+        max_users: int = 200000,
+        user_ttl: float = 86400,
+        repeat_window: int = 16,
+        repeat_max_participants: int = 50,
+    ):
+        """
+        :param max_groups: 最多跟踪的群数
+        :param max_users: 最多跟踪的 (群, 用户) 数
+        :param user_ttl: 用户摘要在多久未发言后过期 (秒)，0 表示不过期
+        :param repeat_window: 复读链检测窗口 (条)
+        :param repeat_max_participants: 单条复读链最多记录的参与者数
+        """
+        self._group_last_time = LRUCache(max_groups)
+        self._user_last_digest = LRUCache(max_users, user_ttl)
+        self._backfill_watermark = LRUCache(max_groups)
+        self.repeat_chains = RepeatChainDetector(
+            repeat_window, repeat_max_participants, max_groups
+        )
+
+    @classmethod
+    def from_config(cls, config: dict) -> "ChatState":
+        return cls(
+            max_groups=config.get("max_groups", 5000),
+            max_users=config.get("max_users", 200000),
+            user_ttl=config.get("user_ttl", 86400),
+            repeat_window=config.get("repeat_window", 16),
+            repeat_max_participants=config.get("repeat_max_participants", 50),
+        )
+
+    def get_group_time(self, group_id: str) -> float:
+        return self._group_last_time.get(group_id, 0, count=False)
+
+    def set_group_time(self, group_id: str, timestamp: float):
+        self._group_last_time.set(group_id, timestamp)
+
+    def get_backfill_watermark(self, group_id: str) -> float:
+        return self._backfill_watermark.get(group_id, 0, count=False)
+
+    def set_backfill_watermark(self, group_id: str, timestamp: float):
+        if timestamp > self.get_backfill_watermark(group_id):
+            self._backfill_watermark.set(group_id, timestamp)
+
+    def get_last_digest(self, group_id: str, user_id: str) -> bytes | None:
+        return self._user_last_digest.get((group_id, user_id))
+
+    def set_last_digest(self, group_id: str, user_id: str, digest: bytes):
+        self._user_last_digest.set((group_id, user_id), digest)
+
+    def stats(self) -> dict:
+        """条目数与估算内存占用 (字节)"""
+        users = self._user_last_digest
+        group_bytes = sum(
+            sys.getsizeof(k) + sys.getsizeof(v)
+            for k, v in self._group_last_time.items()
+        )
+        user_bytes = sum(
+            sys.getsizeof(k) + sys.getsizeof(k[1]) + sys.getsizeof(v)
+            for k, v in users.items()
+        )
+        return {
+            "groups": len(self._group_last_time),
+            "users": len(users),
+            "approx_bytes": group_bytes + user_bytes,
+            "digest_hit_rate": users.stats()["hit_rate"],
+            "repeat_chains": self.repeat_chains.stats(),
+        }
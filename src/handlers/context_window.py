@@ -0,0 +1,96 @@
+from collections.abc import Iterable
+
+from .live_buffer import ContextMessage
+
+
+def find_interest_positions(
+    messages: list[ContextMessage], target_ids: Iterable[str]
+) -> dict[str, list[int]]:
+    """
+    一次遍历找出每个目标的“兴趣点” (目标发言或被 @ 的位置)，位置按升序排列。
+    """
+    targets = set(target_ids)
+    if len(targets) == 1:
+        (target,) = targets
+        return {
+            target: [
+                pos
+                for pos, msg in enumerate(messages)
+                if msg.user_id == target or target in msg.at_list
+            ]
+        }
+
+    positions: dict[str, list[int]] = {target: [] for target in targets}
+    for pos, msg in enumerate(messages):
+        if msg.user_id in targets:
+            positions[msg.user_id].append(pos)
+        if msg.at_list:
+            # 同一条消息对同一目标只计一次
+            for at in targets.intersection(msg.at_list).difference((msg.user_id,)):
+                positions[at].append(pos)
+    return positions
+
+
+def select_windows(
+    interest: list[int], total: int, window_size: int, limit: int
+) -> list[tuple[int, int]]:
+    """
+    将每个兴趣点前后 window_size 条合并为互不相邻的区间 [start, end)，
+    不足 limit 条时从末尾向前补齐最近的消息，超出时只保留最近的 limit 条。
+    区间之间至少隔着一条未选中的消息，即上下文中需要插入省略标记的位置。
+
+    :param interest: 升序排列的兴趣点位置
+    :param total: 消息总数
+    :param window_size: 兴趣点前后各保留的条数
+    :param limit: 最多选取的条数 (analyze_history_count)
+    """
+    merged: list[list[int]] = []
+    for pos in interest:
+        start = max(0, pos - window_size)
+        end = min(total, pos + window_size + 1)
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    count = sum(end - start for start, end in merged)
+
+    # 兜底：从末尾向前把未选中的消息补齐到 limit 条，补齐部分与末尾连成一个区间
+    if count < limit:
+        need = limit - count
+        cursor = total
+        fill_start = 0
+        for start, end in reversed(merged):
+            free = cursor - end
+            if free >= need:
+                fill_start = cursor - need
+                need = 0
+                break
+            need -= free
+            cursor = start
+        else:
+            fill_start = max(0, cursor - need)
+
+        kept = []
+        for start, end in merged:
+            if end < fill_start:
+                kept.append([start, end])
+            else:
+                fill_start = min(fill_start, start)
+                break
+        kept.append([fill_start, total])
+        merged = kept
+        count = sum(end - start for start, end in merged)
+
+    # 用户密集发言时结果可能超过 limit，只保留最近的消息
+    if count > limit:
+        trimmed = []
+        remaining = limit
+        for start, end in reversed(merged):
+            if remaining <= 0:
+                break
+            take = min(remaining, end - start)
+            trimmed.append([end - take, end])
+            remaining -= take
+        merged = trimmed[::-1]
+
+    return [(start, end) for start, end in merged if end > start]
@@ -0,0 +1,153 @@
+import time
+from collections import deque
+
+from ..persistence.repo import LoveRepo
+from ..utils.bloom import BloomFilter
+
+# 适配器为通知事件附带的唯一 ID 字段 (按优先级)
+EVENT_ID_FIELDS = ("event_id", "post_id", "id")
+
+
+class IdempotencyGuard:
+    """
+    采集幂等层，在任何数据库写入之前丢弃重复事件 (重复投递、重连重放、回填与实时消息竞争)。
+
+    1. 按时间分桶的内存集合：最近 bucket_seconds × buckets 秒内见过的键，精确判定；
+    2. 两代轮换的布隆过滤器：记住更早的键，未命中即可确定是新事件；
+    3. 布隆命中时，消息再回落到消息归属索引精确确认 (通知没有索引可查，按新事件处理)。
+    """
+
+    def __init__(
+        self,
+        repo: LoveRepo,
+        bucket_seconds: float = 600,
+        buckets: int = 6,
+        bloom_capacity: int = 200000,
+        bloom_error_rate: float = 0.01,
+    ):
+        self.repo = repo
+        self.bucket_seconds = max(1.0, bucket_seconds)
+        self._buckets: deque[tuple[int, set[str]]] = deque(maxlen=max(1, buckets))
+        self._bloom_capacity = bloom_capacity
+        self._bloom_error_rate = bloom_error_rate
+        self._bloom = BloomFilter(bloom_capacity, bloom_error_rate)
+        self._bloom_previous: BloomFilter | None = None
+
+        self.duplicates = 0
+        self.index_lookups = 0
+
+    @classmethod
+    def from_config(cls, repo: LoveRepo, config: dict) -> "IdempotencyGuard":
+        return cls(
+            repo,
+            bucket_seconds=config.get("bucket_seconds", 600),
+            buckets=config.get("buckets", 6),
+            bloom_capacity=config.get("bloom_capacity", 200000),
+        )
+
+    def is_recent(self, key: str) -> bool:
+        """键是否在内存窗口内出现过"""
+        return any(key in seen for _, seen in self._buckets)
+
+    def mark(self, key: str):
+        """记录一个已处理的键"""
+        bucket_id = int(time.time() // self.bucket_seconds)
+        if not self._buckets or self._buckets[-1][0] != bucket_id:
+            # deque 满时自动淘汰最旧的桶
+            self._buckets.append((bucket_id, set()))
+        self._buckets[-1][1].add(key)
+
+        if self._bloom.is_full:
+            self._bloom_previous = self._bloom
+            self._bloom = BloomFilter(self._bloom_capacity, self._bloom_error_rate)
+        self._bloom.add(key)
+
+    async def warm_up(self, horizon_seconds: float = 86400):
+        """启动时将近期已入库的消息 ID 载入布隆过滤器，防止重启后的重放被重复计入"""
+        ids = await self.repo.recent_message_ids(
+            time.time() - horizon_seconds, limit=self._bloom_capacity // 2
+        )
+        for message_id in ids:
+            self._bloom.add(f"msg:{message_id}")
+        return len(ids)
+
+    def _maybe_seen(self, key: str) -> bool:
+        return key in self._bloom or (
+            self._bloom_previous is not None and key in self._bloom_previous
+        )
+
+    def is_recent_message(self, message_id: str) -> bool:
+        return self.is_recent(f"msg:{message_id}")
+
+    def mark_message(self, message_id: str):
+        self.mark(f"msg:{message_id}")
+
+    async def check_message(self, message_id: str) -> bool:
+        """
+        消息是否为首次出现；首次出现时同时登记。
+        先登记再查询索引，保证并发的同一消息只有一个能通过。
+        """
+        if not message_id:
+            return True
+        key = f"msg:{message_id}"
+        if self.is_recent(key):
+            self.duplicates += 1
+            return False
+
+        maybe_seen = self._maybe_seen(key)
+        self.mark(key)
+        if maybe_seen:
+            self.index_lookups += 1
+            if await self.repo.get_message_owner(message_id):
+                self.duplicates += 1
+                return False
+        return True
+
+    def check_notice(self, event_data: dict) -> bool:
+        """
+        通知是否为首次出现；首次出现时同时登记。
+        优先使用适配器提供的事件 ID；没有 ID 时，戳一戳不去重
+        (同一秒内连续的戳一戳字段完全相同，无法与重复投递区分)。
+        """
+        notice_type = event_data.get("notice_type")
+        event_id = next(
+            (event_data[field] for field in EVENT_ID_FIELDS if event_data.get(field)),
+            None,
+        )
+        if notice_type == "group_recall":
+            # 一条消息只会被撤回一次
+            key = f"recall:{event_data.get('message_id')}"
+        elif event_id is not None:
+            key = f"notice:{event_id}"
+        elif event_data.get("sub_type") == "poke":
+            return True
+        else:
+            key = "notice:" + ":".join(
+                str(event_data.get(field, ""))
+                for field in (
+                    "notice_type",
+                    "sub_type",
+                    "group_id",
+                    "user_id",
+                    "target_id",
+                    "message_id",
+                    "time",
+                )
+            )
+        if self.is_recent(key):
+            self.duplicates += 1
+            return False
+        self.mark(key)
+        return True
+
+    def stats(self) -> dict:
+        bloom_bytes = self._bloom.nbytes + (
+            self._bloom_previous.nbytes if self._bloom_previous else 0
+        )
+        return {
+            "recent_keys": sum(len(seen) for _, seen in self._buckets),
+            "bloom_keys": self._bloom.count,
+            "bloom_bytes": bloom_bytes,
+            "duplicates": self.duplicates,
+            "index_lookups": self.index_lookups,
+        }
@@ -4,16 +4,47 @@ from astrbot.api import logger
 from astrbot.api.event import AstrMessageEvent
 from astrbot.core.star.context import Context
 
+from ..models.settings import SettingsProvider
+from ..utils.cache import LRUCache
+from ..utils.singleflight import SingleFlight
+from .context_window import find_interest_positions, select_windows
+from .history_pager import HistoryPager
+from .live_buffer import ContextMessage, LiveMessageBuffer
+from .member_cache import MemberDirectory
+
 
 class OneBotAdapter:
     """
     用于与 OneBot V11 API 交互以获取历史记录的适配器。
     """
 
-    def __init__(self, context: Context, config: dict):
+    def __init__(
+        self,
+        context: Context,
+        config: dict,
+        settings: SettingsProvider | None = None,
+        live_buffer: LiveMessageBuffer | None = None,
+    ):
         self.context = context
         self.config = config
-        self.filter_users = [str(u) for u in config.get("filter_users", [])]
+        self.settings = settings or SettingsProvider(config)
+        # 实时捕获的群消息，用于减少深度侧写时的历史接口调用
+        self.live_buffer = live_buffer
+        self.live_hits = 0
+        self.api_fallbacks = 0
+        # 目标发言过少时向前翻页获取更早的历史
+        deep_cfg = config.get("deep_history", {}) or {}
+        self.pager = HistoryPager.from_config(
+            deep_cfg if deep_cfg.get("enabled", True) else {"max_pages": 0}
+        )
+        self.min_target_hits = deep_cfg.get("min_target_hits", 3)
+        # 群荣誉一天内几乎不变：按群缓存，并发请求合并为一次 API 调用
+        self.honor_cache = LRUCache(1024, config.get("honor_cache_ttl", 3600))
+        self._honor_flight = SingleFlight()
+        # 群成员表：昵称/群名片解析均从缓存读取，由后台刷新
+        self.members = MemberDirectory(
+            self.fetch_group_member_list, config.get("member_cache_ttl", 1800)
+        )
 
     async def fetch_context(
         self, event: AstrMessageEvent, target_user_id: str
@@ -28,16 +59,29 @@ class OneBotAdapter:
         Returns:
             list[dict]: [{'time': str, 'role': str, 'nickname': str, 'content': str}, ...]
         """
+        target_str_id = str(target_user_id)
+        contexts = await self.fetch_contexts(event, [target_str_id])
+        return contexts.get(target_str_id, [])
+
+    async def fetch_contexts(
+        self, event: AstrMessageEvent, target_user_ids: list[str]
+    ) -> dict[str, list[dict]]:
+        """
+        为多个目标同时构建对话上下文：只获取一次消息池、只遍历一次，
+        每个目标按各自的兴趣点选取窗口。返回 {target_user_id: 上下文}。
+        """
+        targets = list(dict.fromkeys(str(t) for t in target_user_ids))
+        if not targets:
+            return {}
+
         # 1. 获取较大的消息池 (最大 300 条，或者历史配置的 5 倍)
-        history_count = self.config.get("analyze_history_count", 50)
+        settings = self.settings.current
+        history_count = settings.analyze_history_count
         pool_size = min(300, history_count * 5)
-        raw_pool = await self.fetch_raw_group_history(event, count=pool_size)
-        if not raw_pool:
+        pool = await self._build_pool(event, pool_size)
+        if not pool:
             logger.warning("OneBotAdapter: 未能获取到任何历史消息池。")
-            return []
-
-        # 按照时间从旧到新排序
-        raw_pool = sorted(raw_pool, key=lambda x: x.get("time", 0))
+            return {}
 
         # 2. 识别过滤名单与无效消息，预先构建“有效消息索引”
         black_list_ids = set()
@@ -49,71 +93,62 @@ class OneBotAdapter:
                 val = getattr(bot_obj, attr, None)
                 if val:
                     black_list_ids.add(str(val))
-        black_list = set(self.filter_users) | black_list_ids
+        # 目标用户自己即使在名单中 (例如机器人) 也保留其发言
+        black_list = (settings.filter_users | black_list_ids).difference(targets)
 
         # 预过滤：既要不在黑名单，也要有实际内容（文本/回复/@等）
-        valid_indices = []
-        target_str_id = str(target_user_id)
-        for i, msg in enumerate(raw_pool):
-            sender_id = str(msg.get("sender", {}).get("user_id", ""))
-
-            # 黑名单过滤 (除非是目标用户自己，哪怕他是机器人也分析他)
-            if sender_id in black_list and sender_id != target_str_id:
-                continue
-
-            # 内容过滤
-            content = self._extract_text(msg.get("message", ""))
-            if not content:
-                continue
-
-            valid_indices.append(i)
+        valid = self._filter_valid(pool, black_list)
 
         # 3. 在有效消息中寻找“兴趣点” (Target 发言或被提及)
-        interest_positions = []  # 在 valid_indices 列表中的索引
-        for pos, original_idx in enumerate(valid_indices):
-            msg = raw_pool[original_idx]
-            sender_id = str(msg.get("sender", {}).get("user_id", ""))
-
-            if sender_id == target_str_id:
-                interest_positions.append(pos)
-            else:
-                interactions = self._extract_interactions(msg.get("message", []))
-                if target_str_id in interactions.get("at_list", []):
-                    interest_positions.append(pos)
-
-        # 4. 提取窗口并合并 (基于有效消息的位置)
-        window_size = self.config.get("context_window_size", 5)
-        selected_valid_positions = set()
-
-        for pos in interest_positions:
-            start = max(0, pos - window_size)
-            end = min(len(valid_indices), pos + window_size + 1)
-            for j in range(start, end):
-                selected_valid_positions.add(j)
-
-        # 5. 兜底策略：补齐到 history_count
-        if len(selected_valid_positions) < history_count:
-            # 从有效消息末尾向前补
-            for k in range(len(valid_indices) - 1, -1, -1):
-                if len(selected_valid_positions) >= history_count:
+        interest = find_interest_positions(valid, targets)
+
+        # 3.1 有目标在消息池中出现得太少时，按页继续向前翻阅更早的历史，够用即停
+        hits = {target: len(positions) for target, positions in interest.items()}
+        if self.pager.max_pages and min(hits.values()) < self.min_target_hits:
+            older_pages = []
+            async for page in self.pager.pages(
+                lambda anchor, count: self.fetch_raw_group_history(
+                    event, count=count, message_seq=anchor
+                ),
+                pool[0],
+                {msg.message_id for msg in pool},
+            ):
+                page = self._filter_valid(page, black_list)
+                older_pages.append(page)
+                for target, positions in find_interest_positions(page, targets).items():
+                    hits[target] += len(positions)
+                if min(hits.values()) >= self.min_target_hits:
                     break
-                selected_valid_positions.add(k)
-
-        # 6. 按时间顺序提取物理索引并格式化
-        final_valid_positions = sorted(selected_valid_positions)
-
-        # 结果可能仍超过 history_count (如果用户密集发言)，截断最近消息
-        if len(final_valid_positions) > history_count:
-            final_valid_positions = final_valid_positions[-history_count:]
-
+            if older_pages:
+                # 页序不可靠 (锚点退回 message_id 时页之间可能交错)，按消息 ID 去重后按时间重新排序
+                merged = {msg.message_id: msg for page in older_pages for msg in page}
+                merged.update((msg.message_id, msg) for msg in valid)
+                valid = sorted(merged.values(), key=lambda m: m.order_key)
+                interest = find_interest_positions(valid, targets)
+
+        # 4. 合并兴趣点前后的窗口，不足 history_count 时补齐最近的消息，并格式化
+        # 昵称以群成员表中的群名片为准 (与 @ 显示一致)，成员表未就绪时沿用消息中的昵称
+        members = self.members.get(str(event.message_obj.group_id))
+        window_size = settings.context_window_size
+        contexts = {}
+        for target in targets:
+            windows = select_windows(
+                interest[target], len(valid), window_size, history_count
+            )
+            contexts[target] = self._format_windows(valid, windows, target, members)
+        return contexts
+
+    @staticmethod
+    def _format_windows(
+        valid: list[ContextMessage],
+        windows: list[tuple[int, int]],
+        target_id: str,
+        members: dict,
+    ) -> list[dict]:
         dialogue_context = []
-        last_pos = -1
-
-        for pos in final_valid_positions:
-            original_idx = valid_indices[pos]
-
-            # 检测逻辑索引（在有效消息流中的位置）上的跳变 (说明由于窗口限制跳过了部分有效对话)
-            if last_pos != -1 and pos > last_pos + 1:
+        for i, (start, end) in enumerate(windows):
+            # 区间之间跳过了部分有效对话
+            if i:
                 dialogue_context.append(
                     {
                         "time": "...",
@@ -122,35 +157,87 @@ class OneBotAdapter:
                         "content": "... (此处省略部分对话) ...",
                     }
                 )
+            for msg in valid[start:end]:
+                member = members.get(msg.user_id)
+                dialogue_context.append(
+                    {
+                        "time": time.strftime(
+                            "%H:%M", time.localtime(msg.time or time.time())
+                        ),
+                        "role": "[Target]" if msg.user_id == target_id else "[Other]",
+                        "nickname": member.display_name if member else msg.nickname,
+                        "user_id": msg.user_id,
+                        "content": msg.text,
+                    }
+                )
+        return dialogue_context
 
-            msg = raw_pool[original_idx]
-            sender = msg.get("sender", {})
-            sender_id = str(sender.get("user_id", ""))
-            nickname = sender.get("nickname", "Unknown")
-            role = "[Target]" if sender_id == target_str_id else "[Other]"
-            content = self._extract_text(msg.get("message", ""))
-
-            ts = msg.get("time", time.time())
-            time_str = time.strftime("%H:%M", time.localtime(ts))
-
-            dialogue_context.append(
-                {
-                    "time": time_str,
-                    "role": role,
-                    "nickname": nickname,
-                    "user_id": sender_id,
-                    "content": content,
-                }
-            )
-            last_pos = pos
+    @staticmethod
+    def _filter_valid(
+        messages: list[ContextMessage], black_list: frozenset
+    ) -> list[ContextMessage]:
+        # 黑名单过滤，并剔除没有内容的消息
+        return [msg for msg in messages if msg.text and msg.user_id not in black_list]
 
-        return dialogue_context
+    async def _build_pool(
+        self, event: AstrMessageEvent, pool_size: int
+    ) -> list[ContextMessage]:
+        """
+        构建按时间从旧到新排列的消息池。
+        优先使用实时缓冲区，缓冲区不足 pool_size 条时才调用历史接口，
+        并且只取缓冲区覆盖范围之前的消息。
+        """
+        live = []
+        if self.live_buffer and event.message_obj.group_id:
+            live = self.live_buffer.recent(str(event.message_obj.group_id), pool_size)
+        if len(live) >= pool_size:
+            self.live_hits += 1
+            return live
+
+        self.api_fallbacks += 1
+        if not live:
+            raw = await self.fetch_raw_group_history(event, count=pool_size)
+            older = [ContextMessage.from_onebot(item) for item in raw]
+        else:
+            # 以缓冲区中最早的消息为锚点向前拉取缺口部分 (锚点本身也会返回)
+            raw = await self.fetch_raw_group_history(
+                event,
+                count=pool_size - len(live) + 1,
+                message_seq=live[0].seq,
+            )
+            older = self._older_than(raw, live)
+            if any(m.get("time", 0) > live[0].time for m in raw):
+                # 协议端不支持 message_seq 时返回的是最新消息，退回到完整拉取
+                raw = await self.fetch_raw_group_history(event, count=pool_size)
+                older = self._older_than(raw, live)
+        older.sort(key=lambda m: m.time)
+
+        pool = older + live
+        return pool[-pool_size:]
+
+    @staticmethod
+    def _older_than(
+        raw: list[dict], live: list[ContextMessage]
+    ) -> list[ContextMessage]:
+        """从接口返回的消息中剔除与缓冲区重叠的部分"""
+        live_ids = {msg.message_id for msg in live}
+        oldest = live[0].time
+        older = []
+        for item in raw:
+            msg = ContextMessage.from_onebot(item)
+            if msg.message_id not in live_ids and msg.time <= oldest:
+                older.append(msg)
+        return older
 
     async def fetch_raw_group_history(
-        self, event: AstrMessageEvent, count: int = 100
+        self,
+        event: AstrMessageEvent,
+        count: int = 100,
+        message_seq: str | None = None,
     ) -> list[dict]:
         """
         获取原始群聊历史记录，不进行角色标记或过滤，用于数据回填。
+        指定 message_seq 时从该消息开始向前获取。
         """
         if not event.message_obj.group_id:
             return []
@@ -161,6 +248,10 @@ class OneBotAdapter:
             "group_id": int(group_id) if str(group_id).isdigit() else group_id,
             "count": count,
         }
+        if message_seq:
+            params["message_seq"] = (
+                int(message_seq) if str(message_seq).isdigit() else message_seq
+            )
 
         try:
             # 这里的策略与 fetch_context 类似，但更直接
@@ -179,12 +270,26 @@ class OneBotAdapter:
         return []
 
     async def fetch_group_honor(self, event: AstrMessageEvent) -> dict:
-        """获取群荣誉信息 (龙王、群聊之星等)"""
+        """获取群荣誉信息 (龙王、群聊之星等)，结果按群缓存"""
         group_id = event.message_obj.group_id
         bot = getattr(event, "bot", None)
         if not bot:
             return {}
 
+        key = str(group_id)
+        cached = self.honor_cache.get(key)
+        if cached is not None:
+            return cached
+
+        honor = await self._honor_flight.do(
+            key, lambda: self._request_group_honor(bot, group_id)
+        )
+        # 失败时返回空字典，不缓存以便下次重试
+        if honor:
+            self.honor_cache.set(key, honor)
+        return honor
+
+    async def _request_group_honor(self, bot, group_id) -> dict:
         params = {
             "group_id": int(group_id) if str(group_id).isdigit() else group_id,
             "type": "all",
@@ -218,46 +323,3 @@ class OneBotAdapter:
         except Exception as e:
             logger.warning(f"OneBotAdapter: 获取群成员列表失败: {e}")
         return []
-
-    def _extract_text(self, message_chain) -> str:
-        """从消息链中提取纯文本的辅助函数。"""
-        text_parts = []
-
-        if isinstance(message_chain, str):
-            return message_chain
-
-        if isinstance(message_chain, list):
-            for segment in message_chain:
-                type_ = segment.get("type")
-                data = segment.get("data", {})
-
-                if type_ == "text":
-                    text_parts.append(data.get("text", ""))
-                elif type_ == "face":
-                    text_parts.append("[表情]")
-                elif type_ == "image":
-                    text_parts.append("[图片]")
-                elif type_ == "at":
-                    text_parts.append(f"@{data.get('qq', 'User')}")
-                elif type_ == "reply":
-                    # 识别回复段
-                    text_parts.append("[回复]")
-
-        return "".join(text_parts).strip()
-
-    def _extract_interactions(self, message_chain) -> dict:
-        """从消息链中提取交互信息 (回复、提及)"""
-        interactions = {"reply_to": None, "at_list": []}
-        if not isinstance(message_chain, list):
-            return interactions
-
-        for segment in message_chain:
-            type_ = segment.get("type")
-            data = segment.get("data", {})
-            if type_ == "reply":
-                interactions["reply_to"] = str(data.get("id"))  # 这是一个 message_id
-            elif type_ == "at":
-                at_qq = data.get("qq")
-                if at_qq:
-                    interactions["at_list"].append(str(at_qq))
-        return interactions
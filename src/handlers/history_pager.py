@@ -0,0 +1,108 @@
+import asyncio
+from collections.abc import AsyncIterator, Awaitable, Callable
+
+from .live_buffer import ContextMessage
+
+# (message_seq 锚点, 条数) -> get_group_msg_history 返回的消息列表
+PageFetcher = Callable[[int | str, int], Awaitable[list[dict]]]
+
+
+class HistoryPager:
+    """
+    按 message_seq 向前翻页获取群聊历史。
+    以页为单位流式产出 (页内从旧到新，页与页之间的顺序不作保证，合并时需按时间重新排序)，
+    调用方拿到足够的数据后即可停止迭代，剩余的页不会再请求。
+    锚点为真实的 message_seq (连续的数字序号) 时按 page_size 推算后续锚点，
+    一次并发请求 concurrency 页；协议端未提供 message_seq 而退回 message_id 时只能逐页串行。
+    所有请求共享一个并发上限，避免多个深度侧写同时压垮协议端。
+    """
+
+    def __init__(
+        self,
+        page_size: int = 100,
+        max_pages: int = 5,
+        concurrency: int = 2,
+    ):
+        """
+        :param page_size: 每页条数
+        :param max_pages: 单次请求最多翻页数 (页预算)
+        :param concurrency: 同时进行的翻页请求上限
+        """
+        self.page_size = max(2, page_size)
+        self.max_pages = max(0, max_pages)
+        self.concurrency = max(1, concurrency)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        self.pages_fetched = 0
+        self.messages_fetched = 0
+
+    @classmethod
+    def from_config(cls, config: dict) -> "HistoryPager":
+        return cls(
+            page_size=config.get("page_size", 100),
+            max_pages=config.get("max_pages", 5),
+            concurrency=config.get("concurrency", 2),
+        )
+
+    async def _fetch(self, fetch: PageFetcher, anchor: int | str) -> list[dict]:
+        async with self._semaphore:
+            return await fetch(anchor, self.page_size)
+
+    def _anchors(self, oldest: ContextMessage, width: int) -> list[int | str]:
+        anchor = oldest.seq
+        if not oldest.has_seq or not anchor.isdigit():
+            return [anchor]
+        # 相邻页重叠一条，message_seq 连续时不会漏消息
+        start = int(anchor)
+        anchors = [start - i * (self.page_size - 1) for i in range(width)]
+        return [a for a in anchors if a > 0] or [start]
+
+    async def pages(
+        self,
+        fetch: PageFetcher,
+        oldest: ContextMessage,
+        known_ids: set[str] | None = None,
+    ) -> AsyncIterator[list[ContextMessage]]:
+        """
+        从 oldest (含) 开始向前翻页，重复消息已剔除。
+        :param oldest: 调用方已持有的最早一条消息，以其 seq 为首个锚点
+        :param known_ids: 调用方已持有的消息 ID，不会再次产出
+        """
+        seen = set(known_ids or ())
+        budget = self.max_pages
+        while budget > 0 and oldest.seq:
+            anchors = self._anchors(oldest, min(self.concurrency, budget))
+            budget -= len(anchors)
+            results = await asyncio.gather(
+                *(self._fetch(fetch, a) for a in anchors), return_exceptions=True
+            )
+            self.pages_fetched += len(anchors)
+
+            oldest = None
+            for raw in results:
+                if isinstance(raw, BaseException) or not raw:
+                    break
+                page = []
+                for item in raw:
+                    msg = ContextMessage.from_onebot(item)
+                    if msg.message_id in seen:
+                        continue
+                    seen.add(msg.message_id)
+                    page.append(msg)
+                if not page:
+                    continue
+                self.messages_fetched += len(page)
+                page.sort(key=lambda m: m.order_key)
+                if oldest is None or page[0].order_key < oldest.order_key:
+                    oldest = page[0]
+                yield page
+
+            # 整批都没有新消息：已到达最早的历史，或协议端不支持 message_seq
+            if oldest is None:
+                return
+
+    def stats(self) -> dict:
+        return {
+            "pages_fetched": self.pages_fetched,
+            "messages_fetched": self.messages_fetched,
+        }
@@ -0,0 +1,150 @@
+import asyncio
+import time
+import zlib
+from collections.abc import Awaitable, Callable
+
+from astrbot.api import logger
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "block")
+
+
+class IngestPipeline:
+    """
+    异步采集管线。
+    事件监听器只负责入队，由按 group_id 分片的 worker 池异步处理：
+    同一个群的事件始终落在同一分片内按到达顺序串行执行 (保证话题/复读判定正确)，
+    不同群之间并行。每个分片的队列有界，写满时按 overflow_policy 丢弃或阻塞。
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        queue_size: int = 2000,
+        overflow_policy: str = "drop_oldest",
+    ):
+        """
+        :param workers: worker (分片) 数量
+        :param queue_size: 每个分片的队列容量
+        :param overflow_policy: 队列满时的策略
+            drop_oldest 丢弃分片中最早的事件；drop_newest 丢弃新事件；block 等待空位
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            logger.warning(
+                f"IngestPipeline: 未知的溢出策略 {overflow_policy}，使用 drop_oldest。"
+            )
+            overflow_policy = "drop_oldest"
+        self.overflow_policy = overflow_policy
+        self._queues = [
+            asyncio.Queue(maxsize=max(1, queue_size)) for _ in range(max(1, workers))
+        ]
+        self._tasks: list[asyncio.Task] = []
+
+        # 监控指标
+        self._processed = 0
+        self._shed = 0
+        self._errors = 0
+        self._max_depth = 0
+        self._last_lag_ms = 0.0
+        self._max_lag_ms = 0.0
+        self._total_lag_ms = 0.0
+
+    @classmethod
+    def from_config(cls, config: dict) -> "IngestPipeline":
+        return cls(
+            workers=config.get("workers", 4),
+            queue_size=config.get("queue_size", 2000),
+            overflow_policy=config.get("overflow_policy", "drop_oldest"),
+        )
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._worker(queue)) for queue in self._queues
+            ]
+
+    async def stop(self, timeout: float = 10.0):
+        """处理完已入队的事件 (最多等待 timeout 秒) 后停止 worker"""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self._queues)), timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"IngestPipeline: 停止超时，放弃 {self.depth()} 个未处理事件。"
+            )
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def depth(self) -> int:
+        return sum(queue.qsize() for queue in self._queues)
+
+    async def submit(
+        self, group_id: str, handler: Callable[..., Awaitable], *args
+    ) -> bool:
+        """
+        将事件交给 group_id 所属分片处理，返回事件是否被接收。
+        handler 会以 (*args, received_at) 调用，received_at 为入队时间戳。
+        """
+        queue = self._queues[zlib.crc32(group_id.encode()) % len(self._queues)]
+        item = (handler, args, time.time(), time.monotonic())
+
+        if queue.full():
+            if self.overflow_policy == "drop_newest":
+                self._record_shed()
+                return False
+            if self.overflow_policy == "drop_oldest":
+                try:
+                    queue.get_nowait()
+                    queue.task_done()
+                    self._record_shed()
+                except asyncio.QueueEmpty:
+                    pass
+
+        await queue.put(item)
+        self._max_depth = max(self._max_depth, queue.qsize())
+        return True
+
+    def _record_shed(self):
+        self._shed += 1
+        # 避免过载时刷屏，每 100 次记录一次
+        if self._shed % 100 == 1:
+            logger.warning(
+                f"IngestPipeline: 队列已满，累计丢弃 {self._shed} 个事件 "
+                f"(策略 {self.overflow_policy})。"
+            )
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            handler, args, received_at, enqueued_at = await queue.get()
+            lag_ms = (time.monotonic() - enqueued_at) * 1000
+            self._last_lag_ms = lag_ms
+            self._max_lag_ms = max(self._max_lag_ms, lag_ms)
+            self._total_lag_ms += lag_ms
+            try:
+                await handler(*args, received_at)
+            except Exception as e:
+                self._errors += 1
+                logger.warning(f"IngestPipeline: 处理事件失败: {e}")
+            finally:
+                self._processed += 1
+                queue.task_done()
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": self.depth(),
+            "queue_depth_per_worker": [queue.qsize() for queue in self._queues],
+            "queue_max_depth": self._max_depth,
+            "queue_capacity": self._queues[0].maxsize,
+            "processed": self._processed,
+            "shed": self._shed,
+            "errors": self._errors,
+            "last_lag_ms": round(self._last_lag_ms, 2),
+            "max_lag_ms": round(self._max_lag_ms, 2),
+            "avg_lag_ms": round(self._total_lag_ms / self._processed, 2)
+            if self._processed
+            else 0.0,
+        }
@@ -0,0 +1,121 @@
+from collections import deque
+
+from ..analysis.parser import ParsedMessage, parse_chain
+from ..utils.cache import LRUCache
+
+
+class ContextMessage:
+    """上下文构建所需的消息字段 (实时捕获或由历史接口转换而来)"""
+
+    __slots__ = (
+        "message_id",
+        "time",
+        "user_id",
+        "nickname",
+        "text",
+        "at_list",
+        "seq",
+        "has_seq",
+    )
+
+    def __init__(
+        self,
+        message_id: str,
+        time: float,
+        user_id: str,
+        nickname: str,
+        text: str,
+        at_list: list[str],
+        seq: str | None = None,
+    ):
+        self.message_id = message_id
+        self.time = time
+        self.user_id = user_id
+        self.nickname = nickname
+        self.text = text  # 带占位符的展示文本 (ParsedMessage.display)
+        self.at_list = at_list
+        # 翻页锚点 (message_seq)，协议端未提供时退回 message_id
+        self.seq = seq or message_id
+        # 锚点是否为真实的 message_seq：只有连续的序号才能推算相邻页的锚点，
+        # message_id 是不连续的数字 ID
+        self.has_seq = seq is not None
+
+    @property
+    def order_key(self) -> tuple:
+        """按时间排序，同一秒内按 message_seq (如有) 排序"""
+        if self.has_seq and self.seq.isdigit():
+            return self.time, int(self.seq)
+        return self.time, 0
+
+    @classmethod
+    def from_parsed(
+        cls,
+        message_id: str,
+        time: float,
+        user_id: str,
+        nickname: str,
+        parsed: ParsedMessage,
+        seq: str | None = None,
+    ) -> "ContextMessage":
+        return cls(
+            message_id, time, user_id, nickname, parsed.display, parsed.at_list, seq
+        )
+
+    @classmethod
+    def from_onebot(cls, msg: dict) -> "ContextMessage":
+        """由 get_group_msg_history 返回的消息构建"""
+        sender = msg.get("sender", {})
+        parsed = parse_chain(msg.get("message", ""))
+        return cls.from_parsed(
+            str(msg.get("message_id", "")),
+            msg.get("time", 0),
+            str(sender.get("user_id", "")),
+            sender.get("nickname", "Unknown"),
+            parsed,
+            str(msg["message_seq"]) if msg.get("message_seq") else None,
+        )
+
+
+class LiveMessageBuffer:
+    """
+    按群保存最近消息的环形缓冲区。
+    消息监听时顺带写入，深度侧写优先从这里构建上下文，只有缓冲区覆盖不到的更早消息才调用历史接口。
+    """
+
+    def __init__(self, per_group: int = 300, max_groups: int = 500):
+        """
+        :param per_group: 每个群保留的消息条数
+        :param max_groups: 最多缓存的群数，超出时淘汰最久不活跃的群
+        """
+        self.per_group = max(1, per_group)
+        self._groups = LRUCache(max_groups)
+
+    @classmethod
+    def from_config(cls, config: dict) -> "LiveMessageBuffer":
+        return cls(
+            per_group=config.get("per_group", 300),
+            max_groups=config.get("max_groups", 500),
+        )
+
+    def append(self, group_id: str, message: ContextMessage):
+        ring = self._groups.get(group_id, count=False)
+        if ring is None:
+            ring = deque(maxlen=self.per_group)
+            self._groups.set(group_id, ring)
+        ring.append(message)
+
+    def recent(self, group_id: str, count: int) -> list[ContextMessage]:
+        """返回最近 count 条消息 (从旧到新)"""
+        ring = self._groups.get(group_id)
+        if not ring:
+            return []
+        if count >= len(ring):
+            return list(ring)
+        return list(ring)[-count:]
+
+    def stats(self) -> dict:
+        return {
+            "groups": len(self._groups),
+            "messages": sum(len(ring) for _, ring in self._groups.items()),
+            **{k: v for k, v in self._groups.stats().items() if k != "size"},
+        }
@@ -0,0 +1,131 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+
+from astrbot.api import logger
+from astrbot.api.event import AstrMessageEvent
+
+from ..utils.cache import LRUCache
+
+
+class GroupMember:
+    """群成员的名片信息"""
+
+    __slots__ = ("user_id", "nickname", "card", "role")
+
+    def __init__(self, user_id: str, nickname: str, card: str, role: str):
+        self.user_id = user_id
+        self.nickname = nickname
+        self.card = card
+        self.role = role  # owner / admin / member
+
+    @property
+    def display_name(self) -> str:
+        """群名片优先，其次 QQ 昵称"""
+        return self.card or self.nickname
+
+    @classmethod
+    def from_onebot(cls, data: dict) -> "GroupMember":
+        return cls(
+            str(data.get("user_id", "")),
+            data.get("nickname", "") or "",
+            data.get("card", "") or "",
+            data.get("role", "member") or "member",
+        )
+
+
+class MemberDirectory:
+    """
+    按群缓存的成员表 (user_id -> GroupMember)。
+    读取从不等待接口：直接返回当前缓存 (可能已过期或为空)，缺失或过期时在后台刷新，
+    同一个群同时只有一个刷新任务 (single-flight)。群消息到达时即可触发首次加载，
+    等到有人使用指令时成员表通常已经就绪。
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[AstrMessageEvent], Awaitable[list[dict]]],
+        ttl: float = 1800,
+        max_groups: int = 500,
+        retry_interval: float = 60,
+    ):
+        """
+        :param loader: 获取群成员列表的协程函数 (OneBotAdapter.fetch_group_member_list)
+        :param ttl: 成员表过期时间 (秒)，过期后仍可读取，同时后台刷新
+        :param max_groups: 最多缓存的群数
+        :param retry_interval: 加载失败后的重试间隔 (秒)
+        """
+        self._loader = loader
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        # group_id -> (加载时间, {user_id: GroupMember})
+        self._groups = LRUCache(max_groups)
+        # group_id -> 最近一次加载失败的时间，与成员表同样限制群数
+        self._failed_at = LRUCache(max_groups)
+        # group_id -> 进行中的刷新任务
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.refreshes = 0
+
+    def get(self, group_id: str) -> dict[str, GroupMember]:
+        entry = self._groups.get(str(group_id))
+        return entry[1] if entry else {}
+
+    def display_name(self, group_id: str, user_id: str) -> str | None:
+        member = self.get(group_id).get(str(user_id))
+        return member.display_name if member else None
+
+    def refresh(self, event: AstrMessageEvent):
+        """成员表缺失或过期时在后台刷新，不阻塞调用方"""
+        group_id = event.message_obj.group_id
+        if not group_id:
+            return
+        key = str(group_id)
+        now = time.monotonic()
+        entry = self._groups.get(key, count=False)
+        if entry and now - entry[0] < self.ttl:
+            return
+        if key in self._inflight:
+            return
+        failed_at = self._failed_at.get(key, count=False)
+        if failed_at is not None:
+            if now - failed_at < self.retry_interval:
+                return
+            self._failed_at.pop(key)
+        task = asyncio.create_task(self._load(event))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+    async def _load(self, event: AstrMessageEvent):
+        key = str(event.message_obj.group_id)
+        try:
+            data = await self._loader(event)
+        except Exception as e:
+            data = []
+            logger.warning(f"MemberDirectory: 刷新群 {key} 成员表失败: {e}")
+        if not data:
+            # 保留旧的成员表，稍后重试
+            self._failed_at.set(key, time.monotonic())
+            return
+        self._failed_at.pop(key, None)
+        members = {}
+        for item in data:
+            member = GroupMember.from_onebot(item)
+            if member.user_id:
+                members[member.user_id] = member
+        self._groups.set(key, (time.monotonic(), members))
+        self.refreshes += 1
+
+    async def stop(self):
+        tasks = list(self._inflight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._inflight.clear()
+
+    def stats(self) -> dict:
+        return {
+            "groups": len(self._groups),
+            "members": sum(len(m) for _, (_, m) in self._groups.items()),
+            "refreshes": self.refreshes,
+            "hit_rate": self._groups.stats()["hit_rate"],
+        }
@@ -1,49 +1,81 @@
+import time
+
 from astrbot.api.event import AstrMessageEvent
 
 from ..analysis.collectors.ick_collector import IckCollector
 from ..analysis.collectors.nostalgia_collector import NostalgiaCollector
 from ..analysis.collectors.simp_collector import SimpCollector
 from ..analysis.collectors.vibe_collector import VibeCollector
+from ..analysis.parser import parse_chain
+from ..models.tables import MessageOwnerIndex
+from ..persistence.buffer import DailyKey, merge_deltas
 from ..persistence.repo import LoveRepo
+from .chat_state import ChatState
+from .dedup import IdempotencyGuard
+from .live_buffer import ContextMessage, LiveMessageBuffer
 
 
 class MessageHandler:
     """消息处理器 (DDD)"""
 
-    _group_last_msg_time = {}
-    _user_last_msg_text = {}
-
-    def __init__(self, repo: LoveRepo):
+    def __init__(
+        self,
+        repo: LoveRepo,
+        state: ChatState | None = None,
+        guard: IdempotencyGuard | None = None,
+        live_buffer: LiveMessageBuffer | None = None,
+    ):
         self.repo = repo
+        self.state = state or ChatState()
+        self.guard = guard or IdempotencyGuard(repo)
+        self.live_buffer = live_buffer
         self.simp_col = SimpCollector()
         self.vibe_col = VibeCollector()
         self.ick_col = IckCollector()
         self.nos_col = NostalgiaCollector()
 
-    async def handle_message(self, event: AstrMessageEvent):
+    async def handle_message(
+        self, event: AstrMessageEvent, received_at: float | None = None
+    ):
         if not event.message_obj.group_id:
             return
 
         group_id = str(event.message_obj.group_id)
         user_id = str(event.message_obj.sender.user_id)
 
+        # 0. 幂等检查：重复投递/重放的消息在任何写入前丢弃
+        if not await self.guard.check_message(str(event.message_obj.message_id)):
+            return
+
         # 1. 获取上下文状态
-        last_group_time = MessageHandler._group_last_msg_time.get(group_id, 0)
-        last_text = MessageHandler._user_last_msg_text.get(group_id, {}).get(
-            user_id, ""
-        )
+        last_group_time = self.state.get_group_time(group_id)
+        last_digest = self.state.get_last_digest(group_id, user_id)
 
-        # 2. 领域数据采集 (判定逻辑已高度内聚于各自的 Collector)
-        simp_m = self.simp_col.collect(event)
-        vibe_m = self.vibe_col.collect(event)
-        nos_m = self.nos_col.collect(event, last_group_time)
-        ick_m = self.ick_col.collect_from_message(event, last_text)
+        # 2. 领域数据采集 (消息链只解析一次，判定逻辑内聚于各自的 Collector)
+        parsed = parse_chain(event.message_obj.message, text=event.message_str)
+        simp_m = self.simp_col.collect(event, parsed)
+        vibe_m = self.vibe_col.collect(event, parsed)
+        nos_m = self.nos_col.collect(event, parsed, last_group_time, received_at)
+        chain_repeat = self.state.repeat_chains.observe(group_id, user_id, parsed.text)
+        ick_m = self.ick_col.collect_from_message(parsed, last_digest, chain_repeat)
 
         # 3. 结果状态回写
-        MessageHandler._user_last_msg_text.setdefault(group_id, {})[user_id] = (
-            event.message_str
-        )
-        MessageHandler._group_last_msg_time[group_id] = nos_m["current_time"]
+        self.state.set_last_digest(group_id, user_id, parsed.content_hash)
+        self.state.set_group_time(group_id, nos_m["current_time"])
+        if self.live_buffer is not None:
+            raw = event.message_obj.raw_message
+            seq = raw.get("message_seq") if isinstance(raw, dict) else None
+            self.live_buffer.append(
+                group_id,
+                ContextMessage.from_parsed(
+                    simp_m["message_id"],
+                    getattr(event.message_obj, "timestamp", 0) or nos_m["current_time"],
+                    user_id,
+                    getattr(event.message_obj.sender, "nickname", "") or "Unknown",
+                    parsed,
+                    str(seq) if seq else None,
+                ),
+            )
 
         # 4. 业务逻辑编排与持有化
         await self.repo.save_message_index(simp_m["message_id"], group_id, user_id)
@@ -78,16 +110,53 @@ class MessageHandler:
                     )
 
     async def backfill_from_history(self, group_id: str, messages: list[dict]):
-        """从历史记录中回填今日数据，仅处理基础指标与话题"""
-        from datetime import date
+        """
+        从历史记录中回填今日数据，仅处理基础指标与话题。
+        早于本群回填水位的消息在上一次回填中已处理，直接跳过 (同一秒内的消息仍按 ID 去重)。
+        """
+        import datetime
+
+        today = datetime.date.today()
+        watermark = self.state.get_backfill_watermark(group_id)
+
+        # 1. 在内存中解析整批消息 (按照时间从小到大排序，仅保留今天的消息)
+        parsed = []
+        # 水位之前最后一条消息的时间，作为话题判定的起点
+        group_last_time = 0
+        for msg in sorted(messages, key=lambda x: x.get("time", 0)):
+            msg_time = msg.get("time", 0)
+            if datetime.datetime.fromtimestamp(msg_time).date() != today:
+                continue
+            if msg_time < watermark:
+                group_last_time = msg_time
+                continue
 
-        today = date.today()
+            msg_id = str(msg.get("message_id", ""))
+            if not msg_id:
+                continue
 
-        # 按照时间从小到大排序
-        sorted_messages = sorted(messages, key=lambda x: x.get("time", 0))
+            chain = parse_chain(msg.get("message", ""))
+            parsed.append(
+                (
+                    msg_id,
+                    msg_time,
+                    str(msg.get("sender", {}).get("user_id", "")),
+                    chain.text_len,
+                    chain.image_count,
+                    chain.reply_id,
+                    chain.at_list,
+                )
+            )
 
-        # 记录每位用户的统计，最后统一入库或按条入库（这里按条入库以复用 repo 逻辑，并处理重复）
-        group_last_time = 0
+        # 2. 一次 IN 查询解析已入库的消息 (用于去重) 与回复目标的归属
+        lookup_ids = {p[0] for p in parsed} | {p[5] for p in parsed if p[5]}
+        owners = await self.repo.get_message_owners(lookup_ids)
+        # 实时管线刚登记、尚未写入索引的消息同样视为已处理
+        known_ids = {
+            p[0] for p in parsed if p[0] in owners or self.guard.is_recent_message(p[0])
+        }
+
+        # 3. 按时间顺序聚合每位用户的增量
         stats = {
             "msg_count": 0,
             "image_count": 0,
@@ -95,55 +164,29 @@ class MessageHandler:
             "reply_count": 0,
             "at_count": 0,
         }
-
-        for msg in sorted_messages:
-            msg_time = msg.get("time", 0)
-            # 仅处理今天的消息
-            import datetime
-
-            dt = datetime.datetime.fromtimestamp(msg_time)
-            if dt.date() != today:
-                continue
-
-            msg_id = str(msg.get("message_id", ""))
-            if not msg_id:
-                continue
-
-            # 检查是否已处理过
-            if await self.repo.get_message_owner(msg_id):
+        deltas: dict[DailyKey, dict[str, int]] = {}
+        index_rows: list[MessageOwnerIndex] = []
+        now = time.time()
+
+        for (
+            msg_id,
+            msg_time,
+            user_id,
+            text_len,
+            current_images,
+            reply_target_msg_id,
+            at_targets,
+        ) in parsed:
+            # 检查是否已处理过 (已入库或本批次中重复出现)
+            if msg_id in known_ids:
                 # 如果已存在，更新上下文时间但跳过统计
                 group_last_time = msg_time
                 continue
 
-            user_id = str(msg.get("sender", {}).get("user_id", ""))
             if not user_id:
                 continue
 
-            # 1. 提取内容与交互信息
-            raw_message = msg.get("message", "")
-            text_content = ""
-            current_images = 0
-            reply_target_msg_id = None
-            at_targets = []
-
-            if isinstance(raw_message, str):
-                text_content = raw_message
-            elif isinstance(raw_message, list):
-                for seg in raw_message:
-                    s_type = seg.get("type", "")
-                    s_data = seg.get("data", {})
-                    if s_type == "text":
-                        text_content += s_data.get("text", "")
-                    elif s_type == "image":
-                        current_images += 1
-                    elif s_type == "reply":
-                        reply_target_msg_id = str(s_data.get("id"))
-                    elif s_type == "at":
-                        at_qq = s_data.get("qq")
-                        if at_qq:
-                            at_targets.append(str(at_qq))
-
-            # 2. 判定话题 (Nos)
+            # 判定话题 (Nos)
             topic_inc = 0
             if (
                 group_last_time > 0
@@ -153,37 +196,37 @@ class MessageHandler:
             elif group_last_time == 0:
                 topic_inc = 1
 
-            # 3. 持久化与交互处理
-            await self.repo.save_message_index(msg_id, group_id, user_id)
-            await self.repo.update_msg_stats(
-                group_id=group_id,
-                user_id=user_id,
-                text_len=len(text_content),
-                image_count=current_images,
+            known_ids.add(msg_id)
+            self.guard.mark_message(msg_id)
+            owners[msg_id] = user_id
+            index_rows.append(
+                MessageOwnerIndex(
+                    message_id=msg_id, group_id=group_id, user_id=user_id, timestamp=now
+                )
+            )
+            merge_deltas(
+                deltas,
+                (today, group_id, user_id),
+                msg_sent=1,
+                text_len_total=text_len,
+                image_sent=current_images,
+                topic_count=topic_inc,
             )
-
             if topic_inc > 0:
-                await self.repo.update_behavior_stats(
-                    group_id, user_id, topic_inc=topic_inc
-                )
                 stats["topic_count"] += 1
 
             # 历史交互归因
             if reply_target_msg_id:
-                owner = await self.repo.get_message_owner(reply_target_msg_id)
-                if owner and owner.user_id != user_id:
-                    await self.repo.update_interaction_sent(group_id, user_id, reply=1)
-                    await self.repo.update_interaction_received(
-                        group_id, owner.user_id, reply=1
-                    )
+                owner_id = owners.get(reply_target_msg_id)
+                if owner_id and owner_id != user_id:
+                    merge_deltas(deltas, (today, group_id, user_id), reply_sent=1)
+                    merge_deltas(deltas, (today, group_id, owner_id), reply_received=1)
                     stats["reply_count"] += 1
 
             for at_target in at_targets:
                 if at_target != user_id:
-                    # 将 @ 提及回填为基础互动点数 (Vibe)
-                    await self.repo.update_interaction_received(
-                        group_id, at_target, reply=0
-                    )
+                    # 将 @ 提及回填为基础互动点数 (Vibe)，确保被提及者拥有当日记录
+                    merge_deltas(deltas, (today, group_id, at_target), reply_received=0)
                     stats["at_count"] += 1
 
             # 更新统计
@@ -191,8 +234,13 @@ class MessageHandler:
             stats["image_count"] += current_images
             group_last_time = msg_time
 
-        # 更新类静态上下文（防止回填后立即说话判定错误）
+        # 4. 单个事务批量写入
+        await self.repo.bulk_ingest(index_rows, deltas)
+
+        # 更新会话状态（防止回填后立即说话判定错误）
         if group_last_time > 0:
-            MessageHandler._group_last_msg_time[group_id] = group_last_time
+            self.state.set_group_time(group_id, group_last_time)
+        if parsed:
+            self.state.set_backfill_watermark(group_id, parsed[-1][1])
 
         return stats
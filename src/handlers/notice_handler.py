@@ -2,18 +2,20 @@ from ..analysis.collectors.ick_collector import IckCollector
 from ..analysis.collectors.simp_collector import SimpCollector
 from ..analysis.collectors.vibe_collector import VibeCollector
 from ..persistence.repo import LoveRepo
+from .dedup import IdempotencyGuard
 
 
 class NoticeHandler:
     """通知事件处理器 (DDD Refactored)"""
 
-    def __init__(self, repo: LoveRepo):
+    def __init__(self, repo: LoveRepo, guard: IdempotencyGuard | None = None):
         self.repo = repo
+        self.guard = guard or IdempotencyGuard(repo)
         self.simp_col = SimpCollector()
         self.vibe_col = VibeCollector()
         self.ick_col = IckCollector()
 
-    async def handle_notice(self, event_data: dict):
+    async def handle_notice(self, event_data: dict, received_at: float | None = None):
         if event_data.get("post_type") != "notice":
             return
 
@@ -22,6 +24,10 @@ class NoticeHandler:
         if not group_id:
             return
 
+        # 幂等检查：重复投递的通知在任何写入前丢弃
+        if not self.guard.check_notice(event_data):
+            return
+
         # 1. 纯爱维度：戳一戳
         simp_m = self.simp_col.collect_notice(event_data)
         if simp_m["poke_sent"]:
@@ -0,0 +1,112 @@
+import json
+import time
+
+
+class Settings:
+    """
+    插件配置的不可变快照。
+    在构建时完成类型转换：群/用户名单转为 frozenset，Provider ID 预先按全局默认值回落，
+    热路径上的名单判断均为 O(1)。配置变更后由 SettingsProvider 重新构建。
+    """
+
+    __slots__ = (
+        "group_list_mode",
+        "group_list",
+        "filter_users",
+        "min_msg_threshold",
+        "analyze_history_count",
+        "context_window_size",
+        "max_evidence_scenes",
+        "enable_llm_commentary",
+        "enable_history_analysis",
+        "enable_combined_llm",
+        "commentary_provider_id",
+        "deep_dive_provider_id",
+        "theme",
+    )
+
+    # 参与快照的配置键，用于判断配置是否发生变化
+    KEYS = (
+        "group_list_mode",
+        "group_list",
+        "filter_users",
+        "min_msg_threshold",
+        "analyze_history_count",
+        "context_window_size",
+        "max_evidence_scenes",
+        "enable_llm_commentary",
+        "enable_history_analysis",
+        "enable_combined_llm",
+        "llm_provider_id",
+        "commentary_provider_id",
+        "deep_dive_provider_id",
+        "theme",
+    )
+
+    def __init__(self, config: dict):
+        global_provider = config.get("llm_provider_id", "")
+        values = {
+            "group_list_mode": config.get("group_list_mode", "none"),
+            "group_list": frozenset(str(g) for g in config.get("group_list", [])),
+            "filter_users": frozenset(str(u) for u in config.get("filter_users", [])),
+            "min_msg_threshold": config.get("min_msg_threshold", 3),
+            "analyze_history_count": config.get("analyze_history_count", 100),
+            "context_window_size": config.get("context_window_size", 5),
+            "max_evidence_scenes": config.get("max_evidence_scenes", 3),
+            "enable_llm_commentary": config.get("enable_llm_commentary", True),
+            "enable_history_analysis": config.get("enable_history_analysis", True),
+            "enable_combined_llm": config.get("enable_combined_llm", False),
+            "commentary_provider_id": config.get("commentary_provider_id", "")
+            or global_provider,
+            "deep_dive_provider_id": config.get("deep_dive_provider_id", "")
+            or global_provider,
+            "theme": config.get("theme", "galgame"),
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Settings 为只读快照，请修改配置后重新构建")
+
+    @classmethod
+    def signature(cls, config: dict) -> str:
+        return json.dumps(
+            {key: config.get(key) for key in cls.KEYS}, sort_keys=True, default=str
+        )
+
+    def is_group_allowed(self, group_id: int | str | None) -> bool:
+        """检查群组是否在黑白名单允许范围内"""
+        if not group_id:
+            return True  # 私聊通常不限制，或者由其他逻辑处理
+
+        if self.group_list_mode == "whitelist":
+            return str(group_id) in self.group_list
+        if self.group_list_mode == "blacklist":
+            return str(group_id) not in self.group_list
+        return True
+
+
+class SettingsProvider:
+    """
+    持有当前的 Settings 快照。
+    每隔 check_interval 秒比对一次配置签名，发生变化 (如在 WebUI 中修改配置) 时重新构建，
+    其余时间直接返回缓存的快照。
+    """
+
+    def __init__(self, config: dict, check_interval: float = 5.0):
+        self._config = config
+        self.check_interval = check_interval
+        self._signature = Settings.signature(config)
+        self._settings = Settings(config)
+        self._checked_at = time.monotonic()
+
+    @property
+    def current(self) -> Settings:
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            signature = Settings.signature(self._config)
+            if signature != self._signature:
+                self._signature = signature
+                self._settings = Settings(self._config)
+        return self._settings
@@ -1,5 +1,6 @@
 from datetime import date as DateType
 
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
@@ -7,7 +8,11 @@ class LoveDailyRef(SQLModel, table=True):
     """每日恋爱成分指标快照，存储每个用户在群组中的各项互动数据"""
 
     __tablename__ = "love_daily_ref"
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        # 每个用户在每个群每天只有一条记录，计数器更新依赖该约束执行 upsert
+        Index("ux_love_daily_ref_key", "date", "group_id", "user_id", unique=True),
+        {"extend_existing": True},
+    )
 
     id: int | None = Field(default=None, primary_key=True)
     date: DateType = Field(index=True)
@@ -46,4 +51,54 @@ class MessageOwnerIndex(SQLModel, table=True):
     message_id: str = Field(primary_key=True)
     user_id: str
     group_id: str
-    timestamp: float  # 时间戳
+    timestamp: float = Field(index=True)  # 时间戳，按时间清理过期索引
+
+
+class LoveHonorLedger(SQLModel, table=True):
+    """群荣誉加成发放记录，保证每个群每天只发放一次"""
+
+    __tablename__ = "love_honor_ledger"
+    __table_args__ = (
+        Index("ux_love_honor_ledger_key", "date", "group_id", unique=True),
+        {"extend_existing": True},
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    date: DateType
+    group_id: str
+    honor_count: int = Field(default=0)  # 本次同步的荣誉条数
+    applied_at: float = Field(default=0.0)  # 发放时间戳
+
+
+class LoveDailyScore(SQLModel, table=True):
+    """每日结算后的最终得分，由日终结算任务写入，当天结束后不再变化"""
+
+    __tablename__ = "love_daily_score"
+    __table_args__ = (
+        Index("ux_love_daily_score_key", "date", "group_id", "user_id", unique=True),
+        {"extend_existing": True},
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    date: DateType
+    group_id: str
+    user_id: str
+
+    score: int = Field(default=0)  # 综合好感度
+    simp: int = Field(default=0)
+    vibe: int = Field(default=0)
+    ick: int = Field(default=0)
+    nostalgia: int = Field(default=0)
+
+    settled_at: float = Field(default=0.0)  # 结算时间戳
+
+
+class LoveCommentaryCache(SQLModel, table=True):
+    """判词缓存，键为 provider、模板、人设与量化后评分的摘要，重启后仍可复用"""
+
+    __tablename__ = "love_commentary_cache"
+    __table_args__ = {"extend_existing": True}
+
+    key: str = Field(primary_key=True)
+    variants: str = Field(default="[]")  # JSON 数组，每项为一次生成的判词结果
+    created_at: float = Field(default=0.0, index=True)  # 首个变体的生成时间，按此过期
@@ -0,0 +1,83 @@
+from datetime import date
+
+from ..models.tables import LoveDailyRef, MessageOwnerIndex
+
+# LoveDailyRef 中所有可累加的计数器字段
+COUNTER_FIELDS = (
+    "msg_sent",
+    "text_len_total",
+    "reply_sent",
+    "reply_received",
+    "poke_sent",
+    "poke_received",
+    "reaction_sent",
+    "reaction_received",
+    "recall_count",
+    "repeat_count",
+    "image_sent",
+    "topic_count",
+)
+
+DailyKey = tuple[date, str, str]
+
+
+def merge_deltas(target: dict[DailyKey, dict[str, int]], key: DailyKey, **deltas):
+    """将一组增量累加进 target[key]，忽略为 0 的字段"""
+    bucket = target.setdefault(key, {})
+    for field, value in deltas.items():
+        if value:
+            bucket[field] = bucket.get(field, 0) + value
+
+
+class CounterBuffer:
+    """
+    LoveDailyRef 计数器的写后 (write-behind) 缓冲区。
+    以 (date, group_id, user_id) 为键记录已提交给写入器、但尚未落盘的增量，
+    读取时与数据库中的记录合并以保证分值精确；写入器提交成功后再从缓冲区扣除。
+    """
+
+    def __init__(self):
+        self._pending: dict[DailyKey, dict[str, int]] = {}
+        self._pending_index: dict[str, MessageOwnerIndex] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending) + len(self._pending_index)
+
+    def add(self, key: DailyKey, **deltas: int):
+        """累加一组计数器增量，忽略为 0 的字段"""
+        merge_deltas(self._pending, key, **deltas)
+
+    def discard(self, key: DailyKey, deltas: dict[str, int]):
+        """扣除一组已落盘的增量"""
+        bucket = self._pending.get(key)
+        if bucket is None:
+            return
+        for field, value in deltas.items():
+            remaining = bucket.get(field, 0) - value
+            if remaining:
+                bucket[field] = remaining
+            else:
+                bucket.pop(field, None)
+        if not bucket:
+            del self._pending[key]
+
+    def add_index(self, idx: MessageOwnerIndex):
+        """暂存一条消息归属索引"""
+        self._pending_index[idx.message_id] = idx
+
+    def discard_index(self, message_id: str):
+        self._pending_index.pop(message_id, None)
+
+    def get_index(self, message_id: str) -> MessageOwnerIndex | None:
+        """查询尚未落盘的消息归属索引"""
+        return self._pending_index.get(message_id)
+
+    def get(self, key: DailyKey) -> dict[str, int]:
+        """返回某个键尚未落盘的增量"""
+        return dict(self._pending.get(key, {}))
+
+    @staticmethod
+    def apply(record: LoveDailyRef, deltas: dict[str, int]):
+        """将增量叠加到一条记录上"""
+        for field, value in deltas.items():
+            setattr(record, field, getattr(record, field) + value)
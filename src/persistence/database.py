@@ -1,25 +1,103 @@
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlmodel import SQLModel
 
+from .migrations import run_migrations
+
+# SQLite 性能调优默认参数 (每个新连接都会执行)
+DEFAULT_SQLITE_TUNING = {
+    "enabled": True,
+    "journal_mode": "WAL",  # 读写互不阻塞，避免 "database is locked"
+    "synchronous": "NORMAL",  # WAL 模式下仅在 checkpoint 时 fsync
+    "mmap_size": 268435456,  # 256 MiB 内存映射读取
+    "cache_size": -16000,  # 负数单位为 KiB，即约 16 MiB 页缓存
+    "busy_timeout": 5000,  # 锁等待毫秒数
+    "temp_store": "MEMORY",
+}
+
+_ALLOWED_VALUES = {
+    "journal_mode": {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"},
+    "synchronous": {"OFF", "NORMAL", "FULL", "EXTRA"},
+    "temp_store": {"DEFAULT", "FILE", "MEMORY"},
+}
+
+
+def build_pragmas(tuning: dict | None = None) -> list[str]:
+    """根据调优配置生成 PRAGMA 语句列表，非法取值回退为默认值"""
+    options = {**DEFAULT_SQLITE_TUNING, **(tuning or {})}
+    if not options.get("enabled", True):
+        return []
+
+    pragmas = []
+    for key, allowed in _ALLOWED_VALUES.items():
+        value = str(options.get(key, "")).upper()
+        if value not in allowed:
+            value = DEFAULT_SQLITE_TUNING[key]
+        pragmas.append(f"PRAGMA {key}={value}")
+    for key in ("mmap_size", "cache_size", "busy_timeout"):
+        try:
+            value = int(options.get(key))
+        except (TypeError, ValueError):
+            value = DEFAULT_SQLITE_TUNING[key]
+        pragmas.append(f"PRAGMA {key}={value}")
+    return pragmas
+
 
 class DBManager:
     """数据库管理器，负责异步连接和会话管理"""
 
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, tuning: dict | None = None):
         self.db_url = f"sqlite+aiosqlite:///{db_path}"
         self.engine = create_async_engine(self.db_url)
+        self.pragmas = build_pragmas(tuning)
+        if self.pragmas:
+            event.listen(self.engine.sync_engine, "connect", self._apply_pragmas)
         self.session_maker = sessionmaker(
             self.engine, class_=AsyncSession, expire_on_commit=False
         )
 
+    def _apply_pragmas(self, dbapi_connection, connection_record):
+        """在每个新建的 SQLite 连接上应用调优参数"""
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in self.pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
     async def init_db(self):
-        """初始化数据库，创建所有定义的表"""
+        """初始化数据库，创建所有定义的表并执行结构迁移"""
+        await self._enable_incremental_vacuum()
         async with self.engine.begin() as conn:
             await conn.run_sync(SQLModel.metadata.create_all)
+            await run_migrations(conn)
+
+    async def _enable_incremental_vacuum(self):
+        """
+        将数据库切换为 auto_vacuum=INCREMENTAL，使清理任务可以逐步归还空闲页。
+        已有数据库需要执行一次完整 VACUUM 才能生效 (VACUUM 不能在事务中运行)。
+        """
+        async with self.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            mode = (await conn.exec_driver_sql("PRAGMA auto_vacuum")).scalar()
+            if mode == 2:
+                return
+            await conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+            await conn.exec_driver_sql("VACUUM")
+
+    async def incremental_vacuum(self, pages: int = 0):
+        """归还最多 pages 个空闲页 (0 表示全部)"""
+        async with self.engine.connect() as conn:
+            raw = await conn.get_raw_connection()
+            # incremental_vacuum 每次 step 只释放一页，普通 execute 只会 step 一次，
+            # 改用 executescript 让驱动执行到结束
+            await raw.driver_connection.executescript(
+                f"PRAGMA incremental_vacuum({int(pages)});"
+            )
 
     @asynccontextmanager
     async def get_session(self) -> AsyncGenerator[AsyncSession, None]:
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from astrbot.api import logger
+
+from .repo import LoveRepo
+
+
+class MessageIndexRetention:
+    """
+    消息归属索引的保留策略。
+    后台周期性按 timestamp 分批清理过期或超量的 message_owner_index 记录，
+    随后执行增量 VACUUM 归还空闲页，防止数据库文件无限增长。
+    """
+
+    def __init__(
+        self,
+        repo: LoveRepo,
+        max_age_days: float = 7,
+        max_rows: int = 500000,
+        batch_size: int = 5000,
+        interval_minutes: float = 60,
+        vacuum_pages: int = 2000,
+    ):
+        self.repo = repo
+        self.max_age_days = max_age_days
+        self.max_rows = max_rows
+        self.batch_size = max(1, batch_size)
+        self.interval = max(60.0, interval_minutes * 60)
+        self.vacuum_pages = vacuum_pages
+        self._task: asyncio.Task | None = None
+
+    @classmethod
+    def from_config(cls, repo: LoveRepo, config: dict) -> "MessageIndexRetention":
+        return cls(
+            repo,
+            max_age_days=config.get("max_age_days", 7),
+            max_rows=config.get("max_rows", 500000),
+            batch_size=config.get("batch_size", 5000),
+            interval_minutes=config.get("interval_minutes", 60),
+            vacuum_pages=config.get("vacuum_pages", 2000),
+        )
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.warning(f"MessageIndexRetention: 清理消息索引失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> int:
+        """执行一轮清理，返回删除的行数"""
+        before = None
+        if self.max_age_days > 0:
+            before = time.time() - self.max_age_days * 86400
+
+        deleted = await self.repo.prune_message_index(
+            before_timestamp=before,
+            max_rows=self.max_rows,
+            batch_size=self.batch_size,
+        )
+        if deleted:
+            await self.repo.db.incremental_vacuum(self.vacuum_pages)
+            logger.info(f"MessageIndexRetention: 已清理 {deleted} 条过期消息索引。")
+        return deleted
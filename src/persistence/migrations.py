@@ -0,0 +1,69 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from .buffer import COUNTER_FIELDS
+
+
+async def _index_exists(conn: AsyncConnection, name: str) -> bool:
+    result = await conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :name"),
+        {"name": name},
+    )
+    return result.first() is not None
+
+
+async def merge_daily_ref_duplicates(conn: AsyncConnection):
+    """
+    为 love_daily_ref 补建 (date, group_id, user_id) 唯一索引。
+    旧版本的先查后插逻辑可能产生重复行，建索引前先将重复行的计数器累加到最早的一行并删除其余行。
+    """
+    if await _index_exists(conn, "ux_love_daily_ref_key"):
+        return
+
+    # 计数器求和，updated_at 取最大值
+    aggregates = [(col, "SUM") for col in COUNTER_FIELDS] + [("updated_at", "MAX")]
+    sums = ", ".join(
+        f"{col} = (SELECT {agg}(d.{col}) FROM love_daily_ref d "
+        "WHERE d.date = love_daily_ref.date "
+        "AND d.group_id = love_daily_ref.group_id "
+        "AND d.user_id = love_daily_ref.user_id)"
+        for col, agg in aggregates
+    )
+    await conn.execute(
+        text(
+            f"UPDATE love_daily_ref SET {sums} WHERE id IN ("
+            "SELECT MIN(id) FROM love_daily_ref "
+            "GROUP BY date, group_id, user_id HAVING COUNT(*) > 1)"
+        )
+    )
+    await conn.execute(
+        text(
+            "DELETE FROM love_daily_ref WHERE id NOT IN ("
+            "SELECT MIN(id) FROM love_daily_ref GROUP BY date, group_id, user_id)"
+        )
+    )
+    await conn.execute(
+        text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_love_daily_ref_key "
+            "ON love_daily_ref (date, group_id, user_id)"
+        )
+    )
+
+
+async def index_message_owner_timestamp(conn: AsyncConnection):
+    """为 message_owner_index.timestamp 补建索引，使按时间清理无需全表扫描"""
+    await conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_message_owner_index_timestamp "
+            "ON message_owner_index (timestamp)"
+        )
+    )
+
+
+# 按顺序执行的迁移步骤，每一步都必须是幂等的
+MIGRATIONS = (merge_daily_ref_duplicates, index_message_owner_timestamp)
+
+
+async def run_migrations(conn: AsyncConnection):
+    for migration in MIGRATIONS:
+        await migration(conn)
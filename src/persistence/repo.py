@@ -1,72 +1,207 @@
+import json
 import time
 from datetime import date
 
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..models.tables import LoveDailyRef, MessageOwnerIndex
+from ..models.tables import (
+    LoveCommentaryCache,
+    LoveDailyRef,
+    LoveDailyScore,
+    LoveHonorLedger,
+    MessageOwnerIndex,
+)
+from ..utils.cache import LRUCache
+from .buffer import CounterBuffer, DailyKey, merge_deltas
 from .database import DBManager
+from .writer import (
+    ApplyHonor,
+    DBWriter,
+    IncrementCounters,
+    IndexMessages,
+    PruneCommentary,
+    PruneMessageIndex,
+    SaveCommentary,
+    SaveScores,
+)
 
 
 class LoveRepo:
     """数据仓库，封装所有的数据库交互逻辑"""
 
-    def __init__(self, db_manager: DBManager):
+    def __init__(
+        self,
+        db_manager: DBManager,
+        flush_interval: float = 2.0,
+        flush_threshold: int = 200,
+        owner_cache_size: int = 10000,
+        owner_cache_ttl: float = 3600,
+        writer_queue_size: int = 5000,
+    ):
         self.db = db_manager
-
-    async def get_or_create_daily_ref(
-        self, session: AsyncSession, group_id: str, user_id: str
-    ) -> LoveDailyRef:
-        """获取或创建今日的数据记录"""
-        today = date.today()
-        stmt = select(LoveDailyRef).where(
-            LoveDailyRef.date == today,
-            LoveDailyRef.group_id == group_id,
-            LoveDailyRef.user_id == user_id,
+        # 消息归属缓存：绝大多数回复/贴贴都指向最近几分钟的消息
+        self.owner_cache = LRUCache(owner_cache_size, owner_cache_ttl)
+        # 写后缓冲：记录已提交但尚未落盘的增量，读取时合并以保证分值精确
+        self.buffer = CounterBuffer()
+        # 单写者：所有写入经由队列交给后台任务，按间隔或批量阈值合并提交
+        self.writer = DBWriter(
+            db_manager,
+            self.buffer,
+            queue_size=writer_queue_size,
+            batch_size=flush_threshold,
+            linger=flush_interval,
         )
-        result = await session.execute(stmt)
-        record = result.scalar_one_or_none()
+        # 群号 -> 最近一次已发放荣誉加成的日期，避免重复查询台账
+        self._honor_applied: dict[str, date] = {}
 
-        if not record:
-            record = LoveDailyRef(
-                date=today, group_id=group_id, user_id=user_id, updated_at=time.time()
-            )
-            session.add(record)
-            # Flush 以确保如果需要立即获取 ID，但在 commit 时也会处理
-            await session.flush()
+    def start(self):
+        """启动后台写入任务"""
+        self.writer.start()
 
-        return record
+    async def stop(self):
+        """停止后台写入任务，并将剩余增量全部落盘"""
+        await self.writer.stop()
+
+    async def flush(self):
+        """等待此前提交的所有写入落盘"""
+        await self.writer.flush()
+
+    async def _increment(self, group_id: str, user_id: str, **deltas: int):
+        """提交一组计数器增量，立即计入缓冲区，由写入器异步落盘"""
+        key = (date.today(), group_id, user_id)
+        self.buffer.add(key, **deltas)
+        await self.writer.submit(IncrementCounters({key: deltas}))
 
     async def update_msg_stats(
         self, group_id: str, user_id: str, text_len: int, image_count: int = 0
     ):
         """更新消息统计数据 (发送数、字数、图片数)"""
-        async with self.db.get_session() as session:
-            record = await self.get_or_create_daily_ref(session, group_id, user_id)
-            record.msg_sent += 1
-            record.text_len_total += text_len
-            record.image_sent += image_count
-            record.updated_at = time.time()
-            session.add(record)
+        await self._increment(
+            group_id,
+            user_id,
+            msg_sent=1,
+            text_len_total=text_len,
+            image_sent=image_count,
+        )
 
     async def save_message_index(self, message_id: str, group_id: str, user_id: str):
         """保存消息 ID 与发送者的映射，用于后续的异步交互归因 (如 Reaction)"""
-        async with self.db.get_session() as session:
-            idx = MessageOwnerIndex(
-                message_id=message_id,
-                group_id=group_id,
-                user_id=user_id,
-                timestamp=time.time(),
-            )
-            session.add(idx)
+        idx = MessageOwnerIndex(
+            message_id=message_id,
+            group_id=group_id,
+            user_id=user_id,
+            timestamp=time.time(),
+        )
+        self.buffer.add_index(idx)
+        self.owner_cache.set(message_id, idx)
+        await self.writer.submit(IndexMessages([idx]))
 
     async def get_message_owner(self, message_id: str) -> MessageOwnerIndex | None:
+        cached = self.owner_cache.get(message_id)
+        if cached:
+            return cached
+        pending = self.buffer.get_index(message_id)
+        if pending:
+            return pending
         async with self.db.get_session() as session:
             stmt = select(MessageOwnerIndex).where(
                 MessageOwnerIndex.message_id == message_id
             )
             result = await session.execute(stmt)
-            return result.scalar_one_or_none()
+            idx = result.scalar_one_or_none()
+        if idx:
+            self.owner_cache.set(message_id, idx)
+        return idx
+
+    async def get_message_owners(self, message_ids) -> dict[str, str]:
+        """批量解析消息归属，返回 {message_id: user_id}，数据库部分仅需一次 IN 查询"""
+        owners: dict[str, str] = {}
+        missing = []
+        for message_id in set(message_ids):
+            idx = self.owner_cache.get(message_id) or self.buffer.get_index(message_id)
+            if idx:
+                owners[message_id] = idx.user_id
+            else:
+                missing.append(message_id)
+        if not missing:
+            return owners
+
+        async with self.db.get_session() as session:
+            # SQLite 对单条语句的参数个数有限制，按块查询
+            for i in range(0, len(missing), 500):
+                stmt = select(MessageOwnerIndex).where(
+                    MessageOwnerIndex.message_id.in_(missing[i : i + 500])
+                )
+                for idx in (await session.execute(stmt)).scalars():
+                    owners[idx.message_id] = idx.user_id
+                    self.owner_cache.set(idx.message_id, idx)
+        return owners
+
+    async def bulk_ingest(
+        self,
+        index_rows: list[MessageOwnerIndex],
+        deltas: dict[DailyKey, dict[str, int]],
+    ):
+        """在单个事务中批量写入消息归属索引与计数器增量 (用于历史回填)"""
+        if not index_rows and not deltas:
+            return
+        for idx in index_rows:
+            self.buffer.add_index(idx)
+            self.owner_cache.set(idx.message_id, idx)
+        for key, fields in deltas.items():
+            self.buffer.add(key, **fields)
+        await self.writer.submit(
+            IndexMessages(index_rows), IncrementCounters(deltas), wait=True
+        )
+
+    async def recent_message_ids(self, since: float, limit: int = 100000) -> list[str]:
+        """按时间倒序返回 since 之后入库的消息 ID"""
+        async with self.db.get_session() as session:
+            stmt = (
+                select(MessageOwnerIndex.message_id)
+                .where(MessageOwnerIndex.timestamp >= since)
+                .order_by(MessageOwnerIndex.timestamp.desc())
+                .limit(limit)
+            )
+            return list((await session.execute(stmt)).scalars())
+
+    async def prune_message_index(
+        self,
+        before_timestamp: float | None = None,
+        max_rows: int = 0,
+        batch_size: int = 5000,
+    ) -> int:
+        """
+        分批删除过期的消息归属索引，返回删除的总行数。
+        :param before_timestamp: 删除早于该时间戳的索引 (None 表示不按时间清理)
+        :param max_rows: 仅保留最新的 max_rows 条索引 (0 表示不限制)
+        :param batch_size: 每个事务最多删除的行数，避免长时间持有写锁
+        """
+        cutoff = before_timestamp
+        if max_rows > 0:
+            async with self.db.get_session() as session:
+                stmt = (
+                    select(MessageOwnerIndex.timestamp)
+                    .order_by(MessageOwnerIndex.timestamp.desc())
+                    .offset(max_rows - 1)
+                    .limit(1)
+                )
+                oldest_kept = (await session.execute(stmt)).scalar_one_or_none()
+            if oldest_kept is not None:
+                # 第 max_rows 新的记录之前的索引全部视为过期
+                cutoff = max(cutoff or 0, oldest_kept)
+
+        if cutoff is None:
+            return 0
+
+        total = 0
+        while True:
+            # 经由写入器删除，与其他写命令排队提交，不与其争抢写锁
+            cmd = PruneMessageIndex(cutoff, batch_size)
+            await self.writer.submit(cmd, wait=True)
+            total += cmd.deleted
+            if cmd.deleted < batch_size:
+                return total
 
     async def update_interaction_sent(
         self,
@@ -78,14 +213,14 @@ class LoveRepo:
         recall: int = 0,
     ):
         """更新主动交互计数"""
-        async with self.db.get_session() as session:
-            record = await self.get_or_create_daily_ref(session, group_id, user_id)
-            record.poke_sent += poke
-            record.reply_sent += reply
-            record.reaction_sent += reaction
-            record.recall_count += recall
-            record.updated_at = time.time()
-            session.add(record)
+        await self._increment(
+            group_id,
+            user_id,
+            poke_sent=poke,
+            reply_sent=reply,
+            reaction_sent=reaction,
+            recall_count=recall,
+        )
 
     async def update_interaction_received(
         self,
@@ -95,27 +230,42 @@ class LoveRepo:
         reply: int = 0,
         reaction: int = 0,
     ):
-        async with self.db.get_session() as session:
-            record = await self.get_or_create_daily_ref(session, group_id, user_id)
-            record.poke_received += poke
-            record.reply_received += reply
-            record.reaction_received += reaction
-            record.updated_at = time.time()
-            session.add(record)
+        """更新被动交互计数"""
+        await self._increment(
+            group_id,
+            user_id,
+            poke_received=poke,
+            reply_received=reply,
+            reaction_received=reaction,
+        )
 
     async def update_behavior_stats(
         self, group_id: str, user_id: str, topic_inc: int = 0, repeat_inc: int = 0
     ):
         """更新高级行为指标 (话题、复读)"""
-        async with self.db.get_session() as session:
-            record = await self.get_or_create_daily_ref(session, group_id, user_id)
-            record.topic_count += topic_inc
-            record.repeat_count += repeat_inc
-            record.updated_at = time.time()
-            session.add(record)
+        await self._increment(
+            group_id, user_id, topic_count=topic_inc, repeat_count=repeat_inc
+        )
 
     async def get_today_data(self, group_id: str, user_id: str) -> LoveDailyRef | None:
-        return await self.get_data_by_date(group_id, user_id, date.today())
+        """获取今日数据，并合并缓冲区中尚未落盘的增量"""
+        today = date.today()
+        key = (today, group_id, user_id)
+        # 读取期间若写入器恰好提交，数据库快照与缓冲区可能不一致，重读即可
+        for _ in range(3):
+            version = self.writer.version
+            deltas = self.buffer.get(key)
+            record = await self.get_data_by_date(group_id, user_id, today)
+            if self.writer.version == version:
+                break
+
+        if not deltas:
+            return record
+
+        if not record:
+            record = LoveDailyRef(date=today, group_id=group_id, user_id=user_id)
+        CounterBuffer.apply(record, deltas)
+        return record
 
     async def get_data_by_date(
         self, group_id: str, user_id: str, target_date: date
@@ -130,42 +280,129 @@ class LoveRepo:
             result = await session.execute(stmt)
             return result.scalar_one_or_none()
 
+    async def iter_daily_refs(self, target_date: date, batch_size: int = 1000):
+        """按主键分批遍历指定日期的全部记录，避免一次性加载整日数据"""
+        last_id = 0
+        while True:
+            async with self.db.get_session() as session:
+                stmt = (
+                    select(LoveDailyRef)
+                    .where(LoveDailyRef.date == target_date, LoveDailyRef.id > last_id)
+                    .order_by(LoveDailyRef.id)
+                    .limit(batch_size)
+                )
+                rows = list((await session.execute(stmt)).scalars())
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1].id
+
+    async def save_daily_scores(self, rows: list[LoveDailyScore]):
+        """写入日终结算得分并等待落盘"""
+        if rows:
+            await self.writer.submit(SaveScores(rows), wait=True)
+
+    async def get_daily_score(
+        self, group_id: str, user_id: str, target_date: date
+    ) -> int | None:
+        """读取已结算的得分，未结算时返回 None"""
+        async with self.db.get_session() as session:
+            stmt = select(LoveDailyScore.score).where(
+                LoveDailyScore.date == target_date,
+                LoveDailyScore.group_id == group_id,
+                LoveDailyScore.user_id == user_id,
+            )
+            result = await session.execute(stmt)
+            return result.scalar_one_or_none()
+
+    async def get_commentary_variants(
+        self, key: str, since: float
+    ) -> tuple[list[dict], float] | None:
+        """读取 since 之后生成的判词缓存，返回 (变体列表, 生成时间)，不存在或已过期时返回 None"""
+        async with self.db.get_session() as session:
+            stmt = select(
+                LoveCommentaryCache.variants, LoveCommentaryCache.created_at
+            ).where(
+                LoveCommentaryCache.key == key,
+                LoveCommentaryCache.created_at >= since,
+            )
+            row = (await session.execute(stmt)).first()
+        if row is None:
+            return None
+        return json.loads(row.variants), row.created_at
+
+    async def save_commentary_variants(
+        self, key: str, variants: list[dict], created_at: float
+    ):
+        """提交判词缓存条目，由写入器异步落盘"""
+        row = LoveCommentaryCache(
+            key=key,
+            variants=json.dumps(variants, ensure_ascii=False),
+            created_at=created_at,
+        )
+        await self.writer.submit(SaveCommentary(row))
+
+    async def prune_commentary_cache(self, before: float) -> int:
+        """删除 before 之前生成的判词缓存，返回删除的行数"""
+        cmd = PruneCommentary(before)
+        await self.writer.submit(cmd, wait=True)
+        return cmd.deleted
+
+    async def is_honor_applied(self, group_id: str) -> bool:
+        """今日是否已为该群发放过荣誉加成"""
+        today = date.today()
+        if self._honor_applied.get(group_id) == today:
+            return True
+        async with self.db.get_session() as session:
+            stmt = select(LoveHonorLedger.id).where(
+                LoveHonorLedger.date == today, LoveHonorLedger.group_id == group_id
+            )
+            result = await session.execute(stmt)
+            if result.first() is None:
+                return False
+        self._honor_applied[group_id] = today
+        return True
+
     async def apply_honor_bonus(self, group_id: str, honor_data: dict) -> int:
-        """根据群荣誉信息发放初始点数，返回同步的荣誉数量"""
+        """
+        根据群荣誉信息发放初始点数，返回同步的荣誉数量。
+        每个群每天只发放一次，重复调用返回 0。
+        """
         if not honor_data:
             return 0
 
+        today = date.today()
+        bonus: dict[DailyKey, dict[str, int]] = {}
         honor_count = 0
-        async with self.db.get_session() as session:
-            # 1. 龙王 (Talkative) - 活跃度与存在感双高
-            talkative = honor_data.get("talkative", {})
-            if talkative:
-                uid = str(talkative.get("user_id"))
-                if uid:
-                    ref = await self.get_or_create_daily_ref(session, group_id, uid)
-                    ref.msg_sent += 20  # 虚拟发言数，提升分值
-                    ref.reply_received += 5
-                    ref.updated_at = time.time()
-                    honor_count += 1
-
-            # 2. 表演者 (Performer) - 存在感高
-            performers = honor_data.get("performer", [])
-            for p in performers:
-                uid = str(p.get("user_id"))
-                if uid:
-                    ref = await self.get_or_create_daily_ref(session, group_id, uid)
-                    ref.reply_received += 10
-                    ref.updated_at = time.time()
-                    honor_count += 1
-
-            # 3. 快乐源泉 (Emotion) - 白月光值高
-            emotions = honor_data.get("emotion", [])
-            for e in emotions:
-                uid = str(e.get("user_id"))
-                if uid:
-                    ref = await self.get_or_create_daily_ref(session, group_id, uid)
-                    ref.image_sent += 5
-                    ref.topic_count += 2
-                    ref.updated_at = time.time()
-                    honor_count += 1
-        return honor_count
+
+        # 1. 龙王 (Talkative) - 活跃度与存在感双高
+        talkative = honor_data.get("talkative", {})
+        if talkative:
+            uid = str(talkative.get("user_id"))
+            if uid:
+                # 虚拟发言数，提升分值
+                merge_deltas(
+                    bonus, (today, group_id, uid), msg_sent=20, reply_received=5
+                )
+                honor_count += 1
+
+        # 2. 表演者 (Performer) - 存在感高
+        performers = honor_data.get("performer", [])
+        for p in performers:
+            uid = str(p.get("user_id"))
+            if uid:
+                merge_deltas(bonus, (today, group_id, uid), reply_received=10)
+                honor_count += 1
+
+        # 3. 快乐源泉 (Emotion) - 白月光值高
+        emotions = honor_data.get("emotion", [])
+        for e in emotions:
+            uid = str(e.get("user_id"))
+            if uid:
+                merge_deltas(bonus, (today, group_id, uid), image_sent=5, topic_count=2)
+                honor_count += 1
+
+        cmd = ApplyHonor(today, group_id, honor_count, bonus)
+        await self.writer.submit(cmd, wait=True)
+        self._honor_applied[group_id] = today
+        return honor_count if cmd.applied else 0
@@ -0,0 +1,493 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import date
+
+from astrbot.api import logger
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from ..models.tables import (
+    LoveCommentaryCache,
+    LoveDailyRef,
+    LoveDailyScore,
+    LoveHonorLedger,
+    MessageOwnerIndex,
+)
+from .buffer import COUNTER_FIELDS, CounterBuffer, DailyKey, merge_deltas
+from .database import DBManager
+
+
+def _build_counter_upsert():
+    """INSERT ... ON CONFLICT DO UPDATE SET col = col + excluded.col"""
+    table = LoveDailyRef.__table__
+    stmt = sqlite_insert(table)
+    updates = {col: table.c[col] + stmt.excluded[col] for col in COUNTER_FIELDS}
+    updates["updated_at"] = stmt.excluded.updated_at
+    return stmt.on_conflict_do_update(
+        index_elements=["date", "group_id", "user_id"], set_=updates
+    )
+
+
+_COUNTER_UPSERT = _build_counter_upsert()
+_INDEX_INSERT = sqlite_insert(MessageOwnerIndex.__table__).on_conflict_do_nothing()
+_LEDGER_INSERT = sqlite_insert(LoveHonorLedger.__table__).on_conflict_do_nothing()
+
+
+def _build_score_upsert():
+    """INSERT ... ON CONFLICT DO UPDATE，重复结算时覆盖为最新结果"""
+    stmt = sqlite_insert(LoveDailyScore.__table__)
+    columns = ("score", "simp", "vibe", "ick", "nostalgia", "settled_at")
+    return stmt.on_conflict_do_update(
+        index_elements=["date", "group_id", "user_id"],
+        set_={col: stmt.excluded[col] for col in columns},
+    )
+
+
+_SCORE_UPSERT = _build_score_upsert()
+
+
+def _build_commentary_upsert():
+    """INSERT ... ON CONFLICT DO UPDATE，以最新的变体列表覆盖"""
+    stmt = sqlite_insert(LoveCommentaryCache.__table__)
+    return stmt.on_conflict_do_update(
+        index_elements=["key"],
+        set_={col: stmt.excluded[col] for col in ("variants", "created_at")},
+    )
+
+
+_COMMENTARY_UPSERT = _build_commentary_upsert()
+
+
+@dataclass(slots=True)
+class IncrementCounters:
+    """累加计数器 (已计入 CounterBuffer，落盘后扣除)"""
+
+    deltas: dict[DailyKey, dict[str, int]]
+
+
+@dataclass(slots=True)
+class IndexMessages:
+    """写入消息归属索引 (已计入 CounterBuffer，落盘后扣除)"""
+
+    rows: list[MessageOwnerIndex]
+
+
+@dataclass(slots=True)
+class ApplyHonor:
+    """
+    发放群荣誉加成，提交方需等待落盘后再读取。
+    写入器先在 love_honor_ledger 中登记 (day, group_id)，登记成功才累加加成，
+    落盘后 applied 表示本次是否实际发放 (False 即当天已发放过)。
+    """
+
+    day: date
+    group_id: str
+    honor_count: int
+    deltas: dict[DailyKey, dict[str, int]]
+    applied: bool = False
+
+
+@dataclass(slots=True)
+class SaveScores:
+    """写入日终结算得分"""
+
+    rows: list[LoveDailyScore]
+
+
+@dataclass(slots=True)
+class SaveCommentary:
+    """写入判词缓存条目 (同一键只保留最后一次提交)"""
+
+    row: LoveCommentaryCache
+
+
+@dataclass(slots=True)
+class PruneMessageIndex:
+    """
+    删除早于 before 的消息归属索引，每条命令最多删除 limit 行，
+    提交方需等待落盘，deleted 为实际删除的行数。
+    """
+
+    before: float
+    limit: int
+    deleted: int = 0
+
+
+@dataclass(slots=True)
+class PruneCommentary:
+    """删除 before 之前生成的判词缓存，提交方需等待落盘，deleted 为实际删除的行数"""
+
+    before: float
+    deleted: int = 0
+
+
+WriteCommand = (
+    IncrementCounters
+    | IndexMessages
+    | ApplyHonor
+    | SaveScores
+    | SaveCommentary
+    | PruneMessageIndex
+    | PruneCommentary
+)
+
+
+class DBWriter:
+    """
+    单写者数据库 Actor。
+    独占一条写连接，消费有界 asyncio.Queue 中的写命令，并把同一时间窗口内的
+    多条命令合并为一次事务提交 (group commit)。队列写满时 submit 会阻塞调用方，
+    以此向消息处理器施加背压。
+    一批命令重试 max_retries 次仍失败时：等待结果的提交方立即收到异常 (由其自行处理)，
+    其余命令保留在缓冲区中并重新排队，累计重新排队 max_requeues 次后才丢弃并记录丢失的内容。
+    """
+
+    def __init__(
+        self,
+        db: DBManager,
+        buffer: CounterBuffer,
+        queue_size: int = 5000,
+        batch_size: int = 200,
+        linger: float = 2.0,
+        max_retries: int = 3,
+        max_requeues: int = 3,
+        requeue_delay: float = 5.0,
+    ):
+        """
+        :param queue_size: 队列容量，写满后提交方需等待
+        :param batch_size: 单次事务最多合并的队列项数
+        :param linger: 收到第一条命令后最多等待多少秒以聚合更多命令
+        :param max_retries: 单批命令的立即重试次数
+        :param max_requeues: 重试耗尽后，无人等待的命令最多重新排队的次数
+        :param requeue_delay: 重新排队的命令再次提交前等待的秒数
+        """
+        self.db = db
+        self.buffer = buffer
+        self.batch_size = max(1, batch_size)
+        self.linger = max(0.0, linger)
+        self.max_retries = max(0, max_retries)
+        self.max_requeues = max(0, max_requeues)
+        self.requeue_delay = max(0.0, requeue_delay)
+        # 重试耗尽后等待再次提交的队列项，不占用有界队列的容量
+        self._requeued: list = []
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._conn: AsyncConnection | None = None
+
+        # 每次从缓冲区扣除已落盘增量后递增，供读取方检测并发提交
+        self.version = 0
+
+        # 监控指标
+        self._commits = 0
+        self._commands = 0
+        self._dropped = 0
+        self._requeues = 0
+        self._backpressure_waits = 0
+        self._max_depth = 0
+        self._last_commit_ms = 0.0
+        self._max_commit_ms = 0.0
+        self._total_commit_ms = 0.0
+        self._last_lag_ms = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """等待队列中已有的命令全部落盘后停止写入任务"""
+        if self._task is None:
+            return
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"DBWriter: 停止前落盘失败: {e}")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._requeued:
+            lost = [cmd for commands, _, _, _ in self._requeued for cmd in commands]
+            self._requeued = []
+            self._dropped += len(lost)
+            self._discard(lost)
+            logger.error(f"DBWriter: 停止时仍未落盘，丢弃 {self._describe(lost)}")
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    async def submit(self, *commands: WriteCommand, wait: bool = False):
+        """
+        提交一组写命令，同一次 submit 的命令保证在同一事务中提交。
+        :param wait: 为 True 时等待该组命令落盘后才返回
+        """
+        if self._task is None:
+            raise RuntimeError("DBWriter 尚未启动")
+        future = asyncio.get_running_loop().create_future() if wait else None
+        if self._queue.full():
+            self._backpressure_waits += 1
+            logger.debug(
+                f"DBWriter: 写入队列已满 ({self._queue.qsize()})，提交方等待背压释放。"
+            )
+        await self._queue.put((commands, future, time.monotonic(), 0))
+        depth = self._queue.qsize()
+        self._max_depth = max(self._max_depth, depth)
+        if future is not None or depth >= self.batch_size:
+            self._wake.set()
+        if future is not None:
+            await future
+
+    async def flush(self):
+        """等待此前提交的所有命令落盘"""
+        await self.submit(wait=True)
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_max_depth": self._max_depth,
+            "queue_capacity": self._queue.maxsize,
+            "commits": self._commits,
+            "commands": self._commands,
+            "dropped": self._dropped,
+            "requeues": self._requeues,
+            "requeued_pending": len(self._requeued),
+            "backpressure_waits": self._backpressure_waits,
+            "last_commit_ms": round(self._last_commit_ms, 2),
+            "max_commit_ms": round(self._max_commit_ms, 2),
+            "avg_commit_ms": round(self._total_commit_ms / self._commits, 2)
+            if self._commits
+            else 0.0,
+            "last_queue_lag_ms": round(self._last_lag_ms, 2),
+        }
+
+    async def _run(self):
+        while True:
+            if self._requeued:
+                # 先重新提交此前失败的命令，期间到达的新命令并入同一批
+                await asyncio.sleep(self.requeue_delay)
+                batch, self._requeued = self._requeued, []
+                first = batch[0]
+            else:
+                first = await self._queue.get()
+                batch = [first]
+            if first[1] is None and self.linger > 0 and len(batch) == 1:
+                # 聚合窗口：等待更多命令，遇到需要等待结果的命令或队列积压时提前结束
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.linger)
+                except asyncio.TimeoutError:
+                    pass
+            self._wake.clear()
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            await self._commit_batch(batch)
+
+    async def _commit_batch(self, batch: list):
+        counters: dict[DailyKey, dict[str, int]] = {}
+        index_rows: dict[str, MessageOwnerIndex] = {}
+        honors: list[ApplyHonor] = []
+        scores: dict[DailyKey, LoveDailyScore] = {}
+        commentaries: dict[str, LoveCommentaryCache] = {}
+        prunes: list[PruneMessageIndex | PruneCommentary] = []
+        for commands, _, _, _ in batch:
+            for cmd in commands:
+                if isinstance(cmd, IndexMessages):
+                    for row in cmd.rows:
+                        index_rows.setdefault(row.message_id, row)
+                elif isinstance(cmd, ApplyHonor):
+                    honors.append(cmd)
+                elif isinstance(cmd, SaveScores):
+                    for row in cmd.rows:
+                        scores[(row.date, row.group_id, row.user_id)] = row
+                elif isinstance(cmd, SaveCommentary):
+                    commentaries[cmd.row.key] = cmd.row
+                elif isinstance(cmd, (PruneMessageIndex, PruneCommentary)):
+                    prunes.append(cmd)
+                else:
+                    for key, fields in cmd.deltas.items():
+                        merge_deltas(counters, key, **fields)
+
+        error = None
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                await self._write(
+                    counters,
+                    list(index_rows.values()),
+                    honors,
+                    list(scores.values()),
+                    list(commentaries.values()),
+                    prunes,
+                )
+                error = None
+                break
+            except Exception as e:
+                error = e
+                if self._conn is not None:
+                    await self._conn.close()
+                    self._conn = None
+                logger.warning(f"DBWriter: 批量提交失败 (第 {attempt + 1} 次): {e}")
+                await asyncio.sleep(0.1 * 2**attempt)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if error is None:
+            self._commits += 1
+            self._last_commit_ms = elapsed_ms
+            self._max_commit_ms = max(self._max_commit_ms, elapsed_ms)
+            self._total_commit_ms += elapsed_ms
+
+        self.version += 1
+        now = time.monotonic()
+        dropped = []
+        for item in batch:
+            commands, future, enqueued_at, requeues = item
+            self._last_lag_ms = (now - enqueued_at) * 1000
+            if error is not None and future is None and commands:
+                if requeues < self.max_requeues:
+                    # 增量仍保留在缓冲区中，读取结果不受影响，稍后重新提交
+                    self._requeued.append((commands, None, enqueued_at, requeues + 1))
+                    self._requeues += 1
+                    continue
+                dropped.extend(commands)
+            elif error is not None:
+                # 提交方在等待结果，由其收到异常后自行处理
+                self._dropped += len(commands)
+            self._commands += len(commands)
+            # 已落盘、已丢弃或已通知提交方的命令从缓冲区扣除
+            self._discard(commands)
+            if future is not None and not future.done():
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+
+        if error is not None:
+            self._dropped += len(dropped)
+            if self._requeued:
+                logger.warning(
+                    f"DBWriter: {len(self._requeued)} 组命令将在 "
+                    f"{self.requeue_delay}s 后重新提交: {error}"
+                )
+            if dropped:
+                logger.error(
+                    f"DBWriter: 重新排队 {self.max_requeues} 次后仍失败，"
+                    f"丢弃 {self._describe(dropped)}: {error}"
+                )
+
+    def _discard(self, commands):
+        for cmd in commands:
+            if isinstance(cmd, IncrementCounters):
+                for key, fields in cmd.deltas.items():
+                    self.buffer.discard(key, fields)
+            elif isinstance(cmd, IndexMessages):
+                for row in cmd.rows:
+                    self.buffer.discard_index(row.message_id)
+
+    @staticmethod
+    def _describe(commands: list) -> str:
+        """概括被丢弃的写命令，便于事后人工补录"""
+        counters: dict[DailyKey, dict[str, int]] = {}
+        index_rows = 0
+        others = 0
+        for cmd in commands:
+            if isinstance(cmd, IncrementCounters):
+                for key, fields in cmd.deltas.items():
+                    merge_deltas(counters, key, **fields)
+            elif isinstance(cmd, IndexMessages):
+                index_rows += len(cmd.rows)
+            else:
+                others += 1
+        counter_text = "; ".join(
+            f"{day}/{group_id}/{user_id} {fields}"
+            for (day, group_id, user_id), fields in counters.items()
+        )
+        return (
+            f"{len(counters)} 个用户的计数器增量 [{counter_text}], "
+            f"{index_rows} 条消息索引, {others} 条其他命令"
+        )
+
+    async def _write(
+        self,
+        counters: dict[DailyKey, dict[str, int]],
+        index_rows: list[MessageOwnerIndex],
+        honors: list[ApplyHonor],
+        scores: list[LoveDailyScore],
+        commentaries: list[LoveCommentaryCache] = (),
+        prunes: list[PruneMessageIndex | PruneCommentary] = (),
+    ):
+        if not (counters or index_rows or honors or scores or commentaries or prunes):
+            return
+        if self._conn is None:
+            self._conn = await self.db.engine.connect()
+        async with self._conn.begin():
+            if index_rows:
+                await self._conn.execute(
+                    _INDEX_INSERT, [row.model_dump() for row in index_rows]
+                )
+            if honors:
+                # 重试时 counters 会被再次传入，不能就地修改
+                counters = {key: dict(fields) for key, fields in counters.items()}
+                for cmd in honors:
+                    cmd.applied = await self._claim_honor(cmd)
+                    if cmd.applied:
+                        for key, fields in cmd.deltas.items():
+                            merge_deltas(counters, key, **fields)
+            if counters:
+                now = time.time()
+                params = []
+                for (day, group_id, user_id), fields in counters.items():
+                    row = dict.fromkeys(COUNTER_FIELDS, 0)
+                    row.update(fields)
+                    row.update(
+                        date=day, group_id=group_id, user_id=user_id, updated_at=now
+                    )
+                    params.append(row)
+                await self._conn.execute(_COUNTER_UPSERT, params)
+            if scores:
+                await self._conn.execute(
+                    _SCORE_UPSERT,
+                    [row.model_dump(exclude={"id"}) for row in scores],
+                )
+            if commentaries:
+                await self._conn.execute(
+                    _COMMENTARY_UPSERT, [row.model_dump() for row in commentaries]
+                )
+            for cmd in prunes:
+                cmd.deleted = await self._prune(cmd)
+
+    async def _prune(self, cmd: PruneMessageIndex | PruneCommentary) -> int:
+        if isinstance(cmd, PruneCommentary):
+            stmt = delete(LoveCommentaryCache).where(
+                LoveCommentaryCache.created_at < cmd.before
+            )
+        else:
+            batch = (
+                select(MessageOwnerIndex.message_id)
+                .where(MessageOwnerIndex.timestamp < cmd.before)
+                .limit(cmd.limit)
+                .scalar_subquery()
+            )
+            stmt = delete(MessageOwnerIndex).where(
+                MessageOwnerIndex.message_id.in_(batch)
+            )
+        result = await self._conn.execute(stmt)
+        return result.rowcount or 0
+
+    async def _claim_honor(self, cmd: ApplyHonor) -> bool:
+        """在荣誉台账中登记当天的发放记录，已存在时返回 False"""
+        result = await self._conn.execute(
+            _LEDGER_INSERT,
+            {
+                "date": cmd.day,
+                "group_id": cmd.group_id,
+                "honor_count": cmd.honor_count,
+                "applied_at": time.time(),
+            },
+        )
+        return result.rowcount == 1
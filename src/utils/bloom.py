@@ -0,0 +1,46 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    定长位数组布隆过滤器。
+    只会误报 (可能存在)，不会漏报，用于在查询数据库前快速排除绝大多数新键。
+    """
+
+    def __init__(self, capacity: int = 200000, error_rate: float = 0.01):
+        """
+        :param capacity: 预期插入的键数量
+        :param error_rate: 达到容量时的期望误报率
+        """
+        self.capacity = max(1, capacity)
+        bits = -self.capacity * math.log(error_rate) / (math.log(2) ** 2)
+        self.size = max(8, int(bits))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key)
+        )
+
+    @property
+    def is_full(self) -> bool:
+        return self.count >= self.capacity
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
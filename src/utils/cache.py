@@ -0,0 +1,70 @@
+import time
+from collections import OrderedDict
+from typing import Any
+
+
+class LRUCache:
+    """
+    带 TTL 的有界 LRU 缓存。
+    超出容量时淘汰最久未访问的条目，过期条目在读取时惰性删除，并统计命中率。
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 0):
+        """
+        :param max_size: 最大条目数
+        :param ttl: 条目存活秒数，0 表示永不过期
+        """
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, count=False) is not None
+
+    def get(self, key, default=None, count: bool = True):
+        entry = self._data.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if not expires_at or expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                if count:
+                    self.hits += 1
+                return value
+            del self._data[key]
+        if count:
+            self.misses += 1
+        return default
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else 0
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return entry[1] if entry is not None else default
+
+    def items(self):
+        """遍历当前条目 (不检查过期、不影响 LRU 顺序)"""
+        for key, (_, value) in self._data.items():
+            yield key, value
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
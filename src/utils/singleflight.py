@@ -0,0 +1,41 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+
+class SingleFlight:
+    """
+    并发请求合并。
+    同一个键同时只执行一次 factory，其余并发调用方等待并共享同一结果 (或同一异常)。
+    """
+
+    def __init__(self):
+        self._inflight: dict[Any, asyncio.Future] = {}
+        self.shared = 0  # 被合并掉的调用次数
+
+    def __contains__(self, key) -> bool:
+        return key in self._inflight
+
+    async def do(self, key, factory: Callable[[], Awaitable[Any]]):
+        future = self._inflight.get(key)
+        if future is not None:
+            self.shared += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其他等待方时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
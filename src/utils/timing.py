@@ -0,0 +1,35 @@
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """
+    记录一次请求中各阶段的耗时 (毫秒)。
+    阶段可以并发执行，total_ms 为从创建到 finish() 的墙钟时间，
+    serial_ms 为各阶段耗时之和 (即串行执行时的预计耗时)。
+    """
+
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+        self._started_at = time.perf_counter()
+        self.total_ms = 0.0
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    def finish(self) -> float:
+        self.total_ms = round((time.perf_counter() - self._started_at) * 1000, 1)
+        return self.total_ms
+
+    @property
+    def serial_ms(self) -> float:
+        return round(sum(self.stages.values()), 1)
+
+    def summary(self) -> str:
+        stages = ", ".join(f"{name} {ms}ms" for name, ms in self.stages.items())
+        return f"{stages} | 总计 {self.total_ms}ms (串行预计 {self.serial_ms}ms)"
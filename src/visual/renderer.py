@@ -1,3 +1,4 @@
+import asyncio
 import base64
 import os
 import re
@@ -23,6 +24,45 @@ class LoveRenderer:
         # 初始化 Jinja2 环境
         self.env = Environment(loader=FileSystemLoader(theme_manager.themes_dir))
 
+    @staticmethod
+    def avatar_url(user_id: str, size: int = 640) -> str:
+        return f"https://q1.qlogo.cn/g?b=qq&nk={user_id}&s={size}"
+
+    async def _fetch_avatar(self, session: aiohttp.ClientSession, url: str) -> str:
+        """下载头像并转为 data URI，失败时返回默认头像"""
+        try:
+            async with session.get(url, timeout=5) as resp:
+                if resp.status == 200:
+                    content = await resp.read()
+                    b64 = base64.b64encode(content).decode()
+                    return f"data:image/jpeg;base64,{b64}"
+        except Exception as e:
+            logger.warning(f"Failed to fetch avatar {url}: {e}")
+        return DEFAULT_AVATAR
+
+    async def _fetch_avatars(
+        self, session: aiohttp.ClientSession, user_ids: set[str], size: int
+    ) -> dict[str, str]:
+        user_ids = list(user_ids)
+        results = await asyncio.gather(
+            *(
+                self._fetch_avatar(session, self.avatar_url(uid, size))
+                for uid in user_ids
+            )
+        )
+        return dict(zip(user_ids, results))
+
+    async def prefetch_avatars(self, user_ids, size: int = 640) -> dict[str, str]:
+        """
+        并发下载一组用户的头像，返回 {user_id: data URI}。
+        可以在 LLM 调用期间提前执行，render 时遇到 data URI 会直接使用。
+        """
+        user_ids = {str(uid) for uid in user_ids if uid}
+        if not user_ids:
+            return {}
+        async with aiohttp.ClientSession() as session:
+            return await self._fetch_avatars(session, user_ids, size)
+
     async def render(self, data: dict, theme_name: str = "galgame") -> str:
         """
         将分析结果渲染为图片。
@@ -33,48 +73,32 @@ class LoveRenderer:
         async with aiohttp.ClientSession() as session:
             # 1. Process Main Avatar
             if data.get("avatar_url") and data["avatar_url"].startswith("http"):
-                try:
-                    async with session.get(data["avatar_url"], timeout=5) as resp:
-                        if resp.status == 200:
-                            content = await resp.read()
-                            b64 = base64.b64encode(content).decode()
-                            data["avatar_url"] = f"data:image/jpeg;base64,{b64}"
-                        else:
-                            data["avatar_url"] = DEFAULT_AVATAR
-                except Exception as e:
-                    logger.warning(f"Failed to fetch main avatar: {e}")
-                    data["avatar_url"] = DEFAULT_AVATAR
+                data["avatar_url"] = await self._fetch_avatar(
+                    session, data["avatar_url"]
+                )
             elif not data.get("avatar_url"):
                 data["avatar_url"] = DEFAULT_AVATAR
 
-            # 2. Process Evidence Avatars
+            # 2. Process Evidence Avatars (未预取的头像并发下载)
+            pending = []
             if data.get("deep_dive") and data["deep_dive"].get("evidence"):
                 for scene in data["deep_dive"]["evidence"]:
                     for dialog in scene.get("dialogue", []):
-                        uid = dialog.get("user_id")
                         # Already base64 check
                         if dialog.get("avatar_url") and dialog["avatar_url"].startswith(
                             "data:"
                         ):
                             continue
-
-                        if uid:
-                            try:
-                                url = f"https://q1.qlogo.cn/g?b=qq&nk={uid}&s=100"
-                                async with session.get(url, timeout=5) as resp:
-                                    if resp.status == 200:
-                                        content = await resp.read()
-                                        b64 = base64.b64encode(content).decode()
-                                        dialog["avatar_url"] = (
-                                            f"data:image/jpeg;base64,{b64}"
-                                        )
-                                    else:
-                                        dialog["avatar_url"] = DEFAULT_AVATAR
-                            except Exception as e:
-                                logger.warning(f"Failed to fetch avatar for {uid}: {e}")
-                                dialog["avatar_url"] = DEFAULT_AVATAR
+                        if dialog.get("user_id"):
+                            pending.append(dialog)
                         else:
                             dialog["avatar_url"] = DEFAULT_AVATAR
+            if pending:
+                avatars = await self._fetch_avatars(
+                    session, {str(d["user_id"]) for d in pending}, 100
+                )
+                for dialog in pending:
+                    dialog["avatar_url"] = avatars[str(dialog["user_id"])]
 
             # 3. Process Theme Assets (e.g., header_bg.png)
             asset_dir = self.theme_manager.get_asset_dir(theme_name)
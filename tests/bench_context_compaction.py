@@ -0,0 +1,93 @@
+"""
+深度侧写上下文压缩的基准。
+
+在合成的聊天上下文 (含长段粘贴、连续刷屏与连续表情) 上对比：
+1. 旧实现：直接拼接全部消息；
+2. ContextCompactor：截断、合并后按 token 预算围绕 [Target] 发言选取。
+输出压缩前后的估算 token 数与耗时。
+
+用法: python tests/bench_context_compaction.py [消息数] [token 预算]
+"""
+
+import os
+import random
+import sys
+import time
+
+# Setup Paths
+current_file = os.path.abspath(__file__)
+plugin_dir = os.path.dirname(os.path.dirname(current_file))
+sys.path.insert(0, plugin_dir)
+
+from src.analysis.context_compactor import (  # noqa: E402
+    ContextCompactor,
+    estimate_tokens,
+)
+
+ROUNDS = 50
+
+
+def make_context(count: int) -> list[dict]:
+    random.seed(7)
+    context = []
+    for i in range(count):
+        is_target = random.random() < 0.08
+        user = "target" if is_target else f"user{random.randrange(30)}"
+        roll = random.random()
+        if roll < 0.05:
+            content = "复制粘贴的长文 " * random.randint(50, 200)
+        elif roll < 0.2:
+            content = "[表情]" * random.randint(1, 5)
+        elif roll < 0.3 and context:
+            # 同一人连续刷屏
+            user = context[-1]["user_id"]
+            is_target = user == "target"
+            content = context[-1]["content"]
+        else:
+            content = "普通的群聊消息" * random.randint(1, 6)
+        context.append(
+            {
+                "time": f"{i // 60:02d}:{i % 60:02d}",
+                "role": "[Target]" if is_target else "[Other]",
+                "nickname": user,
+                "user_id": user,
+                "content": content,
+            }
+        )
+    return context
+
+
+def legacy_format(context: list[dict]) -> str:
+    return "\n".join(
+        f"[{msg['time']}] {msg['role']} {msg['nickname']}: {msg['content']}"
+        for msg in context
+    )
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    budget = int(sys.argv[2]) if len(sys.argv) > 2 else 3000
+    context = make_context(count)
+    compactor = ContextCompactor(token_budget=budget)
+
+    legacy = legacy_format(context)
+    text, stats = compactor.compact(context)
+    assert stats["tokens_out"] <= budget, stats
+
+    print(f"messages           : {count} (budget {budget} tokens)")
+    print(f"legacy tokens      : {estimate_tokens(legacy)} ({len(legacy)} chars)")
+    print(f"compacted tokens   : {stats['tokens_out']} ({len(text)} chars)")
+    print(f"stats              : {stats}")
+    print(f"legacy format      : {timed(lambda: legacy_format(context)):8.3f} ms")
+    print(f"compact            : {timed(lambda: compactor.compact(context)):8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+上下文窗口选取的微基准。
+
+在合成的 10k 条消息池上对比：
+1. 旧实现：把每个兴趣点 ±window 的位置逐个放进 set，再排序；
+2. 区间合并：select_windows 线性合并区间；
+3. 多目标：find_interest_positions 一次遍历为 N 个目标同时找出兴趣点。
+并校验两种实现选出的位置完全一致。
+
+用法: python tests/bench_context_window.py [消息数]
+"""
+
+import os
+import random
+import sys
+import time
+
+# Setup Paths
+current_file = os.path.abspath(__file__)
+plugin_dir = os.path.dirname(os.path.dirname(current_file))
+sys.path.insert(0, plugin_dir)
+
+from src.handlers.context_window import (  # noqa: E402
+    find_interest_positions,
+    select_windows,
+)
+from src.handlers.live_buffer import ContextMessage  # noqa: E402
+
+WINDOW = 8
+LIMIT = 100
+ROUNDS = 20
+
+
+def make_pool(count: int, users: int = 200) -> list[ContextMessage]:
+    random.seed(11)
+    pool = []
+    for i in range(count):
+        user_id = str(random.randrange(users))
+        at_list = [str(random.randrange(users))] if random.random() < 0.1 else []
+        pool.append(
+            ContextMessage(str(i), 1_700_000_000 + i, user_id, "n", "消息", at_list)
+        )
+    return pool
+
+
+def legacy_select(pool: list[ContextMessage], target: str) -> list[int]:
+    interest = [
+        pos
+        for pos, msg in enumerate(pool)
+        if msg.user_id == target or target in msg.at_list
+    ]
+    selected = set()
+    for pos in interest:
+        for j in range(max(0, pos - WINDOW), min(len(pool), pos + WINDOW + 1)):
+            selected.add(j)
+    if len(selected) < LIMIT:
+        for k in range(len(pool) - 1, -1, -1):
+            if len(selected) >= LIMIT:
+                break
+            selected.add(k)
+    final = sorted(selected)
+    return final[-LIMIT:] if len(final) > LIMIT else final
+
+
+def interval_select(pool: list[ContextMessage], targets: list[str]) -> dict:
+    interest = find_interest_positions(pool, targets)
+    return {
+        target: select_windows(interest[target], len(pool), WINDOW, LIMIT)
+        for target in targets
+    }
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    pool = make_pool(count)
+    # 活跃用户 (兴趣点密集) 与普通用户
+    active = max(
+        {msg.user_id for msg in pool}, key=lambda u: sum(m.user_id == u for m in pool)
+    )
+    targets = [active] + [str(i) for i in range(1, 8)]
+
+    for target in targets:
+        windows = interval_select(pool, [target])[target]
+        positions = [p for start, end in windows for p in range(start, end)]
+        assert positions == legacy_select(pool, target), f"结果不一致: {target}"
+
+    legacy_one = timed(lambda: legacy_select(pool, active))
+    interval_one = timed(lambda: interval_select(pool, [active]))
+    legacy_multi = timed(lambda: [legacy_select(pool, t) for t in targets])
+    interval_multi = timed(lambda: interval_select(pool, targets))
+
+    print(f"pool size          : {count}")
+    print(f"targets            : {len(targets)} (window ±{WINDOW}, limit {LIMIT})")
+    print(f"legacy, 1 target   : {legacy_one:8.3f} ms")
+    print(f"interval, 1 target : {interval_one:8.3f} ms")
+    print(f"legacy, {len(targets)} targets  : {legacy_multi:8.3f} ms")
+    print(f"interval, {len(targets)} targets: {interval_multi:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
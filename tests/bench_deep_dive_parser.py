@@ -0,0 +1,275 @@
+"""
+深度侧写输出解析器的模糊测试与基准。
+
+1. 语料：tests/deep_dive_corpus/ 中收集的各类格式错误的 LLM 输出
+   (代码块包裹、未加引号的话题标签、截断、全角冒号、嵌套引号、缺少逗号、纯文本等)，
+   对比旧实现 (每次调用重新查找正则、惰性 DOTALL 匹配) 与 deep_dive_parser 的解析结果；
+2. 模糊测试：对语料随机截断、删除、插入结构字符，校验新解析器从不抛出异常且输出结构合法；
+3. 病态输入：大段空白、连续转义引号、大量证据场景，对比两种实现的耗时。
+
+用法: python tests/bench_deep_dive_parser.py [模糊测试轮数，默认 2000]
+"""
+
+import json
+import os
+import random
+import re
+import sys
+import time
+
+# Setup Paths
+current_file = os.path.abspath(__file__)
+plugin_dir = os.path.dirname(os.path.dirname(current_file))
+sys.path.insert(0, plugin_dir)
+
+from src.analysis.deep_dive_parser import (  # noqa: E402
+    extract_json_object,
+    reconstruct_fields,
+    repair_json,
+)
+
+CORPUS_DIR = os.path.join(os.path.dirname(current_file), "deep_dive_corpus")
+FUZZ_TOKENS = [
+    '"',
+    "'",
+    "#",
+    ",",
+    "{",
+    "}",
+    "[",
+    "]",
+    "\\",
+    "：",
+    "title:",
+    "ANALYSIS:",
+    " " * 50,
+]
+
+
+# ---- 旧实现 (LLMAnalyzer._repair_json / _reconstruct_from_regex) ----
+def legacy_repair_json(text: str) -> str:
+    """Attempts to repair common LLM JSON syntax errors."""
+
+    # 1. Fix unquoted hashtags and hallucinations like #"Tag" or ##Tag
+    # Match strings or hashtags (possibly with leading/trailing quotes/junk)
+    # Using a "match and skip" strategy for strings to avoid false positives.
+    pattern = r'("(?:\\.|[^"\\])*")|(#\s*"?[\w\u4e00-\u9fa5]+"?)|(#+)'
+
+    def replace_tag(match):
+        if match.group(1):  # It's a string, return as is
+            return match.group(1)
+
+        tag_content = match.group(2)
+        if tag_content:
+            # Normalize: remove stray quotes and # prefix, ensure single #
+            word = tag_content.lstrip("#").strip().strip('"')
+            if word:
+                return f'"#{word}"'
+
+        # Stray # or ##, just quote it to avoid syntax error
+        return '"#"'
+
+    text = re.sub(pattern, replace_tag, text)
+
+    # 2. Fix trailing commas
+    text = re.sub(r",\s*([\]\}])", r"\1", text)
+
+    return text
+
+
+def legacy_reconstruct(text: str) -> dict | None:
+    """Heuristic extraction of deep dive data using regex fallback."""
+    # 1. Keywords: Matches Keywords: ["#a", "#b"] or Keywords: #a #b
+    kw_match = re.search(
+        r'(?i)(?:KEYWORDS|keywords)["\']?\s*[:：]\s*[\[\(]?([^\]\)]+)[\]\)]?', text
+    )
+    keywords = []
+    if kw_match:
+        # More permissive: extract anything starting with # and capture the word
+        raw_kws = re.findall(r'#\s*["\']?([^"\',，\s\]\}]+)["\']?', kw_match.group(1))
+        keywords = [f"#{k.strip()}" for k in raw_kws if k.strip()]
+
+    # 2. Analysis: Extracts content after ANALYSIS:
+    ana_match = re.search(
+        r'(?i)(?:ANALYSIS|analysis)["\']?\s*[:：]\s*["\']?(.*?)(?:["\']?\s*[,，]?\s*(?:"|EVIDENCE|evidence)|$)',
+        text,
+        re.DOTALL,
+    )
+    analysis = ""
+    if ana_match:
+        analysis = ana_match.group(1).strip().strip('",')
+
+    # 3. Evidence: Extracts scenes and their dialogues
+    evidence = []
+    # Find scenes using title/TITLE as anchors
+    scene_blocks = re.split(r'(?i)title["\']?\s*[:：]', text)[1:]
+    for block in scene_blocks:
+        # Extract title (up to the next key or newline/comma)
+        title_match = re.match(r'\s*["\']?([^"\',]+)["\']?', block)
+        if not title_match:
+            continue
+        title = title_match.group(1).strip()
+
+        # NEW: Extract the actual reason from the block
+        reason = "由正则表达式兜底提取 (Reason Extraction Failed)"
+        reason_match = re.search(
+            r'(?i)reason["\']?\s*[:：]\s*["\']?([^"\',\}]+)["\']?', block
+        )
+        if reason_match:
+            reason = reason_match.group(1).strip()
+
+        # Find the dialogue portion in this block
+        diag_match = re.search(r'(?i)dialogue["\']?\s*[:：]\s*\[(.*)', block, re.DOTALL)
+        if not diag_match or not diag_match.group(1):
+            continue
+
+        diag_blob = diag_match.group(1)
+        # Find the closing bracket for this dialogue array
+        last_bracket = diag_blob.rfind("]")
+        if last_bracket != -1:
+            diag_blob = diag_blob[:last_bracket]
+
+        dialogue = []
+        # Extract entries like {"role": "...", "content": "..."}
+        entries = re.findall(r"\{([^{}]+)\}", diag_blob)
+        for entry in entries:
+            role_m = re.search(
+                r'["\']?role["\']?\s*[:：]\s*["\']?([^"\']+)["\']?',
+                entry,
+                re.IGNORECASE,
+            )
+            content_m = re.search(
+                r'["\']?content["\']?\s*[:：]\s*["\']?([^"\']+)["\']?',
+                entry,
+                re.IGNORECASE,
+            )
+            if role_m and content_m:
+                dialogue.append(
+                    {
+                        "role": role_m.group(1).strip(),
+                        "content": content_m.group(1).strip(),
+                    }
+                )
+
+        if dialogue:
+            evidence.append({"title": title, "reason": reason, "dialogue": dialogue})
+
+    if keywords or analysis or evidence:
+        return {"keywords": keywords, "content": analysis, "evidence": evidence}
+    return None
+
+
+def parse(text: str, repair, reconstruct) -> tuple[str, dict | None]:
+    """与 LLMAnalyzer._parse_deep_dive 相同的流程 (不含 UID 映射)"""
+    try:
+        data = json.loads(repair(extract_json_object(text)))
+        root = data.get("DEEP_PSYCHE", {})
+        return "json", {
+            "keywords": root.get("KEYWORDS", []),
+            "content": root.get("ANALYSIS", ""),
+            "evidence": data.get("EVIDENCE", []),
+        }
+    except Exception:
+        return "fallback", reconstruct(text)
+
+
+def summarize(method: str, result: dict | None) -> str:
+    if not result:
+        return f"{method:8s} -"
+    evidence = result.get("evidence") or []
+    lines = sum(len(scene.get("dialogue", [])) for scene in evidence)
+    return (
+        f"{method:8s} kw={len(result.get('keywords') or [])} "
+        f"analysis={len(result.get('content') or '')} "
+        f"scenes={len(evidence)} lines={lines}"
+    )
+
+
+def load_corpus() -> dict[str, str]:
+    corpus = {}
+    for name in sorted(os.listdir(CORPUS_DIR)):
+        with open(os.path.join(CORPUS_DIR, name), encoding="utf-8") as f:
+            corpus[name] = f.read()
+    return corpus
+
+
+def check_shape(result: dict | None):
+    if result is None:
+        return
+    assert isinstance(result["keywords"], list)
+    assert isinstance(result["content"], str)
+    for scene in result["evidence"]:
+        assert scene["dialogue"]
+        for dialog in scene["dialogue"]:
+            assert dialog["role"] and dialog["content"]
+
+
+def mutate(text: str, rng: random.Random) -> str:
+    for _ in range(rng.randint(1, 6)):
+        pos = rng.randrange(len(text) + 1)
+        op = rng.random()
+        if op < 0.3:
+            text = text[:pos]
+        elif op < 0.6:
+            text = text[:pos] + text[pos + rng.randint(1, 20) :]
+        else:
+            text = text[:pos] + rng.choice(FUZZ_TOKENS) + text[pos:]
+        if not text:
+            text = "{"
+    return text
+
+
+def timed(fn, rounds: int = 3) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    corpus = load_corpus()
+
+    print("== corpus ==")
+    for name, text in corpus.items():
+        old = summarize(*parse(text, legacy_repair_json, legacy_reconstruct))
+        new = summarize(*parse(text, repair_json, reconstruct_fields))
+        print(f"{name:36s} legacy: {old}")
+        print(f"{'':36s} new   : {new}")
+
+    print("== fuzz ==")
+    rng = random.Random(42)
+    samples = list(corpus.values())
+    worst = 0.0
+    for _ in range(rounds):
+        text = mutate(rng.choice(samples), rng)
+        start = time.perf_counter()
+        method, result = parse(text, repair_json, reconstruct_fields)
+        worst = max(worst, (time.perf_counter() - start) * 1000)
+        check_shape(result if method == "fallback" else None)
+        check_shape(reconstruct_fields(text))
+    print(f"{rounds} mutated inputs, no exceptions, worst {worst:.3f} ms")
+
+    print("== pathological ==")
+    cases = {
+        "whitespace after ANALYSIS": 'ANALYSIS: "' + " " * 500,
+        "escaped quotes": '{"a": "' + '\\"' * 4000,
+        "500 scenes": "".join(
+            f'{{"title": "证言{i}", "reason": "r", "dialogue": '
+            f'[{{"role": "[Target]", "content": "c{i}"}}]}},'
+            for i in range(500)
+        ),
+    }
+    for name, text in cases.items():
+        old_repair = timed(lambda: legacy_repair_json(text))
+        new_repair = timed(lambda: repair_json(text))
+        old_fields = timed(lambda: legacy_reconstruct(text))
+        new_fields = timed(lambda: reconstruct_fields(text))
+        print(
+            f"{name:26s} ({len(text)} chars) repair {old_repair:9.2f} -> "
+            f"{new_repair:7.2f} ms, fields {old_fields:9.2f} -> {new_fields:7.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+深度历史翻页的本地验证与基准。
+
+用 FakeOneBot 模拟一个按 message_seq 分页、带固定延迟的 get_group_msg_history
+(也可模拟不返回 message_seq、只能按不连续的 message_id 定位的协议端)，
+构造“目标用户发言很少、群消息很多”的场景，对比：
+1. 单次拉取 300 条 (旧行为) 能找到的目标发言数；
+2. HistoryPager 向前翻页后找到的发言数、请求页数与耗时 (串行 vs 并发)。
+同时检查翻页结果按时间有序且没有重复消息。
+
+用法: python tests/bench_deep_history.py [每条请求延迟毫秒]
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+from unittest.mock import MagicMock
+
+# Setup Paths
+current_file = os.path.abspath(__file__)
+plugin_dir = os.path.dirname(os.path.dirname(current_file))
+sys.path.insert(0, plugin_dir)
+
+# history_fetcher 依赖 AstrBot，这里只需要占位模块
+for name in (
+    "astrbot",
+    "astrbot.api",
+    "astrbot.api.event",
+    "astrbot.core",
+    "astrbot.core.star",
+    "astrbot.core.star.context",
+):
+    sys.modules.setdefault(name, MagicMock())
+
+from src.handlers.history_fetcher import OneBotAdapter  # noqa: E402
+from src.handlers.live_buffer import LiveMessageBuffer  # noqa: E402
+
+TARGET = "10086"
+
+
+class FakeOneBot:
+    """
+    按 message_seq 向前分页的 OneBot 协议端替身。
+    with_seq=False 时模拟不返回 message_seq 的协议端：消息只有不连续的数字 message_id，
+    翻页锚点按 message_id 定位，未知的锚点返回最新的消息。
+    """
+
+    def __init__(
+        self, total: int, target_every: int, latency: float, with_seq: bool = True
+    ):
+        self.latency = latency
+        self.calls = 0
+        self.unknown_anchors = 0
+        self.messages = []
+        ids = random.Random(7).sample(range(10**6, 10**9), total)
+        for seq in range(1, total + 1):
+            user_id = TARGET if seq % target_every == 0 else str(seq % 37)
+            message = {
+                "message_id": ids[seq - 1] if not with_seq else f"id{seq}",
+                "time": 1_700_000_000 + seq,
+                "sender": {"user_id": user_id, "nickname": f"n{user_id}"},
+                "message": [{"type": "text", "data": {"text": f"第{seq}条"}}],
+            }
+            if with_seq:
+                message["message_seq"] = seq
+            self.messages.append(message)
+        self.with_seq = with_seq
+        self._index = {m["message_id"]: i + 1 for i, m in enumerate(self.messages)}
+        self.api = self
+
+    async def call_action(self, action: str, **params):
+        assert action == "get_group_msg_history"
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        anchor = params.get("message_seq")
+        if anchor is None:
+            end = len(self.messages)
+        elif self.with_seq:
+            end = min(anchor, len(self.messages))
+        elif anchor in self._index:
+            end = self._index[anchor]
+        else:
+            self.unknown_anchors += 1
+            end = len(self.messages)
+        start = max(0, end - params["count"])
+        return {"messages": self.messages[start:end]}
+
+
+def make_event(bot) -> MagicMock:
+    event = MagicMock()
+    event.message_obj.group_id = "123"
+    event.self_id = "bot"
+    event.bot = bot
+    return event
+
+
+async def run(label: str, bot: FakeOneBot, deep_history: dict):
+    config = {
+        "analyze_history_count": 60,
+        "context_window_size": 3,
+        "deep_history": deep_history,
+    }
+    adapter = OneBotAdapter(MagicMock(), config, live_buffer=LiveMessageBuffer())
+    start = time.perf_counter()
+    context = await adapter.fetch_context(make_event(bot), TARGET)
+    elapsed = time.perf_counter() - start
+
+    real = [c for c in context if c["role"] != "[System]"]
+    times = [c["time"] for c in real]
+    assert times == sorted(times), "上下文未按时间排序"
+    contents = [c["content"] for c in real]
+    assert len(contents) == len(set(contents)), "上下文存在重复消息"
+
+    assert not bot.unknown_anchors, f"{bot.unknown_anchors} 个翻页锚点不存在"
+
+    hits = sum(1 for c in real if c["role"] == "[Target]")
+    print(
+        f"{label:<18} target hits {hits:3d} | api calls {bot.calls:3d} | "
+        f"pages {adapter.pager.pages_fetched:3d} | {elapsed * 1000:8.1f} ms"
+    )
+
+
+async def main():
+    latency = (float(sys.argv[1]) if len(sys.argv) > 1 else 80) / 1000
+    # 目标每 400 条发言一次，最近 300 条内最多出现一次
+    scenario = {"total": 5000, "target_every": 400, "latency": latency}
+
+    await run("single fetch", FakeOneBot(**scenario), {"enabled": False})
+    await run(
+        "paged serial",
+        FakeOneBot(**scenario),
+        {"min_target_hits": 3, "max_pages": 20, "concurrency": 1},
+    )
+    await run(
+        "paged concurrent",
+        FakeOneBot(**scenario),
+        {"min_target_hits": 3, "max_pages": 20, "concurrency": 4},
+    )
+    await run(
+        "page budget = 2",
+        FakeOneBot(**scenario),
+        {"min_target_hits": 3, "max_pages": 2, "concurrency": 4},
+    )
+    # 协议端不提供 message_seq：锚点退回不连续的 message_id，只能逐页串行
+    await run(
+        "message_id anchor",
+        FakeOneBot(**scenario, with_seq=False),
+        {"min_target_hits": 3, "max_pages": 20, "concurrency": 4},
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
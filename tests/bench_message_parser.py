@@ -0,0 +1,90 @@
+"""
+消息链解析开销对比。
+
+旧实现中一条消息会被多个采集器各自遍历一次 (图片计数、回复目标、文本拼接、@ 列表)，
+这里用等价的多次遍历作为基线，与 parse_chain 的单次遍历比较每条消息的平均解析耗时。
+分别测试 OneBot 字典段 (历史记录) 与组件对象 (实时消息) 两种输入。
+
+用法: python tests/bench_message_parser.py [消息数]
+"""
+
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+# Setup Paths
+current_file = os.path.abspath(__file__)
+plugin_dir = os.path.dirname(os.path.dirname(current_file))
+sys.path.insert(0, plugin_dir)
+
+from src.analysis.parser import parse_chain  # noqa: E402
+
+
+def legacy_walks(chain):
+    """旧实现：文本、图片、回复、@ 各遍历一次"""
+    is_dict = bool(chain) and isinstance(chain[0], dict)
+
+    def field(seg, key):
+        return seg.get("data", {}).get(key) if is_dict else getattr(seg, key, None)
+
+    def seg_type(seg):
+        return seg.get("type") if is_dict else seg.type
+
+    text = "".join(field(s, "text") or "" for s in chain if seg_type(s) == "text")
+    images = sum(1 for s in chain if seg_type(s) == "image")
+    reply = None
+    for s in chain:
+        if seg_type(s) == "reply":
+            reply = field(s, "id")
+            break
+    at_list = [str(field(s, "qq")) for s in chain if seg_type(s) == "at"]
+    display = "".join(
+        field(s, "text") or "" if seg_type(s) == "text" else f"[{seg_type(s)}]"
+        for s in chain
+    ).strip()
+    return text, images, reply, at_list, display
+
+
+def make_chains(count: int, as_dict: bool) -> list:
+    random.seed(42)
+    chains = []
+    for i in range(count):
+        segs = []
+        if random.random() < 0.3:
+            segs.append(("reply", {"id": str(i - 1)}))
+        if random.random() < 0.2:
+            segs.append(("at", {"qq": str(random.randint(1, 50))}))
+        segs.append(("text", {"text": "消息内容" * random.randint(1, 8)}))
+        if random.random() < 0.2:
+            segs.append(("image", {"file": "a.jpg"}))
+        if as_dict:
+            chains.append([{"type": t, "data": d} for t, d in segs])
+        else:
+            chains.append([SimpleNamespace(type=t, **d) for t, d in segs])
+    return chains
+
+
+def bench(fn, chains) -> float:
+    start = time.perf_counter()
+    for chain in chains:
+        fn(chain)
+    return (time.perf_counter() - start) / len(chains) * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print(f"messages: {count}")
+    for label, as_dict in (("onebot dict", True), ("components ", False)):
+        chains = make_chains(count, as_dict)
+        legacy = bench(legacy_walks, chains)
+        single = bench(parse_chain, chains)
+        print(
+            f"{label}: legacy {legacy:6.2f} us/msg | parse_chain {single:6.2f} us/msg"
+            f" | {legacy / single:4.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+今日人设各阶段并发执行的基准。
+
+用带固定延迟的替身模拟 LLM、历史接口与头像下载，对比：
+1. 旧流程：判词 -> 获取上下文 -> 深度侧写 -> 逐个下载头像，依次执行；
+2. LoveFormulaPlugin._run_report_stages：判词、上下文 + 深度侧写 + 证据头像、目标头像并发执行；
+3. 合并模式 (enable_combined_llm)：获取上下文后一次调用同时生成判词与深度侧写。
+并输出 StageTimer 记录的各阶段耗时与 LLM 调用次数。
+
+用法: python tests/bench_profile_stages.py [延迟缩放系数，默认 1.0]
+"""
+
+import asyncio
+import importlib
+import os
+import sys
+import time
+from unittest.mock import MagicMock
+
+# Setup Paths
+current_file = os.path.abspath(__file__)
+plugin_dir = os.path.dirname(os.path.dirname(current_file))
+plugins_dir = os.path.dirname(plugin_dir)
+sys.path.insert(0, plugins_dir)
+
+
+# Mock AstrBot modules BEFORE importing plugin
+class MockStar:
+    def __init__(self, context):
+        self.context = context
+
+
+class MockCustomFilter:
+    pass
+
+
+for name in (
+    "astrbot",
+    "astrbot.api",
+    "astrbot.api.event",
+    "astrbot.api.event.filter",
+    "astrbot.core",
+    "astrbot.core.config",
+    "astrbot.core.message",
+    "astrbot.core.message.components",
+    "astrbot.core.star",
+    "astrbot.core.star.context",
+    "astrbot.core.utils",
+    "astrbot.core.utils.astrbot_path",
+):
+    sys.modules[name] = MagicMock()
+sys.modules["astrbot.core.star"].Star = MockStar
+sys.modules["astrbot.api.event.filter"].CustomFilter = MockCustomFilter
+
+plugin_main = importlib.import_module(f"{os.path.basename(plugin_dir)}.main")
+StageTimer = importlib.import_module(
+    f"{os.path.basename(plugin_dir)}.src.utils.timing"
+).StageTimer
+
+SCALE = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+LATENCY = {
+    "commentary": 0.8,
+    "fetch_context": 0.3,
+    "deep_dive": 1.5,
+    "combined": 1.7,
+    "avatar": 0.12,
+}
+EVIDENCE_UIDS = ["1001", "1002", "1003", "1004"]
+
+
+async def sleep(stage: str):
+    await asyncio.sleep(LATENCY[stage] * SCALE)
+
+
+class StubLLM:
+    def __init__(self):
+        self.calls = 0
+
+    async def generate_commentary(self, *args, **kwargs):
+        self.calls += 1
+        await sleep("commentary")
+        return {"comment": "判词", "diagnostics": ["诊断"]}
+
+    async def generate_deep_dive(self, *args, **kwargs):
+        self.calls += 1
+        await sleep("deep_dive")
+        return self._deep_dive()
+
+    async def generate_combined(self, *args, **kwargs):
+        self.calls += 1
+        await sleep("combined")
+        return {"comment": "判词", "diagnostics": ["诊断"]}, self._deep_dive()
+
+    @staticmethod
+    def _deep_dive() -> dict:
+        return {
+            "keywords": ["#tag"],
+            "content": "侧写",
+            "evidence": [
+                {"dialogue": [{"role": "r", "user_id": uid} for uid in EVIDENCE_UIDS]}
+            ],
+        }
+
+
+class StubFetcher:
+    members = MagicMock()
+
+    async def fetch_context(self, event, user_id):
+        await sleep("fetch_context")
+        return [{"time": "12:00", "role": "[Target]", "nickname": "n", "content": "x"}]
+
+
+class StubRenderer:
+    async def prefetch_avatars(self, user_ids, size: int = 640):
+        user_ids = list(user_ids)
+        await asyncio.gather(*(sleep("avatar") for _ in user_ids))
+        return {str(uid): "data:image/jpeg;base64," for uid in user_ids}
+
+
+def make_settings(combined: bool):
+    settings = MagicMock()
+    settings.enable_llm_commentary = True
+    settings.enable_history_analysis = True
+    settings.enable_combined_llm = combined
+    return settings
+
+
+async def sequential(llm, fetcher) -> float:
+    """旧流程：各阶段依次执行，render 中逐个下载头像"""
+    start = time.perf_counter()
+    await llm.generate_commentary()
+    context = await fetcher.fetch_context(None, "42")
+    result = await llm.generate_deep_dive(context)
+    for _ in ["42"] + EVIDENCE_UIDS:
+        await sleep("avatar")
+    assert result["evidence"]
+    return (time.perf_counter() - start) * 1000
+
+
+async def concurrent(combined: bool = False) -> tuple[StageTimer, int]:
+    plugin = object.__new__(plugin_main.LoveFormulaPlugin)
+    plugin.llm = StubLLM()
+    plugin.history_fetcher = StubFetcher()
+    plugin.renderer = StubRenderer()
+    event = MagicMock()
+    event.message_obj.group_id = "123"
+
+    timer = StageTimer()
+    llm_result, deep_dive, avatar = await plugin._run_report_stages(
+        event, make_settings(combined), "42", {}, "人设", {}, timer
+    )
+    timer.finish()
+    assert llm_result["comment"] and avatar.startswith("data:")
+    assert all(
+        d["avatar_url"].startswith("data:")
+        for d in deep_dive["evidence"][0]["dialogue"]
+    )
+    return timer, plugin.llm.calls
+
+
+async def main():
+    serial_ms = await sequential(StubLLM(), StubFetcher())
+    timer, calls = await concurrent()
+    combined, combined_calls = await concurrent(combined=True)
+    print(f"latency scale   : {SCALE}")
+    print(f"sequential      : {serial_ms:8.1f} ms (2 LLM calls)")
+    print(f"concurrent      : {timer.total_ms:8.1f} ms ({calls} LLM calls)")
+    print(f"combined        : {combined.total_ms:8.1f} ms ({combined_calls} LLM call)")
+    print(f"speedup         : {serial_ms / timer.total_ms:8.2f} x")
+    print(f"stages          : {timer.summary()}")
+    print(f"combined stages : {combined.summary()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
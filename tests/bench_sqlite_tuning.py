@@ -0,0 +1,62 @@
+"""
+SQLite 调优前后的写入吞吐对比。
+
+模拟消息监听的写入路径 (消息索引 + 计数器 upsert)，将刷写阈值设为 1，
+使每条消息都产生一次独立提交，分别在无调优与默认调优参数下统计每秒消息数。
+
+用法: python tests/bench_sqlite_tuning.py [消息数]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from unittest.mock import MagicMock
+
+# Setup Paths
+current_file = os.path.abspath(__file__)
+plugin_dir = os.path.dirname(os.path.dirname(current_file))
+sys.path.insert(0, plugin_dir)
+
+# Mock AstrBot logger BEFORE importing repo
+sys.modules.setdefault("astrbot", MagicMock())
+sys.modules.setdefault("astrbot.api", MagicMock())
+
+from src.persistence.database import DBManager  # noqa: E402
+from src.persistence.repo import LoveRepo  # noqa: E402
+
+
+async def run_once(tuning: dict, count: int) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DBManager(os.path.join(tmp, "bench.db"), tuning=tuning)
+        await db.init_db()
+        repo = LoveRepo(db, flush_threshold=1, flush_interval=0)
+        repo.start()
+
+        start = time.perf_counter()
+        for i in range(count):
+            group_id = str(i % 5)
+            user_id = str(i % 37)
+            await repo.save_message_index(f"msg_{i}", group_id, user_id)
+            await repo.update_msg_stats(group_id, user_id, text_len=12)
+            await repo.flush()
+        elapsed = time.perf_counter() - start
+
+        await repo.stop()
+        await db.engine.dispose()
+    return count / elapsed
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    baseline = await run_once({"enabled": False}, count)
+    tuned = await run_once({}, count)
+    print(f"messages: {count}")
+    print(f"default journal : {baseline:8.1f} msg/s")
+    print(f"tuned (WAL)     : {tuned:8.1f} msg/s")
+    print(f"speedup         : {tuned / baseline:8.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""
+群成员表缓存的本地验证。
+
+用一个可控成败的 loader 模拟 get_group_member_list，检查：
+1. 加载失败 (抛异常或返回空列表) 后，重试间隔内的 refresh 不会再次请求；
+2. 超过重试间隔后重新请求，成功后成员表可读；
+3. 失败记录的群数受 max_groups 限制。
+
+用法: python tests/verify_member_directory.py
+"""
+
+import asyncio
+import os
+import sys
+from unittest.mock import MagicMock
+
+# Setup Paths
+current_file = os.path.abspath(__file__)
+plugin_dir = os.path.dirname(os.path.dirname(current_file))
+sys.path.insert(0, plugin_dir)
+
+# member_cache 依赖 AstrBot，这里只需要占位模块
+for name in ("astrbot", "astrbot.api", "astrbot.api.event"):
+    sys.modules.setdefault(name, MagicMock())
+
+from src.handlers.member_cache import MemberDirectory  # noqa: E402
+
+
+class FlakyLoader:
+    """前 failures 次调用失败 (交替抛异常与返回空列表)，之后返回成员列表"""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = 0
+
+    async def __call__(self, event) -> list[dict]:
+        self.calls += 1
+        if self.calls <= self.failures:
+            if self.calls % 2:
+                raise RuntimeError("bot offline")
+            return []
+        return [{"user_id": 1, "nickname": "alice", "card": "阿丽"}]
+
+
+def make_event(group_id: str) -> MagicMock:
+    event = MagicMock()
+    event.message_obj.group_id = group_id
+    return event
+
+
+async def settle(directory: MemberDirectory):
+    while directory._inflight:
+        await asyncio.gather(*directory._inflight.values())
+
+
+async def check_throttle():
+    loader = FlakyLoader(failures=2)
+    directory = MemberDirectory(loader, retry_interval=0.2)
+    event = make_event("123")
+
+    # 抛异常的失败：重试间隔内的后续消息不再请求
+    directory.refresh(event)
+    await settle(directory)
+    for _ in range(10):
+        directory.refresh(event)
+        await settle(directory)
+    assert loader.calls == 1, f"失败后未限流: {loader.calls} 次请求"
+    assert directory.get("123") == {}
+
+    # 返回空列表的失败同样限流
+    await asyncio.sleep(0.25)
+    directory.refresh(event)
+    await settle(directory)
+    directory.refresh(event)
+    await settle(directory)
+    assert loader.calls == 2, f"空列表后未限流: {loader.calls} 次请求"
+
+    # 超过重试间隔后重新请求并成功
+    await asyncio.sleep(0.25)
+    directory.refresh(event)
+    await settle(directory)
+    assert loader.calls == 3
+    assert directory.display_name("123", "1") == "阿丽"
+    print(f"throttle         ok | loader calls {loader.calls}")
+
+
+async def check_bounded():
+    loader = FlakyLoader(failures=10**6)
+    directory = MemberDirectory(loader, max_groups=8, retry_interval=60)
+    for group in range(100):
+        directory.refresh(make_event(str(group)))
+    await settle(directory)
+    assert len(directory._failed_at) <= 8, len(directory._failed_at)
+    print(f"bounded failures ok | tracked groups {len(directory._failed_at)}")
+
+
+async def main():
+    await check_throttle()
+    await check_bounded()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())